@@ -1,51 +1,344 @@
-# backtest_vwap.py
-import pandas as pd
+# backtest_vwap.py - 向量化回測：所有 symbol 載入同一個 NumPy panel，一次掃完整個參數 grid
+import argparse
+import itertools
 import json
-import glob
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import bar_codec
+import bar_store
+import instrument
+import vwap_engine
 
 DATA_DIR = 'data/intraday'
+STORE_DIR = bar_store.STORE_DIR
 INITIAL_CAPITAL = 10000
 COMMISSION_RATE = 0.000
 STRATEGY_MODE = 1  # 1 = Long only, 2 = Long/Short
+VWAP_ANCHOR = vwap_engine.REGULAR
+MAX_CELLS = 20_000_000  # 單次向量化運算的陣列元素上限，避免 grid 太大吃光記憶體
+
+CUMULATIVE_RE = re.compile(r"^intraday_([A-Z0-9.\-^=]+)\.(?:json|tvb\.gz)$")  # 只認累加檔，不含 _YYYY-MM-DD
+
+
+def _load_symbol_bars(symbol: str, data_dir: str, store_dir: str):
+    """優先讀 bar store；沒有 store 時讀累加 JSON。回傳依 time 排序的 BAR_DTYPE 陣列"""
+    if bar_store.day_index(symbol, store_dir):
+        return bar_store.load_bars(symbol, root=store_dir)
+    path = os.path.join(data_dir, f"intraday_{symbol}.json")
+    compact = bar_store.compact_path(symbol, data_dir)
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with instrument.timer("json.load"), open(path, 'r') as f:
+            data = [d for d in json.load(f) if d.get('time')]
+        instrument.file_bytes(path, "read")
+        if not data:
+            return None
+        bars = bar_store.records_to_array(data)
+    elif os.path.exists(compact):
+        bars = bar_codec.read(compact)
+    else:
+        return None
+    bars = bars[np.argsort(bars['time'], kind='stable')]
+    _, first = np.unique(bars['time'], return_index=True)
+    return bars[first]
+
+
+def discover_symbols(data_dir: str = DATA_DIR, store_dir: str = STORE_DIR) -> list:
+    symbols = set()
+    if os.path.isdir(store_dir):
+        symbols.update(d for d in os.listdir(store_dir) if os.path.isdir(os.path.join(store_dir, d)))
+    if os.path.isdir(data_dir):
+        for name in os.listdir(data_dir):
+            m = CUMULATIVE_RE.match(name)
+            if m:
+                symbols.add(m.group(1))
+    return sorted(symbols)
+
+
+def load_panel(symbols=None, data_dir: str = DATA_DIR, store_dir: str = STORE_DIR, anchor: str = VWAP_ANCHOR) -> dict:
+    """
+    把所有 symbol 放到同一條時間軸，回傳
+    {"symbols", "times": [T], "close": [S, T], "vwap": [S, T], "present": [S, T] bool}。
+    沒有 bar 的位置 close / vwap 為 NaN；回測時每個 symbol 只看自己的 bar（見 prepare_arrays）。
+    """
+    symbols = symbols or discover_symbols(data_dir, store_dir)
+    loaded = {}
+    for sym in symbols:
+        with instrument.timer("backtest.symbol"):
+            bars = _load_symbol_bars(sym, data_dir, store_dir)
+            if bars is None or len(bars) < 2:
+                continue
+            vwap = vwap_engine.session_vwap(bars['time'], bars['high'], bars['low'], bars['close'], bars['volume'], anchor)
+            loaded[sym] = (bars['time'], bars['close'].astype('float64'), vwap)
+
+    symbols = list(loaded)
+    times = np.unique(np.concatenate([v[0] for v in loaded.values()])) if loaded else np.empty(0, dtype='int64')
+    S, T = len(symbols), len(times)
+    close = np.full((S, T), np.nan)
+    vwap = np.full((S, T), np.nan)
+    present = np.zeros((S, T), dtype=bool)
+    for i, sym in enumerate(symbols):
+        t, c, v = loaded[sym]
+        pos = np.searchsorted(times, t)
+        close[i, pos], vwap[i, pos], present[i, pos] = c, v, True
+    return {"symbols": symbols, "times": times, "close": close, "vwap": vwap, "present": present}
+
+
+def make_grid(modes=(STRATEGY_MODE,), bands=(0.0,), commissions=(COMMISSION_RATE,), lags=(1,)) -> list:
+    """參數組合 [{"mode", "band", "commission", "lag"}]；band 為偏離 VWAP 的百分比門檻"""
+    return [
+        {"mode": int(m), "band": float(b), "commission": float(c), "lag": int(l)}
+        for m, b, c, l in itertools.product(modes, bands, commissions, lags)
+    ]
+
+
+def _positions(dev: np.ndarray, mode: int, bands: np.ndarray, lag: int) -> np.ndarray:
+    """dev [S, T] -> 部位 [B, S, T]：close 高於 VWAP 超過 band% 做多，mode 2 低於時做空，延遲 lag 根 bar 執行"""
+    thr = bands[:, None, None] / 100.0
+    with np.errstate(invalid='ignore'):
+        signal = (dev[None] > thr).astype(np.int8)
+        if mode == 2:
+            signal -= (dev[None] < -thr).astype(np.int8)
+    pos = np.zeros_like(signal)
+    if lag < signal.shape[-1]:
+        pos[..., lag:] = signal[..., :signal.shape[-1] - lag]
+    return pos
+
+
+RESULT_COLUMNS = ["mode", "band", "commission", "lag", "symbol", "return", "trades", "win_rate"]
+
+
+def prepare_arrays(panel: dict) -> tuple:
+    """
+    panel -> (ret, dev, valid) 三個 [S, N] 陣列，N 為單一 symbol 最多的 bar 數。
+    每列只放該 symbol 自己的 bar（依時間靠左排，右側補空、valid=False），
+    所以訊號延遲、交易次數與報酬都只以自己的 bar 計算，與同時載入哪些 symbol 無關。
+    """
+    close, vwap, present = panel["close"], panel["vwap"], panel["present"]
+    S = len(close)
+    counts = present.sum(axis=1)
+    N = int(counts.max()) if S else 0
+    rows, cols = np.nonzero(present)
+    slot = (np.cumsum(present, axis=1) - 1)[rows, cols]
+    own_close = np.full((S, N), np.nan)
+    own_vwap = np.full((S, N), np.nan)
+    own_close[rows, slot], own_vwap[rows, slot] = close[rows, cols], vwap[rows, cols]
+    valid = np.arange(N)[None, :] < counts[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ret = np.zeros_like(own_close)
+        ret[:, 1:] = own_close[:, 1:] / own_close[:, :-1] - 1.0
+        ret = np.nan_to_num(ret, nan=0.0, posinf=0.0, neginf=0.0)
+        # 時段外 (vwap NaN) 視為偏離 0 → 空手
+        dev = np.nan_to_num(own_close / own_vwap - 1.0, nan=0.0)
+    return np.ascontiguousarray(ret), np.ascontiguousarray(dev), valid
+
+
+def _sort_results(df: pd.DataFrame, symbols: list) -> pd.DataFrame:
+    """固定的輸出順序 (mode, lag, commission, band, symbol 原順序)，單程序與多程序結果一致"""
+    if df.empty:
+        return df
+    order = {sym: i for i, sym in enumerate(symbols)}
+    df = df.assign(_sym=df["symbol"].map(order))
+    df = df.sort_values(["mode", "lag", "commission", "band", "_sym"], kind="stable")
+    return df.drop(columns="_sym").reset_index(drop=True)
+
+
+def evaluate_arrays(ret: np.ndarray, dev: np.ndarray, symbols: list, grid: list, max_cells: int = MAX_CELLS,
+                    valid: np.ndarray = None) -> pd.DataFrame:
+    """valid [S, T]：該位置是否為 symbol 自己的 bar（prepare_arrays 的右側補空為 False；None = 全部有效）"""
+    S, T = ret.shape
+    if not S or T < 2 or not grid:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    valid = np.ones((S, T), dtype=bool) if valid is None else valid
+
+    rows = []
+    keyfn = lambda g: (g["mode"], g["lag"])
+    for (mode, lag), group in itertools.groupby(sorted(grid, key=keyfn), key=keyfn):
+        group = list(group)
+        bands = np.array(sorted({g["band"] for g in group}))
+        comms = np.array(sorted({g["commission"] for g in group}))
+        wanted = {(g["band"], g["commission"]) for g in group}
+        step = max(1, max_cells // max(1, len(comms) * S * T))
+        for b0 in range(0, len(bands), step):
+            b = bands[b0:b0 + step]
+            pos = _positions(dev, mode, b, lag).astype(np.float64) * valid  # [B, S, T]
+            trades = np.abs(np.diff(pos, axis=-1, prepend=0.0)) * valid      # [B, S, T]，補空處的平倉不算
+            gross = pos * ret[None]
+            net = gross[None] - trades[None] * comms[:, None, None, None]    # [C, B, S, T]
+            # 與原本 equity curve 的 cumprod 相同；net < -1（做空遇大漲）時 log1p 會變 NaN，不能用 log 加總
+            total_ret = np.prod(1.0 + net, axis=-1) - 1.0                    # [C, B, S]
+            wins = (net > 0).sum(axis=-1)
+            active = (pos != 0).sum(axis=-1)                                 # [B, S]
+            n_trades = trades.sum(axis=-1)
+            for ci, c in enumerate(comms):
+                for bi, band in enumerate(b):
+                    if (band, c) not in wanted:
+                        continue
+                    for si, sym in enumerate(symbols):
+                        act = active[bi, si]
+                        rows.append({
+                            "mode": mode, "band": band, "commission": c, "lag": lag, "symbol": sym,
+                            "return": float(total_ret[ci, bi, si]),
+                            "trades": int(n_trades[bi, si]),
+                            "win_rate": float(wins[ci, bi, si] / act * 100) if act else 0.0,
+                        })
+    return _sort_results(pd.DataFrame(rows, columns=RESULT_COLUMNS), symbols)
+
+
+def evaluate(panel: dict, grid: list, max_cells: int = MAX_CELLS) -> pd.DataFrame:
+    """
+    對 panel 內所有 symbol 評估整個 grid，回傳每個 (參數, symbol) 一列的結果表。
+    同 (mode, lag) 的 band × commission 在同一次陣列運算中完成。
+    """
+    ret, dev, valid = prepare_arrays(panel)
+    return evaluate_arrays(ret, dev, panel["symbols"], grid, max_cells, valid)
+
 
-def run_backtest():
-    json_files = glob.glob(os.path.join(DATA_DIR, "*.json"))
-    if not json_files:
-        print(f"No JSON files in {DATA_DIR}")
+_SHARED = {}
+
+
+def _attach_shared(specs: dict):
+    """worker initializer：以名稱 attach 主程序建立的 shared memory，不複製資料"""
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _SHARED[name] = (shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+
+
+def _run_shard(shard: tuple) -> pd.DataFrame:
+    s0, s1, symbols, grid, max_cells = shard
+    ret = _SHARED["ret"][1][s0:s1]
+    dev = _SHARED["dev"][1][s0:s1]
+    valid = _SHARED["valid"][1][s0:s1]
+    return evaluate_arrays(ret, dev, symbols, grid, max_cells, valid)
+
+
+def _chunks(items: list, n: int) -> list:
+    size = -(-len(items) // max(1, n))
+    return [items[i:i + size] for i in range(0, len(items), size)] if items else []
+
+
+def make_shards(symbols: list, grid: list, processes: int, max_cells: int = MAX_CELLS) -> list:
+    """
+    symbol 區段 × 參數區段。symbol 不夠分給所有 worker 時再切 grid，
+    grid 先依 (mode, lag) 排序，讓同一組盡量留在同一個 shard 內共用陣列運算。
+    """
+    sym_parts = _chunks(list(range(len(symbols))), processes)
+    grid_parts = _chunks(sorted(grid, key=lambda g: (g["mode"], g["lag"])), -(-2 * processes // max(1, len(sym_parts))))
+    shards = []
+    for part in sym_parts:
+        s0, s1 = part[0], part[-1] + 1
+        for g in grid_parts:
+            shards.append((s0, s1, symbols[s0:s1], g, max_cells))
+    return shards
+
+
+def evaluate_parallel(panel: dict, grid: list, processes: int = None, max_cells: int = MAX_CELLS) -> pd.DataFrame:
+    """
+    多程序版 evaluate：ret / dev / valid 放進 shared memory，worker 依 shard 切片計算，
+    結果依固定順序合併，與單程序 evaluate 完全相同。
+    """
+    processes = processes or os.cpu_count() or 1
+    ret, dev, valid = prepare_arrays(panel)
+    symbols = panel["symbols"]
+    if processes <= 1 or not ret.size:
+        return evaluate_arrays(ret, dev, symbols, grid, max_cells, valid)
+
+    blocks = {}
+    try:
+        specs = {}
+        for name, arr in (("ret", ret), ("dev", dev), ("valid", valid)):
+            shm = shared_memory.SharedMemory(create=True, size=arr.nbytes)
+            blocks[name] = shm
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+            specs[name] = (shm.name, arr.shape, arr.dtype.str)
+        shards = make_shards(symbols, grid, processes, max_cells)
+        with ProcessPoolExecutor(max_workers=min(processes, len(shards)), initializer=_attach_shared, initargs=(specs,)) as pool:
+            parts = list(pool.map(_run_shard, shards))
+    finally:
+        for shm in blocks.values():
+            shm.close()
+            shm.unlink()
+    return _sort_results(pd.concat(parts, ignore_index=True), symbols)
+
+
+def summarize(results: pd.DataFrame) -> pd.DataFrame:
+    """
+    每組參數的跨 symbol 平均，依平均報酬排序。任一 symbol 報酬為 NaN 時該組平均也是 NaN（排在最後），
+    不會默默少算那個 symbol；invalid 欄位為 NaN 的 symbol 數。
+    """
+    keys = ["mode", "band", "commission", "lag"]
+    summary = results.groupby(keys, as_index=False).agg(
+        avg_return=("return", lambda r: r.mean(skipna=False)),
+        median_return=("return", lambda r: r.median(skipna=False)),
+        trades=("trades", "sum"), win_rate=("win_rate", "mean"), symbols=("symbol", "count"),
+        invalid=("return", lambda r: int(r.isna().sum())),
+    )
+    return summary.sort_values("avg_return", ascending=False, na_position="last").reset_index(drop=True)
+
+
+def _parse_list(text: str, cast):
+    return [cast(x) for x in text.split(",") if x.strip()]
+
+
+def run_backtest(grid: list = None, symbols=None, data_dir: str = DATA_DIR, store_dir: str = STORE_DIR, processes: int = 1):
+    panel = load_panel(symbols, data_dir, store_dir)
+    if not panel["symbols"]:
+        print(f"No intraday data in {data_dir} / {store_dir}")
+        return None
+    with instrument.timer("backtest.evaluate"):
+        if processes != 1:
+            return evaluate_parallel(panel, grid or make_grid(), processes)
+        return evaluate(panel, grid or make_grid())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VWAP strategy backtest (vectorized parameter grid)")
+    parser.add_argument("--symbols", default="", help="Comma-separated symbols (default: all)")
+    parser.add_argument("--modes", default=str(STRATEGY_MODE), help="1 = Long only, 2 = Long/Short, e.g. 1,2")
+    parser.add_argument("--bands", default="0", help="VWAP deviation thresholds in %%, e.g. 0,0.1,0.2")
+    parser.add_argument("--commissions", default=str(COMMISSION_RATE), help="Commission per trade, e.g. 0,0.0005")
+    parser.add_argument("--lags", default="1", help="Execution lag in bars, e.g. 1,2,3")
+    parser.add_argument("--top", type=int, default=20, help="Rows to print for grid runs")
+    parser.add_argument("--out", default="", help="Write the full results table to CSV")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes (0 = all cores)")
+    args = parser.parse_args()
+
+    grid = make_grid(
+        _parse_list(args.modes, int), _parse_list(args.bands, float),
+        _parse_list(args.commissions, float), _parse_list(args.lags, int),
+    )
+    symbols = _parse_list(args.symbols.upper(), str) or None
+    results = run_backtest(grid, symbols, processes=args.processes or None)
+    rows = 0 if results is None else len(results)
+    instrument.finish("backtest", extra={"configs": len(grid), "rows": rows})
+    if results is None or results.empty:
         return
-    results = []
-    print(f"{'SYMBOL':<10} {'TRADES':<10} {'WIN_RATE':<10} {'RETURN':<10}")
-    print("-" * 45)
-    for filepath in json_files:
-        symbol = os.path.basename(filepath).split('.')[0].split('_')[1]  # 從 intraday_SYMBOL_date.json 取 SYMBOL
-        with open(filepath, 'r') as f:
-            data = json.load(f)
-        df = pd.DataFrame(data)
-        if 'close' not in df or 'vwap' not in df:
-            continue
-        df['signal'] = 0
-        df.loc[df['close'] > df['vwap'], 'signal'] = 1
-        if STRATEGY_MODE == 2:
-            df.loc[df['close'] < df['vwap'], 'signal'] = -1
-        df['position'] = df['signal'].shift(1)
-        df['market_return'] = df['close'].pct_change()
-        df['strategy_return'] = df['position'] * df['market_return']
-        df['trades'] = df['position'].diff().abs().fillna(0)
-        df['strategy_return_net'] = df['strategy_return'] - (df['trades'] * COMMISSION_RATE)
-        df['equity_curve'] = (1 + df['strategy_return_net']).cumprod() * INITIAL_CAPITAL
-        total_return = (df['equity_curve'].iloc[-1] / INITIAL_CAPITAL) - 1
-        total_trades = df['trades'].sum()
-        winning_trades = len(df[df['strategy_return_net'] > 0])
-        active_trades = len(df[df['position'] != 0])
-        win_rate = (winning_trades / active_trades * 100) if active_trades > 0 else 0
-        results.append({'symbol': symbol, 'return': total_return, 'trades': total_trades, 'win_rate': win_rate})
-        print(f"{symbol:<10} {int(total_trades):<10} {win_rate:.1f}%     {total_return:.2%}")
-    if results:
-        df_res = pd.DataFrame(results)
-        avg_return = df_res['return'].mean()
+    if args.out:
+        results.to_csv(args.out, index=False)
+        print(f"Saved {len(results)} rows to {args.out}")
+
+    if len(grid) == 1:
+        print(f"{'SYMBOL':<10} {'TRADES':<10} {'WIN_RATE':<10} {'RETURN':<10}")
+        print("-" * 45)
+        for r in results.to_dict("records"):
+            print(f"{r['symbol']:<10} {r['trades']:<10} {r['win_rate']:.1f}%     {r['return']:.2%}")
         print("-" * 45)
-        print(f"AVERAGE RETURN: {avg_return:.2%}")
+        print(f"AVERAGE RETURN: {results['return'].mean(skipna=False):.2%}")
+        return
+
+    summary = summarize(results)
+    print(f"{len(grid)} configs x {results['symbol'].nunique()} symbols")
+    invalid = int(summary["invalid"].gt(0).sum())
+    if invalid:
+        print(f"WARNING: {invalid} configs have NaN returns (avg_return NaN, listed last)")
+    print(f"{'MODE':<5} {'BAND%':<7} {'COMM':<8} {'LAG':<4} {'AVG_RET':>9} {'MED_RET':>9} {'TRADES':>8} {'WIN%':>6}")
+    print("-" * 62)
+    for r in summary.head(args.top).itertuples():
+        print(f"{r.mode:<5} {r.band:<7g} {r.commission:<8g} {r.lag:<4} {r.avg_return:>9.2%} {r.median_return:>9.2%} {r.trades:>8} {r.win_rate:>5.1f}%")
+
 
 if __name__ == "__main__":
-    run_backtest()
\ No newline at end of file
+    main()
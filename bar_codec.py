@@ -0,0 +1,130 @@
+# bar_codec.py - intraday bar 的精簡二進位格式 (.tvb)：欄式、時間差分、價格定點整數，可選 gzip / zstd 壓縮
+
+import gzip
+import os
+import struct
+import numpy as np
+import bar_store
+import instrument
+
+try:
+    import zstandard
+except ImportError:  # 選用：沒裝時只支援 raw / gzip
+    zstandard = None
+
+MAGIC = b"TVB1"
+VERSION = 1
+# magic, version, decimals, reserved, rows, 第一筆 time
+HEADER = struct.Struct("<4sBBHIq")
+NULL_VWAP = np.iinfo(np.int32).min
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+EXTENSIONS = {None: ".tvb", "gzip": ".tvb.gz", "zstd": ".tvb.zst"}
+
+PRICE_FIELDS = ("open", "high", "low", "close")
+
+
+def _fixed(values: np.ndarray, scale: int) -> np.ndarray:
+    return np.round(np.asarray(values, dtype="float64") * scale).astype("int64")
+
+
+def _delta(x: np.ndarray) -> np.ndarray:
+    return np.diff(x, prepend=x[:1]).astype("<i4") if len(x) else np.empty(0, dtype="<i4")
+
+
+def encode(bars: np.ndarray, decimals: int = 2) -> bytes:
+    """
+    BAR_DTYPE -> bytes。排版：header + time 差分 (i4) + OHLC 定點差分 (i4 ×4)
+    + volume (i8) + vwap 相對 close 的定點差 (i4，NaN 為 INT32_MIN)。
+    價格以 decimals 位小數保存（與 JSON 匯出相同）。
+    """
+    bars = np.asarray(bars, dtype=bar_store.BAR_DTYPE)
+    scale = 10 ** decimals
+    n = len(bars)
+    t = bars["time"].astype("int64")
+    parts = [HEADER.pack(MAGIC, VERSION, decimals, 0, n, int(t[0]) if n else 0), _delta(t).tobytes()]
+    fixed = {name: _fixed(bars[name], scale) for name in PRICE_FIELDS}
+    for name in PRICE_FIELDS:
+        # 第一筆存絕對值，之後存與前一筆的差
+        col = _delta(fixed[name])
+        if n:
+            col[0] = fixed[name][0]
+        parts.append(col.tobytes())
+    parts.append(bars["volume"].astype("<i8").tobytes())
+    vwap = bars["vwap"].astype("float64")
+    nan = np.isnan(vwap)
+    rel = _fixed(np.where(nan, 0.0, vwap), scale) - fixed["close"]
+    parts.append(np.where(nan, NULL_VWAP, rel).astype("<i4").tobytes())
+    return b"".join(parts)
+
+
+def decode(data: bytes) -> np.ndarray:
+    """encode 的反向；也接受 gzip / zstd 壓縮過的內容"""
+    data = decompress(data)
+    magic, version, decimals, _, n, t0 = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a TVB{VERSION} payload")
+    scale = 10 ** decimals
+    offset = HEADER.size
+
+    def _take(dtype: str) -> np.ndarray:
+        nonlocal offset
+        arr = np.frombuffer(data, dtype=dtype, count=n, offset=offset)
+        offset += arr.nbytes
+        return arr
+
+    bars = np.empty(n, dtype=bar_store.BAR_DTYPE)
+    dt = _take("<i4").astype("int64")
+    if n:
+        dt[0] = t0
+    bars["time"] = np.cumsum(dt)
+    fixed = {}
+    for name in PRICE_FIELDS:
+        fixed[name] = np.cumsum(_take("<i4").astype("int64"))
+        bars[name] = fixed[name] / scale
+    bars["volume"] = _take("<i8")
+    rel = _take("<i4")
+    bars["vwap"] = np.where(rel == NULL_VWAP, np.nan, (fixed["close"] + rel) / scale)
+    return bars
+
+
+def compress(data: bytes, compression: str = None) -> bytes:
+    if compression is None:
+        return data
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=9, mtime=0)  # mtime=0：內容不變時檔案也不變
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=19).compress(data)
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def decompress(data: bytes) -> bytes:
+    if data[:2] == GZIP_MAGIC:
+        return gzip.decompress(data)
+    if data[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError("zstd payload requires the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def write(path: str, bars: np.ndarray, compression: str = "gzip", decimals: int = 2) -> int:
+    """寫入檔案（tmp + replace），回傳位元組數"""
+    with instrument.timer("tvb.write"):
+        data = compress(encode(bars, decimals), compression)
+    instrument.count("bytes.written", len(data))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+def read(path: str) -> np.ndarray:
+    with instrument.timer("tvb.read"), open(path, "rb") as f:
+        data = f.read()
+        instrument.count("bytes.read", len(data))
+        return decode(data)
@@ -0,0 +1,409 @@
+# bar_store.py - append-only 日分區欄式 bar 儲存（每個 symbol 一個 manifest + 每日一個 .npy segment）
+
+import json
+import os
+import logging
+import numpy as np
+import pandas as pd
+import bar_codec
+import instrument
+import vwap_engine
+from trading_calendar import MARKET_TZ
+
+STORE_DIR = "data/store"
+EXPORT_DIR = "data/intraday"
+
+BAR_DTYPE = np.dtype([
+    ("time", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<i8"),
+    ("vwap", "<f8"),
+])
+PRICE_FIELDS = ("open", "high", "low", "close", "vwap")
+# 匯出格式：json = 累加 JSON（可尾端 append），tvb.gz = bar_codec 精簡二進位（gzip，需另外啟用）。
+# tvb.gz 每次更新都要把整段歷史重新編碼 + 壓縮，git 也無法對它做差異壓縮，所以預設不寫
+EXPORT_FORMATS = tuple(f.strip() for f in os.getenv("INTRADAY_EXPORT_FORMATS", "json").split(",") if f.strip())
+MANIFEST_VERSION = 2
+
+_INDEX_CACHE = {}
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+
+def symbol_dir(symbol: str, root: str = STORE_DIR) -> str:
+    return os.path.join(root, symbol.upper())
+
+
+def export_path(symbol: str, export_dir: str = EXPORT_DIR) -> str:
+    return os.path.join(export_dir, f"intraday_{symbol.upper()}.json")
+
+
+def compact_path(symbol: str, export_dir: str = EXPORT_DIR) -> str:
+    return os.path.join(export_dir, f"intraday_{symbol.upper()}.tvb.gz")
+
+
+def _manifest_path(symbol: str, root: str) -> str:
+    return os.path.join(symbol_dir(symbol, root), "manifest.json")
+
+
+def load_manifest(symbol: str, root: str = STORE_DIR) -> dict:
+    """讀取 symbol 的 manifest，不存在時回傳空 manifest（不會讀任何 bar 資料）"""
+    path = _manifest_path(symbol, root)
+    if not os.path.exists(path):
+        return {"symbol": symbol.upper(), "version": MANIFEST_VERSION, "segments": {}, "export": None}
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version", 1) < MANIFEST_VERSION:
+        # v1 沒有日索引欄位：只讀 segment 的 time 欄位補上 first/last，之後就不用再讀
+        for day, seg in manifest["segments"].items():
+            times = load_day(symbol, day, root)["time"]
+            seg.update(_day_entry(seg["file"], times))
+        manifest["version"] = MANIFEST_VERSION
+        _write_manifest(symbol, manifest, root)
+    return manifest
+
+
+def _day_entry(file_name: str, times: np.ndarray) -> dict:
+    return {
+        "file": file_name,
+        "rows": int(len(times)),
+        "first": int(times[0]) if len(times) else 0,
+        "last": int(times[-1]) if len(times) else 0,
+    }
+
+
+def day_index(symbol: str, root: str = STORE_DIR) -> dict:
+    """
+    回傳 {date: {"file", "rows", "first", "last"}} 交易日索引。
+    以 manifest 的 mtime 快取在 process 內，重複查詢不會重讀檔案。
+    """
+    path = _manifest_path(symbol, root)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return {}
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _INDEX_CACHE.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    segments = load_manifest(symbol, root)["segments"]
+    st = os.stat(path)
+    _INDEX_CACHE[path] = ((st.st_mtime_ns, st.st_size), segments)
+    return segments
+
+
+def has_day(symbol: str, date_str: str, root: str = STORE_DIR) -> bool:
+    entry = day_index(symbol, root).get(date_str)
+    return bool(entry and entry["rows"] > 0)
+
+
+def _write_manifest(symbol: str, manifest: dict, root: str):
+    path = _manifest_path(symbol, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _write_segment(path: str, bars: np.ndarray):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, bars, allow_pickle=False)
+    os.replace(tmp, path)
+
+
+def session_dates(times: np.ndarray) -> np.ndarray:
+    """Unix timestamp -> 美東交易日字串 (盤後 bar 在 UTC 會跨日，因此以紐約時區分日)"""
+    local = pd.to_datetime(np.asarray(times, dtype="int64"), unit="s", utc=True).tz_convert(MARKET_TZ)
+    return local.tz_localize(None).values.astype("datetime64[D]").astype(str)
+
+
+def records_to_array(records) -> np.ndarray:
+    """list of {"time", "open", ...} dict -> BAR_DTYPE 結構陣列"""
+    bars = np.empty(len(records), dtype=BAR_DTYPE)
+    for name in BAR_DTYPE.names:
+        bars[name] = [r[name] for r in records]
+    return bars
+
+
+def _merge(existing: np.ndarray, new: np.ndarray) -> tuple:
+    """以 time 去重合併（既有資料優先），回傳 (merged, added_count)"""
+    if len(existing):
+        new = new[~np.isin(new["time"], existing["time"])]
+    _, first = np.unique(new["time"], return_index=True)
+    new = new[first]
+    if not len(new):
+        return existing, 0
+    merged = np.concatenate([existing, new]) if len(existing) else new
+    merged = merged[np.argsort(merged["time"], kind="stable")]
+    return merged, len(new)
+
+
+def append_bars(symbol: str, bars: np.ndarray, root: str = STORE_DIR) -> dict:
+    """
+    依交易日切分後寫入各日 segment。只會讀寫受影響的那幾天，
+    與歷史長度無關。回傳 {date: 新增筆數}。
+    """
+    symbol = symbol.upper()
+    if not len(bars):
+        return {}
+    bars = np.asarray(bars, dtype=BAR_DTYPE)
+    os.makedirs(symbol_dir(symbol, root), exist_ok=True)
+    manifest = load_manifest(symbol, root)
+    segments = manifest["segments"]
+
+    dates = session_dates(bars["time"])
+    added = {}
+    for day in np.unique(dates):
+        day_bars = bars[dates == day]
+        seg = segments.get(day)
+        existing = load_day(symbol, day, root, mmap=False) if seg else np.empty(0, dtype=BAR_DTYPE)
+        merged, count = _merge(existing, day_bars)
+        added[day] = count
+        if not count:
+            continue
+        file_name = f"{day}.npy"
+        _write_segment(os.path.join(symbol_dir(symbol, root), file_name), merged)
+        segments[day] = _day_entry(file_name, merged["time"])
+
+    if any(added.values()):
+        _write_manifest(symbol, manifest, root)
+    return added
+
+
+def replace_day(symbol: str, date_str: str, bars: np.ndarray, root: str = STORE_DIR):
+    """整段覆寫某一天的 segment（compaction 用；一般寫入請用 append_bars）"""
+    symbol = symbol.upper()
+    bars = np.sort(np.asarray(bars, dtype=BAR_DTYPE), order="time")
+    os.makedirs(symbol_dir(symbol, root), exist_ok=True)
+    manifest = load_manifest(symbol, root)
+    file_name = f"{date_str}.npy"
+    _write_segment(os.path.join(symbol_dir(symbol, root), file_name), bars)
+    manifest["segments"][date_str] = _day_entry(file_name, bars["time"])
+    _write_manifest(symbol, manifest, root)
+
+
+def list_days(symbol: str, root: str = STORE_DIR) -> list:
+    return sorted(day_index(symbol, root))
+
+
+def load_day(symbol: str, date_str: str, root: str = STORE_DIR, mmap: bool = True) -> np.ndarray:
+    """讀取單日 segment；預設以 memory-map 開啟，不會把整個檔案載入記憶體"""
+    path = os.path.join(symbol_dir(symbol, root), f"{date_str}.npy")
+    if not os.path.exists(path):
+        return np.empty(0, dtype=BAR_DTYPE)
+    return np.load(path, mmap_mode="r" if mmap else None, allow_pickle=False)
+
+
+def load_bars(symbol: str, start: str = None, end: str = None, root: str = STORE_DIR) -> np.ndarray:
+    """讀取 [start, end] 交易日範圍內的 bar（日期字串，含頭尾），依 time 排序"""
+    days = [d for d in list_days(symbol, root) if (start is None or d >= start) and (end is None or d <= end)]
+    parts = [load_day(symbol, d, root, mmap=False) for d in days]
+    if not parts:
+        return np.empty(0, dtype=BAR_DTYPE)
+    return np.concatenate(parts)
+
+
+def import_json(symbol: str, path: str = None, root: str = STORE_DIR) -> int:
+    """把舊的累加 JSON 匯入 store（一次性遷移），回傳匯入筆數"""
+    path = path or export_path(symbol)
+    if not os.path.exists(path):
+        return 0
+    with instrument.timer("json.load"), open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    instrument.file_bytes(path, "read")
+    rows = len(data)
+    data = [d for d in data if d.get("time")]
+    if not data:
+        return 0
+    added = append_bars(symbol, records_to_array(data), root)
+    total = sum(added.values())
+    logging.info(f"匯入舊 JSON 至 store: {path} ({total} 筆, {len(added)} 天)")
+    _adopt_export(symbol, path, data, rows, root)
+    return total
+
+
+def _adopt_export(symbol: str, path: str, data: list, rows: int, root: str):
+    """
+    匯入的 JSON 已是 export_json 的格式且與 store 內容一致時，記下匯出狀態，
+    下次 export 直接在檔尾 append，不必重寫（例如 CI 沒有保留 store 時）。
+    """
+    times = [d["time"] for d in data]
+    manifest = load_manifest(symbol, root)
+    stored = sum(seg["rows"] for seg in manifest["segments"].values())
+    if rows != len(data) or stored != rows or any(a >= b for a, b in zip(times, times[1:])):
+        return
+    with open(path, "rb") as f:
+        f.seek(-3, os.SEEK_END)
+        if f.read(3) != b"\n]\n":
+            return
+    manifest["export"] = {"rows": rows, "last_time": int(times[-1]), "size": os.path.getsize(path)}
+    _write_manifest(symbol, manifest, root)
+
+
+def import_compact(symbol: str, path: str = None, root: str = STORE_DIR) -> int:
+    """把精簡格式匯出檔匯入 store（只有 tvb.gz、沒有 JSON 時用），回傳匯入筆數"""
+    path = path or compact_path(symbol)
+    if not os.path.exists(path):
+        return 0
+    added = append_bars(symbol, bar_codec.read(path), root)
+    total = sum(added.values())
+    logging.info(f"匯入精簡匯出檔至 store: {path} ({total} 筆, {len(added)} 天)")
+    return total
+
+
+def ensure_store(symbol: str, root: str = STORE_DIR, export_dir: str = EXPORT_DIR):
+    """store 尚未建立但有舊累加 JSON（或精簡匯出檔）時，先匯入，避免 export 覆蓋掉歷史資料"""
+    if day_index(symbol, root):
+        return
+    if not import_json(symbol, export_path(symbol, export_dir), root):
+        import_compact(symbol, compact_path(symbol, export_dir), root)
+
+
+_JSON_ROW = '{"time": %d, "open": %r, "high": %r, "low": %r, "close": %r, "volume": %d, "vwap": %s}'
+
+
+def json_lines(bars: np.ndarray, decimals: int = 2) -> list:
+    """
+    每筆 bar 轉成一行 JSON 物件字串。整欄一次 round / tolist，
+    不逐筆建 dict，輸出與 json.dumps 相同（價格取 decimals 位）。
+    """
+    cols = [bars["time"].astype("int64").tolist()]
+    for name in ("open", "high", "low", "close"):
+        cols.append(np.round(bars[name].astype("float64"), decimals).tolist())
+    cols.append(bars["volume"].astype("int64").tolist())
+    # 時段外沒有 VWAP 的 bar (NaN) 輸出成 null
+    cols.append([repr(v) if v == v else "null" for v in np.round(bars["vwap"].astype("float64"), decimals).tolist()])
+    return [_JSON_ROW % row for row in zip(*cols)]
+
+
+def dump_json(path: str, bars: np.ndarray, decimals: int = 2):
+    """寫成單行 JSON 陣列（與 json.dump(list_of_dicts) 格式相同）"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[" + ", ".join(json_lines(bars, decimals)) + "]")
+
+
+def _epoch_seconds(index) -> np.ndarray:
+    idx = pd.DatetimeIndex(index)
+    if idx.tz is not None:
+        idx = idx.tz_convert("UTC").tz_localize(None)
+    return idx.values.astype("datetime64[s]").astype("int64")
+
+
+def frame_to_bars(df: pd.DataFrame, anchor: str = vwap_engine.REGULAR) -> np.ndarray:
+    """
+    normalized OHLCV DataFrame（lowercase 欄位、DatetimeIndex）-> BAR_DTYPE 陣列，
+    timestamp 與 session VWAP（vwap_engine，依 anchor 每日重置）全部以整欄 NumPy 運算完成。
+    價格缺值的 bar 會被丟掉。anchor=None 時不計算 VWAP（欄位為 NaN，由呼叫端串流填入）。
+    """
+    high = df["high"].to_numpy(dtype="float64")
+    low = df["low"].to_numpy(dtype="float64")
+    close = df["close"].to_numpy(dtype="float64")
+    opn = df["open"].to_numpy(dtype="float64")
+    volume = np.nan_to_num(df["volume"].to_numpy(dtype="float64"))
+    keep = ~(np.isnan(opn) | np.isnan(high) | np.isnan(low) | np.isnan(close))
+
+    bars = np.empty(int(keep.sum()), dtype=BAR_DTYPE)
+    bars["time"] = _epoch_seconds(df.index)[keep]
+    bars["open"], bars["high"], bars["low"], bars["close"] = opn[keep], high[keep], low[keep], close[keep]
+    bars["volume"] = volume[keep]
+    bars = bars[np.argsort(bars["time"], kind="stable")]
+    if anchor is None:
+        bars["vwap"] = np.nan
+        return bars
+    bars["vwap"] = vwap_engine.session_vwap(
+        bars["time"], bars["high"], bars["low"], bars["close"], bars["volume"], anchor
+    )
+    return bars
+
+
+def _write_export(path: str, symbol: str, root: str) -> tuple:
+    """逐日讀 segment 寫出累加 JSON，記憶體只放一天的資料；回傳 (rows, last_time)"""
+    rows, last_time = 0, 0
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("[")
+        for day in list_days(symbol, root):
+            bars = load_day(symbol, day, root)
+            if not len(bars):
+                continue
+            f.write(("\n" if not rows else ",\n") + ",\n".join(json_lines(bars)))
+            rows += len(bars)
+            last_time = int(bars["time"][-1])
+        f.write("\n]\n")
+    os.replace(tmp, path)
+    return rows, last_time
+
+
+@instrument.timed("json.dump")
+def export_json(symbol: str, new_bars: np.ndarray = None, root: str = STORE_DIR, export_dir: str = EXPORT_DIR) -> str:
+    """
+    產生 chart.js 讀取的累加 JSON（每行一筆 bar 的陣列）。
+    new_bars 全部晚於上次匯出的最後時間且檔案未被改動時，直接在檔尾 append；
+    否則從 store 重建整個檔案。
+    """
+    symbol = symbol.upper()
+    path = export_path(symbol, export_dir)
+    os.makedirs(export_dir, exist_ok=True)
+    manifest = load_manifest(symbol, root)
+    state = manifest.get("export")
+
+    can_append = (
+        new_bars is not None and len(new_bars) and state
+        and state.get("rows") and os.path.exists(path)
+        and os.path.getsize(path) == state.get("size")
+        and int(np.min(new_bars["time"])) > state["last_time"]
+    )
+    if can_append:
+        new_bars = np.sort(np.asarray(new_bars, dtype=BAR_DTYPE), order="time")
+        with open(path, "r+b") as f:
+            f.seek(-3, os.SEEK_END)
+            if f.read(3) != b"\n]\n":
+                can_append = False
+            else:
+                f.seek(-3, os.SEEK_END)
+                f.write((",\n" + ",\n".join(json_lines(new_bars)) + "\n]\n").encode("utf-8"))
+                f.truncate()
+        if can_append:
+            rows = state["rows"] + len(new_bars)
+            last_time = int(new_bars["time"][-1])
+
+    if not can_append:
+        rows, last_time = _write_export(path, symbol, root)
+
+    size = os.path.getsize(path)
+    instrument.count("bytes.written", size - state["size"] if can_append else size)
+    manifest["export"] = {"rows": rows, "last_time": last_time, "size": size}
+    _write_manifest(symbol, manifest, root)
+    return path
+
+
+def export_compact(symbol: str, root: str = STORE_DIR, export_dir: str = EXPORT_DIR) -> str:
+    """從 store 重寫精簡格式匯出檔 (bar_codec, gzip)"""
+    path = compact_path(symbol, export_dir)
+    os.makedirs(export_dir, exist_ok=True)
+    bar_codec.write(path, load_bars(symbol, root=root), "gzip")
+    return path
+
+
+def export_intraday(symbol: str, new_bars: np.ndarray = None, force: bool = False,
+                    root: str = STORE_DIR, export_dir: str = EXPORT_DIR, formats=EXPORT_FORMATS) -> list:
+    """
+    依 formats 更新匯出檔。force=False 時只補寫不存在的檔案；
+    有新 bar 時由呼叫端傳 force=True。回傳寫過的路徑。
+    """
+    written = []
+    if "json" in formats and (force or not os.path.exists(export_path(symbol, export_dir))):
+        written.append(export_json(symbol, new_bars, root, export_dir))
+    compact = compact_path(symbol, export_dir)
+    if "tvb.gz" in formats and (force or not os.path.exists(compact)):
+        written.append(export_compact(symbol, root, export_dir))
+    elif "tvb.gz" not in formats and force and os.path.exists(compact):
+        # 未啟用精簡格式時舊檔不會再更新：刪掉，以免 chart.js 優先讀到過期資料
+        os.remove(compact)
+        logging.info(f"{symbol}: removed stale {compact}")
+    return written
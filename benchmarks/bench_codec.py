@@ -0,0 +1,83 @@
+# benchmarks/bench_codec.py - 累加 JSON vs bar_codec 精簡格式：round-trip 檢查、檔案大小、解析時間
+# 用法（repo 根目錄）: python -m benchmarks.bench_codec [--symbols AMD,NVDA] [--bars 50000] [--repeat 3]
+
+import argparse
+import gzip
+import json
+import os
+import time
+import numpy as np
+import bar_codec
+import bar_store
+from benchmarks.bench_encode import make_frame
+
+
+def json_text(bars: np.ndarray) -> str:
+    """目前匯出的累加 JSON（每行一筆 bar）"""
+    return "[\n" + ",\n".join(bar_store.json_lines(bars)) + "\n]\n"
+
+
+def round_trip_ok(bars: np.ndarray, compression: str) -> bool:
+    """decode(encode(x)) 必須等於 x 取兩位小數（與 JSON 匯出相同精度）"""
+    back = bar_codec.decode(bar_codec.compress(bar_codec.encode(bars), compression))
+    for name in bar_store.BAR_DTYPE.names:
+        expected = np.round(bars[name], 2) if name in bar_store.PRICE_FIELDS else bars[name]
+        if not np.array_equal(back[name], expected, equal_nan=True):
+            return False
+    return True
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def load_cases(symbols, n_bars: int) -> dict:
+    cases = {}
+    for sym in symbols:
+        path = bar_store.export_path(sym)
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = [d for d in json.load(f) if d.get("time")]
+            cases[sym] = np.sort(bar_store.records_to_array(data), order="time")
+    if not cases:
+        cases[f"synthetic-{n_bars}"] = bar_store.frame_to_bars(make_frame(n_bars))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intraday export format benchmark")
+    parser.add_argument("--symbols", default="AMD,NVDA,TSLA", help="Symbols with data/intraday exports")
+    parser.add_argument("--bars", type=int, default=50000, help="Synthetic bars when no export exists")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'CASE':<16} {'FORMAT':<10} {'BYTES':>11} {'RATIO':>7} {'PARSE s':>9} {'ROUND-TRIP':>11}")
+    print("-" * 68)
+    failed = False
+    for name, bars in load_cases(args.symbols.split(","), args.bars).items():
+        raw = json_text(bars).encode("utf-8")
+        formats = {"json": (raw, True), "json.gz": (gzip.compress(raw, mtime=0), True)}
+        for fmt, comp in (("tvb", None), ("tvb.gz", "gzip"), ("tvb.zst", "zstd")):
+            if comp == "zstd" and bar_codec.zstandard is None:
+                continue
+            formats[fmt] = (bar_codec.compress(bar_codec.encode(bars), comp), round_trip_ok(bars, comp))
+        for fmt, (data, ok) in formats.items():
+            if fmt.startswith("json"):
+                parse = lambda d=data: json.loads(gzip.decompress(d) if d[:2] == bar_codec.GZIP_MAGIC else d)
+            else:
+                parse = lambda d=data: bar_codec.decode(d)
+            failed |= not ok
+            seconds = best_of(parse, args.repeat)
+            print(f"{name:<16} {fmt:<10} {len(data):>11,} {len(raw) / len(data):>6.1f}x {seconds:>9.4f} {'ok' if ok else 'FAIL':>11}")
+        print("-" * 68)
+    if failed:
+        raise SystemExit("round-trip mismatch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# benchmarks/bench_encode.py - bar 編碼 microbenchmark：舊的 iterrows 寫法 vs bar_store 向量化路徑
+# 用法（repo 根目錄）: python -m benchmarks.bench_encode [--bars 50000] [--repeat 3]
+
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+import bar_store
+import vwap_engine
+
+OHLCV_FIELDS = ("time", "open", "high", "low", "close", "volume")
+
+
+def make_frame(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, n))
+    spread = np.abs(rng.normal(0, 0.05, n))
+    idx = pd.date_range("2026-01-05 09:30", periods=n, freq="1min", tz="America/New_York")
+    return pd.DataFrame({
+        "open": close + rng.normal(0, 0.02, n),
+        "high": close + spread,
+        "low": close - spread,
+        "close": close,
+        "volume": rng.integers(0, 50000, n),
+    }, index=idx)
+
+
+def legacy_encode(df: pd.DataFrame) -> str:
+    """
+    計時 baseline：原本 save_intraday_data / append_or_merge_intraday_json 的逐列寫法。
+    VWAP 是舊的整段累計（不分時段），只拿來比對 OHLCV；VWAP 的正確性另外和 streaming_vwap 比。
+    """
+    temp_df = df.copy()
+    temp_df["tp"] = (temp_df["high"] + temp_df["low"] + temp_df["close"]) / 3
+    temp_df["pv"] = temp_df["tp"] * temp_df["volume"]
+    temp_df["cum_pv"] = temp_df["pv"].cumsum()
+    temp_df["cum_vol"] = temp_df["volume"].cumsum()
+    temp_df["vwap"] = temp_df["cum_pv"] / temp_df["cum_vol"].replace(0, 1)
+    chart_data = []
+    for idx, row in temp_df.iterrows():
+        chart_data.append({
+            "time": int(idx.timestamp()), "open": round(row["open"], 2), "high": round(row["high"], 2),
+            "low": round(row["low"], 2), "close": round(row["close"], 2),
+            "volume": int(row["volume"]), "vwap": round(row["vwap"], 2)
+        })
+    return json.dumps(chart_data)
+
+
+def streaming_vwap(df: pd.DataFrame) -> list:
+    """VWAP 參考值：逐筆餵 VwapEngine（時段外為 None），取兩位小數"""
+    engine = vwap_engine.VwapEngine(vwap_engine.REGULAR)
+    out = []
+    for idx, h, l, c, v in zip(df.index, df["high"], df["low"], df["close"], df["volume"]):
+        value = engine.update(int(idx.timestamp()), h, l, c, v)
+        out.append(None if value is None else round(value["vwap"], 2))
+    return out
+
+
+def vectorized_encode(df: pd.DataFrame) -> str:
+    bars = bar_store.frame_to_bars(df)
+    return "[" + ", ".join(bar_store.json_lines(bars)) + "]"
+
+
+def bench(fn, df, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn(df)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bar encoding microbenchmark")
+    parser.add_argument("--bars", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_frame(args.bars)
+    old, new = json.loads(legacy_encode(df)), json.loads(vectorized_encode(df))
+    ohlcv_mismatch = sum(1 for a, b in zip(old, new) if any(a[k] != b[k] for k in OHLCV_FIELDS))
+    vwap_mismatch = sum(1 for a, b in zip(streaming_vwap(df), new) if a != b["vwap"])
+
+    t_old = bench(legacy_encode, df, args.repeat)
+    t_new = bench(vectorized_encode, df, args.repeat)
+    print(f"{'PATH':<12} {'SECONDS':>10} {'BARS/SEC':>14}")
+    print("-" * 38)
+    print(f"{'iterrows':<12} {t_old:>10.4f} {args.bars / t_old:>14,.0f}")
+    print(f"{'vectorized':<12} {t_new:>10.4f} {args.bars / t_new:>14,.0f}")
+    print("-" * 38)
+    print(f"speedup x{t_old / t_new:.1f}")
+    print(f"OHLCV rows differing from iterrows: {ohlcv_mismatch}/{len(old)}")
+    print(f"session VWAP rows differing from streaming VwapEngine: {vwap_mismatch}/{len(new)}")
+
+
+if __name__ == "__main__":
+    main()
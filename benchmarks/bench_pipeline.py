@@ -0,0 +1,200 @@
+# benchmarks/bench_pipeline.py - 離線端到端 benchmark：合成資料 + 假 yfinance，跑實際的 ingest / backtest / premarket 路徑
+# 用法（repo 根目錄）: python -m benchmarks.bench_pipeline [--sizes 1x1,10x5,50x20 | all] [--compare 上次結果.json]
+# 每次結果寫到 benchmarks/results/pipeline_{UTC 時間}_{commit}.json，可用 --compare 和之前的結果比較
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+import backtest_vmap
+import bar_store
+import chart_tiles
+import fetch_pool
+import instrument
+import premarket_scan
+import utils
+import vwap_yf
+from benchmarks import fake_yf, synthetic
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+RESULTS_VERSION = 1
+END_DATE = "2026-06-30"  # 固定日期：每次產生的資料完全相同
+# 名稱 -> (symbols, 歷史交易日數)；另外再產生兩天給 append / save 路徑寫入
+SIZES = {
+    "1x1": (1, 1),
+    "10x5": (10, 5),
+    "50x20": (50, 20),
+    "100x63": (100, 63),
+    "500x504": (500, 504),
+}
+DEFAULT_SIZES = "1x1,10x5,50x20"
+PATHS = ("day_exists_in_cumulative_json", "append_or_merge_intraday_json", "save_intraday_data",
+         "run_backtest", "premarket_scan")
+
+
+@contextmanager
+def workdir(path: str):
+    """所有模組的 data/ 路徑都是相對路徑：切到暫存目錄就不會碰到 repo 的資料"""
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(cwd)
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(RESULTS_DIR), timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def machine() -> dict:
+    return {
+        "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+        "numpy": np.__version__, "pandas": pd.__version__,
+    }
+
+
+def build_history(symbols: list, days: list, seed: int) -> int:
+    """歷史資料整批寫進 store + 匯出檔 + chart tile（不計時），回傳 bar 數"""
+    total = 0
+    end = (datetime.strptime(days[-1], "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    for sym in symbols:
+        bars = bar_store.frame_to_bars(synthetic.frame(sym, days[0], end, seed=seed))
+        bar_store.append_bars(sym, bars)
+        bar_store.export_intraday(sym, force=True)
+        chart_tiles.update_tiles(sym)
+        total += len(bars)
+    return total
+
+
+def measure(calls: int, fn) -> dict:
+    instrument.reset()
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    snap = instrument.snapshot()
+    return {
+        "seconds": round(seconds, 6), "calls": calls, "per_call_ms": round(seconds / max(calls, 1) * 1000, 4),
+        "stages": snap["stages"], "counters": snap["counters"],
+    }
+
+
+def run_case(size: str, seed: int = 0, workers: int = fetch_pool.DEFAULT_WORKERS, paths=PATHS) -> dict:
+    n_symbols, n_days = SIZES[size]
+    symbols = synthetic.symbols(n_symbols)
+    result = {"symbols": n_symbols, "days": n_days, "paths": {}}
+
+    tmp = tempfile.mkdtemp(prefix=f"bench_{size}_")
+    try:
+        with workdir(tmp):
+            all_days = synthetic.trading_days(END_DATE, n_days + 2)
+            history, append_day, save_day = all_days[:n_days], all_days[-2], all_days[-1]
+            start = time.perf_counter()
+            result["history_bars"] = build_history(symbols, history, seed)
+            append_frames = {s: synthetic.day_frame(s, append_day, seed=seed) for s in symbols}
+            save_frames = {s: synthetic.day_frame(s, save_day, seed=seed) for s in symbols}
+            result["setup_seconds"] = round(time.perf_counter() - start, 3)
+            runs = {
+                # 一檔查兩次：已存在的最後一天 + 尚未寫入的新一天
+                "day_exists_in_cumulative_json": (2 * n_symbols, lambda: [
+                    vwap_yf.day_exists_in_cumulative_json(s, d) for s in symbols for d in (history[-1], append_day)
+                ]),
+                "append_or_merge_intraday_json": (n_symbols, lambda: [
+                    vwap_yf.append_or_merge_intraday_json(s, append_day, append_frames[s]) for s in symbols
+                ]),
+                "save_intraday_data": (n_symbols, lambda: [
+                    utils.save_intraday_data(save_frames[s], s, save_day) for s in symbols
+                ]),
+                "run_backtest": (n_symbols, lambda: backtest_vmap.run_backtest(
+                    symbols=symbols, data_dir=bar_store.EXPORT_DIR, store_dir=bar_store.STORE_DIR
+                )),
+            }
+            for name in paths:
+                if name in runs:
+                    calls, fn = runs[name]
+                    result["paths"][name] = measure(calls, fn)
+            if "premarket_scan" in paths:
+                with fake_yf.patched(fake_yf.FakeYFinance(seed)) as provider:
+                    result["paths"]["premarket_scan"] = measure(
+                        n_symbols, lambda: premarket_scan.scan_watchlist(symbols, workers)
+                    )
+                    result["paths"]["premarket_scan"]["fake_requests"] = dict(provider.calls)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return result
+
+
+def print_table(cases: dict, previous: dict = None):
+    header = f"{'SIZE':<9} {'PATH':<31} {'CALLS':>6} {'SECONDS':>9} {'MS/CALL':>9}"
+    print(header + (f" {'PREV s':>9} {'RATIO':>7}" if previous else ""))
+    print("-" * (len(header) + (18 if previous else 0)))
+    for size, case in cases.items():
+        for name, r in case["paths"].items():
+            line = f"{size:<9} {name:<31} {r['calls']:>6} {r['seconds']:>9.3f} {r['per_call_ms']:>9.2f}"
+            old = (previous or {}).get(size, {}).get("paths", {}).get(name)
+            if old:
+                line += f" {old['seconds']:>9.3f} {r['seconds'] / max(old['seconds'], 1e-9):>6.2f}x"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Comma-separated from {', '.join(SIZES)} or 'all'")
+    parser.add_argument("--paths", default=",".join(PATHS), help="Comma-separated subset of benchmarked paths")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=fetch_pool.DEFAULT_WORKERS, help="premarket_scan workers")
+    parser.add_argument("--out", help="Result file (default benchmarks/results/pipeline_<time>_<commit>.json)")
+    parser.add_argument("--compare", help="Previous result file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Keep INFO logs from the benchmarked code")
+    args = parser.parse_args()
+
+    sizes = list(SIZES) if args.sizes == "all" else [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        raise SystemExit(f"Unknown sizes: {unknown}")
+    paths = [p.strip() for p in args.paths.split(",") if p.strip()]
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)["cases"]
+
+    cases = {}
+    for size in sizes:
+        print(f"running {size} ...", file=sys.stderr, flush=True)
+        cases[size] = run_case(size, args.seed, args.workers, paths)
+
+    created = datetime.now(timezone.utc)
+    commit = git_commit()
+    report = {
+        "version": RESULTS_VERSION, "created": created.isoformat(timespec="seconds"), "commit": commit,
+        "seed": args.seed, "end_date": END_DATE, "machine": machine(), "cases": cases,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"pipeline_{created.strftime('%Y%m%dT%H%M%SZ')}_{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print_table(cases, previous)
+    print(f"\nresults: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# benchmarks/fake_yf.py - 離線的假 yfinance：download / Ticker (options、option_chain、info、fast_info) 都由 synthetic 產生
+# with fake_yf.patched(): ... 期間 yf.download / yf.Ticker 換成假的、yf_cache 停用、Yahoo 限速關閉
+
+import functools
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import yfinance as yf
+import fetch_pool
+import yf_cache
+from benchmarks import synthetic
+from trading_calendar import MARKET_TZ
+
+N_EXPIRIES = 6
+N_STRIKES = 40
+
+
+@functools.lru_cache(maxsize=4096)
+def _day(symbol: str, day: str, interval: str, prepost: bool, seed: int) -> pd.DataFrame:
+    return synthetic.day_frame(symbol, day, interval, prepost, seed)
+
+
+def _today() -> date:
+    return datetime.now(MARKET_TZ).date()
+
+
+class FakeTicker:
+    def __init__(self, symbol: str, provider: "FakeYFinance"):
+        self.ticker = symbol.upper()
+        self._provider = provider
+
+    def _quote(self) -> dict:
+        prev_day = synthetic.trading_days(_today() - timedelta(days=1), 1)[0]
+        prev_close = synthetic.anchor_price(self.ticker, prev_day, self._provider.seed)
+        rng = synthetic.rng_for(self.ticker, _today().isoformat(), self._provider.seed, 2)
+        return {
+            "symbol": self.ticker,
+            "regularMarketPrice": prev_close,
+            "regularMarketPreviousClose": prev_close,
+            "preMarketPrice": round(prev_close * (1 + rng.normal(0, 0.015)), 2),
+        }
+
+    @property
+    def info(self) -> dict:
+        self._provider.count("info")
+        return self._quote()
+
+    @property
+    def fast_info(self):
+        q = self._quote()
+        return SimpleNamespace(last_price=q["regularMarketPrice"], previous_close=q["regularMarketPreviousClose"])
+
+    @property
+    def options(self) -> tuple:
+        """接下來 N_EXPIRIES 個週五"""
+        d = _today()
+        first = d + timedelta(days=(4 - d.weekday()) % 7 or 7)
+        return tuple((first + timedelta(weeks=i)).isoformat() for i in range(N_EXPIRIES))
+
+    def _side(self, price: float, expiry: str, put: bool) -> pd.DataFrame:
+        rng = synthetic.rng_for(self.ticker, expiry, self._provider.seed, 3 + put)
+        strikes = np.round(price * np.linspace(0.8, 1.2, N_STRIKES), 1)
+        distance = np.abs(strikes / price - 1)
+        volume = rng.poisson(8_000 * np.exp(-distance * 25) + 5)
+        oi = rng.poisson(20_000 * np.exp(-distance * 15) + 20)
+        iv = 0.35 + distance * 1.5 + rng.normal(0, 0.02, N_STRIKES)
+        return pd.DataFrame({
+            "contractSymbol": [f"{self.ticker}{expiry.replace('-', '')}{'P' if put else 'C'}{s:.1f}" for s in strikes],
+            "strike": strikes, "lastPrice": np.maximum(price - strikes if not put else strikes - price, 0.05),
+            "volume": volume.astype("float64"), "openInterest": oi.astype("int64"), "impliedVolatility": iv,
+        })
+
+    def option_chain(self, date: str = None):
+        self._provider.count("option_chain")
+        quote = self._quote()
+        expiry = date or self.options[0]
+        price = quote["regularMarketPrice"]
+        return SimpleNamespace(
+            calls=self._side(price, expiry, False), puts=self._side(price, expiry, True), underlying=quote,
+        )
+
+
+class FakeYFinance:
+    """yfinance 的最小替身：回傳格式與 yf.download(group_by="column") / yf.Ticker 相同"""
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def count(self, kind: str):
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+
+    def download(self, tickers, start=None, end=None, interval: str = "5m", prepost: bool = False, **kwargs) -> pd.DataFrame:
+        self.count("download")
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        days = synthetic.days_between(start, end)
+        frames = {}
+        for sym in tickers:
+            parts = [_day(sym.upper(), d, interval, prepost, self.seed) for d in days]
+            parts = [p for p in parts if len(p)]
+            if parts:
+                df = pd.concat(parts)
+                df.columns = [c.capitalize() for c in df.columns]
+                frames[sym.upper()] = df
+        if not frames:
+            return pd.DataFrame()
+        # 與 yfinance 相同：欄位為 (Price, Ticker) 的 MultiIndex，各 symbol 以 outer join 對齊
+        out = pd.concat(frames, axis=1).swaplevel(0, 1, axis=1)
+        out.columns.names = ["Price", "Ticker"]
+        return out.sort_index(axis=1, level=0, sort_remaining=False)
+
+    def Ticker(self, symbol: str) -> FakeTicker:
+        return FakeTicker(symbol, self)
+
+
+@contextmanager
+def patched(provider: FakeYFinance = None):
+    """期間內所有經由 yfinance 模組的呼叫都走 provider；結束後還原"""
+    provider = provider or FakeYFinance()
+    saved = (yf.download, yf.Ticker, yf_cache.ENABLED, fetch_pool.get_limiter())
+    yf.download, yf.Ticker = provider.download, provider.Ticker
+    yf_cache.ENABLED = False
+    fetch_pool.set_rate(fetch_pool.YAHOO_HOST, 0)
+    try:
+        yield provider
+    finally:
+        yf.download, yf.Ticker, yf_cache.ENABLED, limiter = saved
+        fetch_pool.set_rate(fetch_pool.YAHOO_HOST, limiter.rate, int(limiter.burst))
@@ -0,0 +1,126 @@
+# benchmarks/synthetic.py - 決定性的合成 OHLCV：盤前盤後、缺 bar、零成交量 bar，交易日 / 假日 / 提早收盤照 NYSE 日曆
+# 同一組 (symbol, 日期, seed) 永遠產生相同的 bar，可單獨產生任一天（不需從頭模擬）
+
+import math
+import zlib
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+import trading_calendar
+from trading_calendar import MARKET_TZ
+
+INTERVAL_SECONDS = {"1m": 60, "2m": 120, "5m": 300, "15m": 900, "30m": 1800, "60m": 3600, "1h": 3600}
+PRE_OPEN = 4 * 3600
+POST_CLOSE = 20 * 3600
+EARLY_POST_CLOSE = 17 * 3600  # 提早收盤日盤後也提早結束
+
+GAP_PROB = 0.01            # 單根 bar 缺漏
+OUTAGE_PROB = 0.002        # 連續缺一段（資料源斷線）
+OUTAGE_BARS = 6
+ZERO_VOLUME_PROB = 0.01    # 正規時段零成交量
+EXT_ZERO_VOLUME_PROB = 0.3 # 盤前盤後零成交量
+BAR_VOLATILITY = 0.002
+OVERNIGHT_VOLATILITY = 0.01
+
+
+def _to_date(d) -> date:
+    if isinstance(d, datetime):
+        return d.date()
+    if isinstance(d, date):
+        return d
+    return datetime.strptime(str(d), "%Y-%m-%d").date()
+
+
+def trading_days(end, n: int) -> list:
+    """end（含）往回 n 個交易日，舊到新"""
+    return trading_calendar.previous_trading_days(_to_date(end), n)[::-1]
+
+
+def days_between(start, end) -> list:
+    """[start, end) 之間的交易日，舊到新"""
+    d, end = _to_date(start), _to_date(end)
+    out = []
+    while d < end:
+        if trading_calendar.is_trading_day(d):
+            out.append(d.isoformat())
+        d += timedelta(days=1)
+    return out
+
+
+def empty_frame() -> pd.DataFrame:
+    return pd.DataFrame(columns=["open", "high", "low", "close", "volume"],
+                        index=pd.DatetimeIndex([], tz=MARKET_TZ), dtype="float64")
+
+
+def symbol_key(symbol: str) -> int:
+    return zlib.crc32(symbol.upper().encode("utf-8"))
+
+
+def rng_for(symbol: str, day: str, seed: int, salt: int = 0) -> np.random.Generator:
+    return np.random.default_rng([seed, symbol_key(symbol), int(day.replace("-", "")), salt])
+
+
+def anchor_price(symbol: str, day: str, seed: int = 0) -> float:
+    """當日開盤參考價：慢速波動的趨勢 + 每日隔夜跳空，任一天都能直接算出"""
+    key = symbol_key(symbol)
+    base = 10 + key % 490
+    t = _to_date(day).toordinal()
+    trend = 0.25 * math.sin(t / 45 + key % 97) + 0.1 * math.sin(t / 11 + key % 13)
+    gap = rng_for(symbol, day, seed, 1).normal(0, OVERNIGHT_VOLATILITY)
+    return round(base * math.exp(trend + gap), 2)
+
+
+def day_frame(symbol: str, day: str, interval: str = "5m", prepost: bool = True, seed: int = 0) -> pd.DataFrame:
+    """
+    單一交易日的 normalized frame（lowercase OHLCV、美東時區 DatetimeIndex）。
+    非交易日回傳空 frame；提早收盤日正規時段到 13:00。零成交量 bar 的 OHLC 都等於前一根收盤。
+    """
+    step = INTERVAL_SECONDS[interval]
+    if not trading_calendar.is_trading_day(day):
+        return empty_frame()
+
+    close_t = trading_calendar.session_close(day)
+    regular = (9 * 3600 + 1800, close_t.hour * 3600 + close_t.minute * 60)
+    early = trading_calendar.is_early_close(day)
+    start, end = (PRE_OPEN, EARLY_POST_CLOSE if early else POST_CLOSE) if prepost else regular
+    offsets = np.arange(start, end, step)
+    n = len(offsets)
+    rng = rng_for(symbol, day, seed)
+
+    keep = rng.random(n) >= GAP_PROB
+    for i in np.flatnonzero(rng.random(n) < OUTAGE_PROB):
+        keep[i:i + OUTAGE_BARS] = False
+    in_regular = (offsets >= regular[0]) & (offsets < regular[1])
+
+    # 成交量：正規時段 U 型分布，盤前盤後稀疏
+    pos = np.where(in_regular, (offsets - regular[0]) / max(regular[1] - regular[0], 1), 0.0)
+    base_volume = np.where(in_regular, 20_000 * (1 + 3 * (pos - 0.5) ** 2), 800)
+    volume = rng.poisson(base_volume).astype("int64")
+    zero_p = np.where(in_regular, ZERO_VOLUME_PROB, EXT_ZERO_VOLUME_PROB)
+    volume[rng.random(n) < zero_p] = 0
+
+    vol = np.where(in_regular, BAR_VOLATILITY, BAR_VOLATILITY / 2) * (volume > 0)
+    close = anchor_price(symbol, day, seed) * np.exp(np.cumsum(rng.normal(0, 1, n) * vol))
+    opn = np.r_[close[0], close[:-1]]
+    wick = np.abs(rng.normal(0, 1, n)) * vol * close / 2
+    high = np.maximum(opn, close) + wick
+    low = np.minimum(opn, close) - wick
+
+    midnight = pd.Timestamp(day, tz=MARKET_TZ)
+    index = midnight + pd.to_timedelta(offsets[keep], unit="s")
+    df = pd.DataFrame({
+        "open": opn[keep], "high": high[keep], "low": low[keep], "close": close[keep], "volume": volume[keep],
+    }, index=index)
+    return df.round({"open": 4, "high": 4, "low": 4, "close": 4})
+
+
+def frame(symbol: str, start, end, interval: str = "5m", prepost: bool = True, seed: int = 0) -> pd.DataFrame:
+    """[start, end) 之間所有交易日接起來（假日自然沒有 bar）"""
+    parts = [day_frame(symbol, d, interval, prepost, seed) for d in days_between(start, end)]
+    parts = [p for p in parts if len(p)]
+    return pd.concat(parts) if parts else empty_frame()
+
+
+def symbols(n: int) -> list:
+    """benchmark 用的 ticker 名稱 (T000, T001, …)"""
+    return [f"T{i:03d}" for i in range(n)]
@@ -1,4 +1,11 @@
 // chart.js - 完整最終版（2026-02-09）：只強制 symbol，date 可選，累加資料模式
+// LOD 圖塊：先讀 data/tiles/{SYMBOL}/manifest.json，只載入可見範圍的 tile，縮放 / 平移時再補抓
+
+const TILE_ROOT = "data/tiles";
+const LEVELS = ["5m", "30m", "1h", "1d"];  // 由細到粗
+const INITIAL_DAYS = 5;                     // 首次只載入最近幾天的 5m tile
+const MAX_BARS = 1500;                      // 可見 bar 超過就換粗一級
+const RANGE_DEBOUNCE_MS = 150;
 
 window.addEventListener("DOMContentLoaded", function () {
   const params = new URLSearchParams(window.location.search);
@@ -16,92 +23,218 @@ window.addEventListener("DOMContentLoaded", function () {
   }
 
   titleEl.textContent = symbol;
-  subtitleEl.textContent = date 
+  subtitleEl.textContent = date
     ? `Intraday Data: ${date}`
     : "所有歷史 Intraday 資料（最新累加）";
 
-  initChart(symbol);
+  initChart(symbol, date);
 });
 
-async function initChart(symbol) {
+// 各 level 已載入的 tile 與 bar（time -> bar）
+class TileSource {
+  constructor(symbol, manifest) {
+    this.symbol = symbol;
+    this.manifest = manifest;
+    this.loaded = {};
+    this.bars = {};
+    this.rows = {};
+    LEVELS.forEach((lv) => {
+      this.loaded[lv] = new Set();
+      this.bars[lv] = new Map();
+      const tiles = Object.values(manifest.levels[lv]?.tiles || {});
+      this.rows[lv] = tiles.reduce((n, t) => n + t.rows, 0);
+    });
+  }
+
+  tileKeys(level) {
+    return Object.keys(this.manifest.levels[level]?.tiles || {}).sort();
+  }
+
+  // 與 [from, to] 重疊且尚未載入的 tile
+  missing(level, from, to) {
+    const tiles = this.manifest.levels[level]?.tiles || {};
+    return Object.keys(tiles).filter((k) => !this.loaded[level].has(k) && tiles[k].last >= from && tiles[k].first <= to);
+  }
+
+  async loadKeys(level, keys) {
+    const fetched = await Promise.all(keys.map(async (key) => {
+      const path = `${TILE_ROOT}/${this.symbol}/${level}/${key}.json`;
+      const resp = await fetch(path);
+      if (!resp.ok) throw new Error(`找不到 tile：${path} (HTTP ${resp.status})`);
+      return [key, await resp.json()];
+    }));
+    fetched.forEach(([key, tile]) => {
+      this.loaded[level].add(key);
+      const bars = this.bars[level];
+      tile.t.forEach((t, i) => bars.set(t, {
+        time: t, open: tile.o[i], high: tile.h[i], low: tile.l[i], close: tile.c[i], volume: tile.v[i], vwap: tile.w[i],
+      }));
+    });
+    return keys.length > 0;
+  }
+
+  ensure(level, from, to) {
+    return this.loadKeys(level, this.missing(level, from, to));
+  }
+
+  data(level) {
+    return Array.from(this.bars[level].values()).sort((a, b) => a.time - b.time);
+  }
+}
+
+function setSeriesData(series, rawData) {
+  series.candle.setData(rawData.map(d => ({
+    time: d.time,
+    open: d.open,
+    high: d.high,
+    low: d.low,
+    close: d.close,
+  })));
+  // 正規時段外的 bar 沒有 VWAP (null)，不畫線
+  series.vwap.setData(rawData.filter(d => d.vwap != null).map(d => ({ time: d.time, value: d.vwap })));
+  series.volume.setData(rawData.map(d => ({
+    time: d.time,
+    value: d.volume,
+    color: d.close >= d.open ? "rgba(8,153,129,0.5)" : "rgba(242,54,69,0.5)",
+  })));
+}
+
+function createChartSeries(container) {
+  const chart = LightweightCharts.createChart(container, {
+    width: container.clientWidth,
+    height: container.clientHeight,
+    layout: { background: { color: "#111" }, textColor: "#ddd" },
+    grid: { vertLines: { color: "#222" }, horzLines: { color: "#222" } },
+    rightPriceScale: { borderColor: "#333" },
+    timeScale: { borderColor: "#333", timeVisible: true, secondsVisible: false },
+  });
+
+  const candle = chart.addCandlestickSeries({
+    upColor: "#089981",
+    downColor: "#F23645",
+    borderVisible: false,
+    wickUpColor: "#089981",
+    wickDownColor: "#F23645",
+  });
+
+  const vwap = chart.addLineSeries({
+    color: "#FF9800",
+    lineWidth: 2,
+    title: "VWAP",
+  });
+
+  const volume = chart.addHistogramSeries({
+    color: "#26a69a",
+    priceFormat: { type: "volume" },
+    priceScaleId: "",
+  });
+  volume.priceScale().applyOptions({ scaleMargins: { top: 0.8, bottom: 0 } });
+
+  // Resize 監聽
+  const resizeObserver = new ResizeObserver(() => {
+    chart.resize(container.clientWidth, container.clientHeight);
+  });
+  resizeObserver.observe(container);
+
+  return { chart, series: { candle, vwap, volume } };
+}
+
+async function initChart(symbol, date) {
   const container = document.getElementById("chart-container");
   const errorEl = document.getElementById("error-msg");
   const subtitleEl = document.getElementById("subtitle");
 
   try {
-    const path = `data/intraday/intraday_${symbol}.json`;
-    console.log("[DEBUG] 嘗試載入資料:", path);
+    if (typeof LightweightCharts === "undefined") {
+      throw new Error("LightweightCharts 庫載入失敗，請檢查 CDN 或網路");
+    }
 
-    const resp = await fetch(path);
+    const manifestPath = `${TILE_ROOT}/${symbol}/manifest.json`;
+    const resp = await fetch(manifestPath);
     if (!resp.ok) {
-      throw new Error(`找不到資料檔案：${path} (HTTP ${resp.status})`);
+      // 尚未產生 tile 的 symbol：退回讀整份累加 JSON
+      console.log("[DEBUG] 沒有 tile manifest，改讀完整資料:", manifestPath);
+      return await initFullChart(symbol, container, subtitleEl);
     }
+    const source = new TileSource(symbol, await resp.json());
 
-    const rawData = await resp.json();
-    if (!Array.isArray(rawData) || rawData.length === 0) {
-      throw new Error("資料為空或格式錯誤（非陣列）");
-    }
+    // 首次：指定 date（或最新）往前 INITIAL_DAYS 天的 5m tile
+    const dayKeys = source.tileKeys("5m").filter((k) => !date || k <= date);
+    const initial = dayKeys.slice(-INITIAL_DAYS);
+    if (!initial.length) throw new Error("資料為空");
+    await source.loadKeys("5m", initial);
 
-    console.log("[DEBUG] 成功載入資料筆數:", rawData.length);
+    const { chart, series } = createChartSeries(container);
+    let level = "5m";
+    let data = source.data(level);
+    setSeriesData(series, data);
+    chart.timeScale().fitContent();
+    console.log("[DEBUG] 初始 tile:", initial.join(", "), "bars:", data.length);
 
-    if (typeof LightweightCharts === "undefined") {
-      throw new Error("LightweightCharts 庫載入失敗，請檢查 CDN 或網路");
+    let busy = false;
+    let pending = false;
+    let timer = null;
+
+    // 依可見 bar 數選 level，並補抓可見範圍前後各一個視窗寬度的 tile
+    async function refresh() {
+      if (busy) {
+        pending = true;  // 載入中又縮放：載完再跑一次
+        return;
+      }
+      busy = true;
+      try {
+        await applyVisibleRange();
+      } finally {
+        busy = false;
+      }
+      if (pending) {
+        pending = false;
+        await refresh();
+      }
     }
 
-    const chart = LightweightCharts.createChart(container, {
-      width: container.clientWidth,
-      height: container.clientHeight,
-      layout: { background: { color: "#111" }, textColor: "#ddd" },
-      grid: { vertLines: { color: "#222" }, horzLines: { color: "#222" } },
-      rightPriceScale: { borderColor: "#333" },
-      timeScale: { borderColor: "#333", timeVisible: true, secondsVisible: false },
-    });
+    async function applyVisibleRange() {
+      const logical = chart.timeScale().getVisibleLogicalRange();
+      if (!logical || !data.length) return;
+      const visibleBars = logical.to - logical.from;
+      const i0 = Math.max(0, Math.min(data.length - 1, Math.floor(logical.from)));
+      const i1 = Math.max(0, Math.min(data.length - 1, Math.ceil(logical.to)));
+      const from = data[i0].time;
+      const to = data[i1].time;
 
-    const candleSeries = chart.addCandlestickSeries({
-      upColor: "#089981",
-      downColor: "#F23645",
-      borderVisible: false,
-      wickUpColor: "#089981",
-      wickDownColor: "#F23645",
-    });
-    candleSeries.setData(rawData.map(d => ({
-      time: d.time,
-      open: d.open,
-      high: d.high,
-      low: d.low,
-      close: d.close,
-    })));
-
-    const vwapSeries = chart.addLineSeries({
-      color: "#FF9800",
-      lineWidth: 2,
-      title: "VWAP",
-    });
-    vwapSeries.setData(rawData.map(d => ({ time: d.time, value: d.vwap })));
+      let next = level;
+      const idx = LEVELS.indexOf(level);
+      if (visibleBars > MAX_BARS && idx < LEVELS.length - 1) {
+        next = LEVELS[idx + 1];
+      } else if (idx > 0) {
+        // 換細一級後的 bar 數估計（以 manifest 總筆數比例），低於一半上限才換，避免來回切換
+        const finer = LEVELS[idx - 1];
+        const ratio = source.rows[finer] / Math.max(source.rows[level], 1);
+        if (visibleBars * ratio < MAX_BARS / 2) next = finer;
+      }
 
-    const volumeSeries = chart.addHistogramSeries({
-      color: "#26a69a",
-      priceFormat: { type: "volume" },
-      priceScaleId: "",
-    });
-    volumeSeries.priceScale().applyOptions({ scaleMargins: { top: 0.8, bottom: 0 } });
-    volumeSeries.setData(rawData.map(d => ({
-      time: d.time,
-      value: d.volume,
-      color: d.close >= d.open ? "rgba(8,153,129,0.5)" : "rgba(242,54,69,0.5)",
-    })));
-
-    // Resize 監聽
-    const resizeObserver = new ResizeObserver(() => {
-      chart.resize(container.clientWidth, container.clientHeight);
-    });
-    resizeObserver.observe(container);
+      // 左右留白（捲到資料邊界外）時也要往外補抓
+      const span = Math.max(to - from, 86400);
+      const loadFrom = from - span * (logical.from < 0 ? 2 : 1);
+      const loadTo = to + span * (logical.to > data.length ? 2 : 1);
+      const added = await source.ensure(next, loadFrom, loadTo);
+      if (!added && next === level) return;
 
-    chart.timeScale().fitContent();
+      level = next;
+      data = source.data(level);
+      setSeriesData(series, data);
+      chart.timeScale().setVisibleRange({ from, to });
+      console.log("[DEBUG] LOD:", level, "bars:", data.length);
+    }
+
+    chart.timeScale().subscribeVisibleLogicalRangeChange(() => {
+      clearTimeout(timer);
+      timer = setTimeout(() => refresh().catch((e) => console.error("tile 載入失敗:", e)), RANGE_DEBOUNCE_MS);
+    });
 
     // 顯示最後更新時間
-    if (rawData.length > 0) {
-      const lastTime = new Date(rawData[rawData.length - 1].time * 1000);
+    if (source.manifest.last) {
+      const lastTime = new Date(source.manifest.last * 1000);
       subtitleEl.textContent += `（最新更新：${lastTime.toLocaleString()}）`;
     }
 
@@ -112,4 +245,97 @@ async function initChart(symbol) {
     errorEl.textContent = e.message;
     errorEl.style.display = "block";
   }
-}
\ No newline at end of file
+}
+
+// bar_codec.py 的 TVB1 格式：header 20 bytes + time 差分 / OHLC 定點差分 (Int32) + volume (Int64) + vwap 相對 close (Int32)
+const TVB_NULL_VWAP = -2147483648;
+
+function decodeTvb(buf) {
+  const view = new DataView(buf);
+  const magic = String.fromCharCode(...new Uint8Array(buf, 0, 4));
+  if (magic !== "TVB1" || view.getUint8(4) !== 1) throw new Error("不是 TVB1 格式");
+  const scale = 10 ** view.getUint8(5);
+  const n = view.getUint32(8, true);
+  const t0 = Number(view.getBigInt64(12, true));
+  let offset = 20;
+  const take = (Type) => {
+    const arr = new Type(buf.slice(offset, offset + n * Type.BYTES_PER_ELEMENT));  // slice 後重新對齊
+    offset += n * Type.BYTES_PER_ELEMENT;
+    return arr;
+  };
+  const cumsum = (arr, first) => {
+    const out = new Array(n);
+    let acc = 0;
+    for (let i = 0; i < n; i++) {
+      acc = i === 0 ? (first ?? arr[0]) : acc + arr[i];
+      out[i] = acc;
+    }
+    return out;
+  };
+
+  const time = cumsum(take(Int32Array), t0);
+  const [open, high, low, close] = [0, 1, 2, 3].map(() => cumsum(take(Int32Array)));
+  const volume = take(BigInt64Array);
+  const vwap = take(Int32Array);
+  const bars = new Array(n);
+  for (let i = 0; i < n; i++) {
+    bars[i] = {
+      time: time[i],
+      open: open[i] / scale,
+      high: high[i] / scale,
+      low: low[i] / scale,
+      close: close[i] / scale,
+      volume: Number(volume[i]),
+      vwap: vwap[i] === TVB_NULL_VWAP ? null : (close[i] + vwap[i]) / scale,
+    };
+  }
+  return bars;
+}
+
+async function fetchCompactBars(path) {
+  const resp = await fetch(path);
+  if (!resp.ok) return null;
+  let buf = await resp.arrayBuffer();
+  const head = new Uint8Array(buf, 0, 2);
+  // 伺服器若已用 Content-Encoding 解開 gzip，這裡就直接是 TVB1
+  if (head[0] === 0x1f && head[1] === 0x8b) {
+    const stream = new Blob([buf]).stream().pipeThrough(new DecompressionStream("gzip"));
+    buf = await new Response(stream).arrayBuffer();
+  }
+  return decodeTvb(buf);
+}
+
+async function initFullChart(symbol, container, subtitleEl) {
+  // 優先讀精簡格式 (.tvb.gz)，沒有才讀累加 JSON
+  const compactPath = `data/intraday/intraday_${symbol}.tvb.gz`;
+  const path = `data/intraday/intraday_${symbol}.json`;
+  console.log("[DEBUG] 嘗試載入資料:", compactPath);
+
+  let rawData = await fetchCompactBars(compactPath).catch((e) => {
+    console.warn("精簡格式讀取失敗，改讀 JSON:", e);
+    return null;
+  });
+  if (!rawData) {
+    console.log("[DEBUG] 嘗試載入資料:", path);
+    const resp = await fetch(path);
+    if (!resp.ok) {
+      throw new Error(`找不到資料檔案：${path} (HTTP ${resp.status})`);
+    }
+    rawData = await resp.json();
+  }
+  if (!Array.isArray(rawData) || rawData.length === 0) {
+    throw new Error("資料為空或格式錯誤（非陣列）");
+  }
+
+  console.log("[DEBUG] 成功載入資料筆數:", rawData.length);
+
+  const { chart, series } = createChartSeries(container);
+  setSeriesData(series, rawData);
+  chart.timeScale().fitContent();
+
+  // 顯示最後更新時間
+  const lastTime = new Date(rawData[rawData.length - 1].time * 1000);
+  subtitleEl.textContent += `（最新更新：${lastTime.toLocaleString()}）`;
+
+  console.log("[DEBUG] 圖表初始化完成");
+}
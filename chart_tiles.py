@@ -0,0 +1,200 @@
+# chart_tiles.py - chart.html 用的多解析度 (LOD) 圖塊：每日 5m、每月 30m / 1h、全歷史日線，VWAP 一路帶著
+
+import argparse
+import json
+import os
+import logging
+import numpy as np
+import pandas as pd
+import bar_store
+import instrument
+from trading_calendar import MARKET_TZ
+
+TILE_DIR = "data/tiles"
+MANIFEST_VERSION = 1
+SESSION_OFFSET = 9 * 3600 + 30 * 60  # 30m / 1h bar 對齊 09:30 開盤
+
+# level -> (bar 秒數, 每個 tile 涵蓋範圍)
+LEVELS = {
+    "5m": (300, "day"),
+    "30m": (1800, "month"),
+    "1h": (3600, "month"),
+    "1d": (86400, "all"),
+}
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+
+def _local_offsets(times: np.ndarray) -> np.ndarray:
+    """每個 timestamp 在美東時區的 UTC 偏移秒數（含夏令時間）"""
+    utc = pd.to_datetime(times, unit="s", utc=True)
+    local = utc.tz_convert(MARKET_TZ).tz_localize(None)
+    return ((local - utc.tz_localize(None)) // pd.Timedelta(seconds=1)).to_numpy(dtype="int64")
+
+
+def rollup(bars: np.ndarray, level: str) -> np.ndarray:
+    """
+    依 level 聚合成較粗的 bar（BAR_DTYPE）。OHLC / volume 照一般規則合併；
+    vwap 取桶內最後一個有值的 session VWAP，也就是該時間點的累積 VWAP。
+    日線的 time 為美東日期 00:00 UTC。
+    """
+    seconds, _ = LEVELS[level]
+    bars = np.sort(np.asarray(bars, dtype=bar_store.BAR_DTYPE), order="time")
+    if seconds == 300 or not len(bars):
+        return bars
+    t = bars["time"].astype("int64")
+    local = t + _local_offsets(t)
+    if level == "1d":
+        start = local // 86400 * 86400
+    else:
+        start = t - (local - SESSION_OFFSET) % seconds
+    starts = np.r_[0, np.flatnonzero(start[1:] != start[:-1]) + 1]
+    ends = np.r_[starts[1:], len(bars)] - 1
+
+    out = np.empty(len(starts), dtype=bar_store.BAR_DTYPE)
+    out["time"] = start[starts]
+    out["open"] = bars["open"][starts]
+    out["close"] = bars["close"][ends]
+    out["high"] = np.maximum.reduceat(bars["high"], starts)
+    out["low"] = np.minimum.reduceat(bars["low"], starts)
+    out["volume"] = np.add.reduceat(bars["volume"], starts)
+    vwap = bars["vwap"]
+    last_valid = np.maximum.accumulate(np.where(np.isnan(vwap), -1, np.arange(len(bars))))[ends]
+    out["vwap"] = np.where(last_valid >= starts, vwap[np.maximum(last_valid, 0)], np.nan)
+    return out
+
+
+def symbol_tile_dir(symbol: str, root: str = TILE_DIR) -> str:
+    return os.path.join(root, symbol.upper())
+
+
+def _tile_path(symbol: str, level: str, key: str, root: str) -> str:
+    return os.path.join(symbol_tile_dir(symbol, root), level, f"{key}.json")
+
+
+def _manifest_path(symbol: str, root: str) -> str:
+    return os.path.join(symbol_tile_dir(symbol, root), "manifest.json")
+
+
+def load_manifest(symbol: str, root: str = TILE_DIR) -> dict:
+    path = _manifest_path(symbol, root)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {
+        "symbol": symbol.upper(), "version": MANIFEST_VERSION, "first": None, "last": None,
+        "levels": {lv: {"seconds": sec, "span": span, "tiles": {}} for lv, (sec, span) in LEVELS.items()},
+    }
+
+
+def tile_payload(bars: np.ndarray, decimals: int = 2) -> dict:
+    """欄式 tile：{"t": [...], "o", "h", "l", "c", "v", "w"}；沒有 VWAP 的 bar 為 null"""
+    round_col = lambda name: np.round(bars[name].astype("float64"), decimals).tolist()
+    vwap = round_col("vwap")
+    return {
+        "t": bars["time"].astype("int64").tolist(),
+        "o": round_col("open"), "h": round_col("high"), "l": round_col("low"), "c": round_col("close"),
+        "v": bars["volume"].astype("int64").tolist(),
+        "w": [v if v == v else None for v in vwap],
+    }
+
+
+def _payload_bars(payload: dict) -> np.ndarray:
+    bars = np.empty(len(payload["t"]), dtype=bar_store.BAR_DTYPE)
+    for name, col in (("time", "t"), ("open", "o"), ("high", "h"), ("low", "l"), ("close", "c"), ("volume", "v")):
+        bars[name] = payload[col]
+    bars["vwap"] = [np.nan if w is None else w for w in payload["w"]]
+    return bars
+
+
+def _write_tile(symbol: str, level: str, key: str, bars: np.ndarray, manifest: dict, root: str):
+    path = _tile_path(symbol, level, key, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with instrument.timer("json.dump"):
+        data = json.dumps(tile_payload(bars), separators=(",", ":"))
+    instrument.count("bytes.written", len(data))
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    manifest["levels"][level]["tiles"][key] = {
+        "first": int(bars["time"][0]), "last": int(bars["time"][-1]), "rows": int(len(bars)), "bytes": len(data),
+    }
+
+
+def update_tiles(symbol: str, days=None, store_root: str = bar_store.STORE_DIR, root: str = TILE_DIR) -> dict:
+    """
+    重建受影響的 tile：days 為有變動的交易日（None = 全部重建）。
+    5m 只寫那幾天、30m / 1h 只寫那幾個月，日線只重算那幾天後併回既有日線 tile。
+    """
+    symbol = symbol.upper()
+    all_days = bar_store.list_days(symbol, store_root)
+    rebuild = days is None or not os.path.exists(_manifest_path(symbol, root))
+    manifest = load_manifest(symbol, root)
+    days = sorted(all_days if rebuild else set(days) & set(all_days))
+    if not days:
+        return manifest
+
+    for day in days:
+        bars = bar_store.load_day(symbol, day, store_root, mmap=False)
+        if len(bars):
+            _write_tile(symbol, "5m", day, bars, manifest, root)
+
+    for month in sorted({d[:7] for d in days}):
+        bars = bar_store.load_bars(symbol, f"{month}-01", f"{month}-31", store_root)
+        if not len(bars):
+            continue
+        for level in ("30m", "1h"):
+            _write_tile(symbol, level, month, rollup(bars, level), manifest, root)
+
+    if rebuild:
+        source = bar_store.load_bars(symbol, root=store_root)
+    else:
+        source = np.concatenate([bar_store.load_day(symbol, d, store_root, mmap=False) for d in days])
+    daily = rollup(source, "1d")
+    old_path = _tile_path(symbol, "1d", "all", root)
+    if not rebuild and os.path.exists(old_path):
+        with open(old_path, "r", encoding="utf-8") as f:
+            old = _payload_bars(json.load(f))
+        daily = np.concatenate([old[~np.isin(old["time"], daily["time"])], daily])
+        daily = daily[np.argsort(daily["time"], kind="stable")]
+    if len(daily):
+        _write_tile(symbol, "1d", "all", daily, manifest, root)
+
+    fine = manifest["levels"]["5m"]["tiles"]
+    manifest["first"] = min(t["first"] for t in fine.values()) if fine else None
+    manifest["last"] = max(t["last"] for t in fine.values()) if fine else None
+    # manifest 也是瀏覽器第一個載入的檔案：compact JSON
+    path = _manifest_path(symbol, root)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp, path)
+    return manifest
+
+
+def discover_symbols(export_dir: str = bar_store.EXPORT_DIR, store_root: str = bar_store.STORE_DIR) -> list:
+    names = set()
+    if os.path.isdir(store_root):
+        names |= {d for d in os.listdir(store_root) if os.path.isdir(os.path.join(store_root, d))}
+    if os.path.isdir(export_dir):
+        for ext in (".json", ".tvb.gz"):
+            names |= {f[len("intraday_"):-len(ext)] for f in os.listdir(export_dir)
+                      if f.startswith("intraday_") and f.endswith(ext) and f.count("_") == 1}
+    return sorted(names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build chart LOD tiles from the bar store")
+    parser.add_argument("symbols", nargs="?", help="Comma-separated symbols (default: all)")
+    args = parser.parse_args()
+    symbols = [s.strip().upper() for s in args.symbols.split(",")] if args.symbols else discover_symbols()
+    for sym in symbols:
+        bar_store.ensure_store(sym)
+        manifest = update_tiles(sym)
+        counts = {lv: len(info["tiles"]) for lv, info in manifest["levels"].items()}
+        logging.info(f"{sym}: tiles {counts}")
+
+
+if __name__ == "__main__":
+    main()
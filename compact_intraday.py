@@ -0,0 +1,294 @@
+# compact_intraday.py - 把 data/intraday 的每日檔 + 累加檔串流合併成每個 symbol 一條去重後的標準序列
+# 用法: python compact_intraday.py [AMD,NVDA] [--dry-run] [--keep] [--report conflicts.jsonl]
+
+import argparse
+import json
+import os
+import re
+import shutil
+import tempfile
+import logging
+import numpy as np
+import bar_codec
+import bar_store
+import chart_tiles
+import vwap_engine
+
+DAILY_RE = re.compile(r"^intraday_([A-Z0-9.\-^=]+)_(\d{4}-\d{2}-\d{2})\.json$")
+CHUNK_BARS = 50_000
+
+# 來源優先序（數字小者優先）：同一天兩個檔案 bar 數、成交量都相同時才用得到
+SOURCE_STORE, SOURCE_CUMULATIVE, SOURCE_COMPACT, SOURCE_DAILY = 0, 1, 2, 3
+SOURCE_NAMES = {SOURCE_STORE: "store", SOURCE_CUMULATIVE: "cumulative", SOURCE_COMPACT: "compact", SOURCE_DAILY: "daily"}
+STAGE_DTYPE = np.dtype(bar_store.BAR_DTYPE.descr + [("file", "<i2")])
+COMPARE_FIELDS = ("open", "high", "low", "close", "volume")
+# 一天內超過這個比例的 timestamp 互相衝突：多半是檔案標錯 symbol / 日期，整天隔離不合併
+QUARANTINE_RATIO = 0.5
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+
+def iter_json_array(path: str, chunk_size: int = 1 << 16):
+    """逐筆 yield JSON 陣列裡的物件，一次只讀 chunk_size 字元（不把整個檔案載入）"""
+    decoder = json.JSONDecoder()
+    buf, eof = "", False
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            if not eof:
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf += chunk
+            pos, n = 0, len(buf)
+            while True:
+                while pos < n and buf[pos] in " \t\r\n,[":
+                    pos += 1
+                if pos >= n or buf[pos] == "]":
+                    break
+                try:
+                    obj, pos_end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    break  # 物件被 chunk 切斷：讀下一段再試
+                yield obj
+                pos = pos_end
+            if pos < n and buf[pos] == "]":
+                return
+            buf = buf[pos:]
+            if eof:
+                return
+
+
+def _chunks(records, size: int):
+    batch = []
+    for r in records:
+        if r.get("time"):
+            batch.append(r)
+        if len(batch) >= size:
+            yield bar_store.records_to_array(batch)
+            batch = []
+    if batch:
+        yield bar_store.records_to_array(batch)
+
+
+def find_sources(symbol: str, intraday_dir: str = bar_store.EXPORT_DIR) -> dict:
+    """{"cumulative": path | None, "compact": path | None, "daily": [paths]}"""
+    daily = []
+    for name in sorted(os.listdir(intraday_dir)) if os.path.isdir(intraday_dir) else []:
+        m = DAILY_RE.match(name)
+        if m and m.group(1) == symbol:
+            daily.append(os.path.join(intraday_dir, name))
+    cumulative = bar_store.export_path(symbol, intraday_dir)
+    compact = bar_store.compact_path(symbol, intraday_dir)
+    return {
+        "cumulative": cumulative if os.path.exists(cumulative) else None,
+        "compact": compact if os.path.exists(compact) else None,
+        "daily": daily,
+    }
+
+
+def discover_symbols(intraday_dir: str = bar_store.EXPORT_DIR, store_root: str = bar_store.STORE_DIR) -> list:
+    names = set(chart_tiles.discover_symbols(intraday_dir, store_root))
+    if os.path.isdir(intraday_dir):
+        names |= {m.group(1) for m in map(DAILY_RE.match, os.listdir(intraday_dir)) if m}
+    return sorted(names)
+
+
+class Stager:
+    """
+    把 bar 依交易日分到 staging 檔（原始二進位 append），記憶體只保留一個 chunk。
+    每個來源檔有自己的 file id，衝突時以整個檔案為單位取捨。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.days = set()
+        self.files = []  # file id -> (source, label)
+        os.makedirs(directory, exist_ok=True)
+
+    def open_file(self, source: int, label: str) -> int:
+        self.files.append((source, label))
+        return len(self.files) - 1
+
+    def add(self, bars: np.ndarray, file_id: int) -> set:
+        """回傳這批 bar 落在哪些交易日"""
+        if not len(bars):
+            return set()
+        staged = np.empty(len(bars), dtype=STAGE_DTYPE)
+        for name in bar_store.BAR_DTYPE.names:
+            staged[name] = bars[name]
+        staged["file"] = file_id
+        dates = bar_store.session_dates(staged["time"])
+        days = {str(d) for d in np.unique(dates)}
+        for day in days:
+            with open(os.path.join(self.directory, f"{day}.bin"), "ab") as f:
+                staged[dates == day].tofile(f)
+        self.days |= days
+        return days
+
+    def load(self, day: str) -> np.ndarray:
+        return np.fromfile(os.path.join(self.directory, f"{day}.bin"), dtype=STAGE_DTYPE)
+
+
+def rank_files(staged: np.ndarray, files: list) -> np.ndarray:
+    """
+    當天各檔案的優先序（0 最優先）：bar 數多者（較完整）> 成交量大者（較晚下載）> 來源優先序。
+    回傳以 file id 為索引的名次陣列。
+    """
+    ids, counts = np.unique(staged["file"], return_counts=True)
+    volume = np.array([staged["volume"][staged["file"] == i].sum() for i in ids])
+    source = np.array([files[i][0] for i in ids])
+    order = np.lexsort((ids, source, -volume, -counts))
+    rank = np.full(len(files), len(files), dtype=np.int64)
+    rank[ids[order]] = np.arange(len(ids))
+    return rank
+
+
+def resolve_day(staged: np.ndarray, files: list, anchor: str = vwap_engine.REGULAR) -> tuple:
+    """
+    同一天所有來源檔的 bar 去重。整個檔案為單位取捨：每個 timestamp 都取 rank_files 名次最前、
+    有這根 bar 的檔案，不會逐根混用不同檔案的 OHLCV（標錯 symbol 的檔案價格完全不同）。
+    同一 timestamp 若 OHLCV 不一致記為衝突。VWAP 一律用 vwap_engine 重算。回傳 (bars, conflicts)。
+    """
+    rank = rank_files(staged, files)
+    order = np.lexsort((rank[staged["file"]], staged["time"]))
+    staged = staged[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(staged["time"])) + 1]
+    winners = staged[starts]
+
+    conflicts = []
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(staged)]))
+    differs = np.zeros(len(staged), dtype=bool)
+    for name in COMPARE_FIELDS:
+        differs |= staged[name] != winners[name][group]
+    for i in np.unique(group[differs]):
+        rows = staged[group == i]
+        conflicts.append({
+            "time": int(rows["time"][0]),
+            "kept": files[int(rows["file"][0])][1],
+            "bars": [{"file": files[int(r["file"])][1], "source": SOURCE_NAMES[files[int(r["file"])][0]],
+                      **{k: r[k].item() for k in COMPARE_FIELDS}} for r in rows],
+        })
+
+    bars = np.empty(len(winners), dtype=bar_store.BAR_DTYPE)
+    for name in bar_store.BAR_DTYPE.names:
+        bars[name] = winners[name]
+    bars["vwap"] = vwap_engine.session_vwap(
+        bars["time"], bars["high"], bars["low"], bars["close"], bars["volume"], anchor
+    )
+    return bars, conflicts
+
+
+def quarantined(bars: np.ndarray, conflicts: list, ratio: float = QUARANTINE_RATIO) -> bool:
+    return len(bars) > 0 and len(conflicts) > ratio * len(bars)
+
+
+def compact_symbol(symbol: str, intraday_dir: str = bar_store.EXPORT_DIR, store_root: str = bar_store.STORE_DIR,
+                   dry_run: bool = False, keep: bool = False, chunk: int = CHUNK_BARS, report=None) -> dict:
+    """
+    1. 所有來源（store、累加 JSON、精簡檔、每日檔）串流讀入，依交易日分到 staging 檔
+    2. 一次處理一天：以檔案為單位去重、記錄衝突、重算 VWAP，覆寫 store 的該日 segment；
+       大部分 bar 都衝突的日子整天隔離（只保留原本 store / 累加檔的資料），寫進 report
+    3. 從 store 重寫累加匯出檔與 chart tile；完全沒有衝突時才刪掉多餘的每日檔
+    記憶體上限約為 chunk 筆 + 單日 bar 數。
+    """
+    symbol = symbol.upper()
+    sources = find_sources(symbol, intraday_dir)
+    staging = tempfile.mkdtemp(prefix=f"compact_{symbol}_")
+    stager = Stager(staging)
+    stats = {"symbol": symbol, "read": 0, "days": 0, "bars": 0, "conflicts": 0, "quarantined": [], "removed": 0}
+
+    try:
+        store_id = stager.open_file(SOURCE_STORE, "store")
+        for day in bar_store.list_days(symbol, store_root):
+            bars = bar_store.load_day(symbol, day, store_root)
+            stager.add(bars, store_id)
+            stats["read"] += len(bars)
+        if sources["cumulative"] and os.path.getsize(sources["cumulative"]):
+            file_id = stager.open_file(SOURCE_CUMULATIVE, os.path.basename(sources["cumulative"]))
+            for bars in _chunks(iter_json_array(sources["cumulative"]), chunk):
+                stager.add(bars, file_id)
+                stats["read"] += len(bars)
+        elif sources["compact"]:
+            bars = bar_codec.read(sources["compact"])
+            stager.add(bars, stager.open_file(SOURCE_COMPACT, os.path.basename(sources["compact"])))
+            stats["read"] += len(bars)
+        for path in sources["daily"]:
+            if not os.path.getsize(path):
+                continue
+            name = os.path.basename(path)
+            file_id = stager.open_file(SOURCE_DAILY, name)
+            days = set()
+            for bars in _chunks(iter_json_array(path), chunk):
+                days |= stager.add(bars, file_id)
+                stats["read"] += len(bars)
+            labelled = DAILY_RE.match(name).group(2)
+            if days - {labelled}:
+                logging.warning(f"{name}: bars dated {sorted(days)}, not {labelled}")
+
+        for day in sorted(stager.days):
+            staged = stager.load(day)
+            bars, conflicts = resolve_day(staged, stager.files)
+            stats["days"] += 1
+            stats["conflicts"] += len(conflicts)
+            if quarantined(bars, conflicts):
+                # 無法判斷哪個檔案才是這個 symbol：不合併每日檔，原本的標準序列維持不變
+                stats["quarantined"].append(day)
+                labels = sorted({stager.files[i][1] for i in np.unique(staged["file"])})
+                logging.warning(f"{symbol} {day}: {len(conflicts)}/{len(bars)} bars conflict across {labels}, quarantined")
+                if report is not None:
+                    report.write(json.dumps({"symbol": symbol, "date": day, "quarantined": True, "files": labels,
+                                             "bars": len(bars), "conflicts": len(conflicts)}) + "\n")
+                existing = np.array([src for src, _ in stager.files])[staged["file"]] != SOURCE_DAILY
+                bars = resolve_day(staged[existing], stager.files)[0] if existing.any() else bars[:0]
+            elif report is not None:
+                for c in conflicts:
+                    report.write(json.dumps({"symbol": symbol, "date": day, **c}) + "\n")
+            stats["bars"] += len(bars)
+            if not dry_run and len(bars):
+                bar_store.replace_day(symbol, day, bars, store_root)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    if dry_run or not stats["days"]:
+        return stats
+
+    # 標準序列寫回後才刪多餘的每日檔；累加檔由 store 重寫
+    bar_store.export_intraday(symbol, force=True, root=store_root, export_dir=intraday_dir)
+    chart_tiles.update_tiles(symbol, store_root=store_root)
+    if keep:
+        return stats
+    if stats["conflicts"] or stats["quarantined"]:
+        # 衝突還沒人工確認前，每日檔是唯一的原始資料：一律保留
+        logging.warning(f"{symbol}: {stats['conflicts']} conflicts, {len(stats['quarantined'])} quarantined days; "
+                        f"per-day files kept (see --report)")
+        return stats
+    for path in sources["daily"]:
+        os.remove(path)
+        stats["removed"] += 1
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact and dedupe intraday files")
+    parser.add_argument("symbols", nargs="?", help="Comma-separated symbols (default: all)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report, write nothing")
+    parser.add_argument("--keep", action="store_true", help="Keep per-day files after compaction")
+    parser.add_argument("--chunk", type=int, default=CHUNK_BARS, help="Bars per streaming chunk")
+    parser.add_argument("--report", help="Write conflicting bars as JSON lines")
+    args = parser.parse_args()
+
+    symbols = [s.strip().upper() for s in args.symbols.split(",")] if args.symbols else discover_symbols()
+    report = open(args.report, "w", encoding="utf-8") if args.report else None
+    try:
+        for sym in symbols:
+            s = compact_symbol(sym, dry_run=args.dry_run, keep=args.keep, chunk=args.chunk, report=report)
+            logging.info(f"{sym}: read {s['read']} bars -> {s['bars']} bars / {s['days']} days, "
+                         f"{s['conflicts']} conflicts, {len(s['quarantined'])} quarantined days, removed {s['removed']} files")
+    finally:
+        if report:
+            report.close()
+
+
+if __name__ == "__main__":
+    main()
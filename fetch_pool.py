@@ -0,0 +1,96 @@
+# fetch_pool.py - 有上限的並行抓取：thread pool + per-host 限速 + 重試退避
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import instrument
+
+DEFAULT_WORKERS = 6
+YAHOO_HOST = "finance.yahoo.com"
+DEFAULT_RATES = {YAHOO_HOST: 8.0}  # 每秒最多請求數
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 1.0  # 秒，第 n 次重試等待 backoff * 2**(n-1)
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+
+class RateLimiter:
+    """Token bucket：平均每秒 rate 個請求，最多累積 burst 個"""
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1, int(rate)))
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(host: str = YAHOO_HOST) -> RateLimiter:
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(host)
+        if limiter is None:
+            limiter = _LIMITERS[host] = RateLimiter(DEFAULT_RATES.get(host, 0))
+        return limiter
+
+
+def set_rate(host: str, rate: float, burst: int = None):
+    with _LIMITERS_LOCK:
+        _LIMITERS[host] = RateLimiter(rate, burst)
+
+
+def call(fn, *args, host: str = YAHOO_HOST, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF, **kwargs):
+    """
+    限速後呼叫 fn(*args, **kwargs)；發生例外時以指數退避重試，
+    超過 retries 次仍失敗就把最後的例外丟出去。
+    """
+    limiter = get_limiter(host)
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            wait = backoff * (2 ** attempt)
+            instrument.count(f"retries.{host}")
+            name = getattr(fn, "__name__", "call")
+            logging.warning(f"{name} failed ({e}), retry {attempt + 1}/{retries} in {wait:.1f}s")
+            time.sleep(wait)
+
+
+def map_ordered(fn, items, workers: int = DEFAULT_WORKERS) -> list:
+    """
+    以最多 workers 個執行緒對每個 item 執行 fn，
+    依輸入順序回傳 [(item, result, error)]；單一 item 失敗不影響其他 item。
+    """
+    items = list(items)
+
+    def _run(item):
+        try:
+            return item, fn(item), None
+        except Exception as e:
+            return item, None, e
+
+    if workers <= 1 or len(items) <= 1:
+        return [_run(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(_run, items))
@@ -0,0 +1,140 @@
+# instrument.py - 輕量 instrumentation：各階段計時 (context manager / decorator)、計數器、執行結束的摘要表與 JSON run report
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+REPORT_DIR = os.getenv("RUN_REPORT_DIR", ".cache/reports")
+REPORT_VERSION = 1
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+_LOCK = threading.Lock()
+_STAGES = {}    # stage -> [calls, total 秒, max 秒]
+_COUNTERS = {}  # name -> 累計值（請求數、位元組數…）
+_STARTED = {"wall": time.time(), "perf": time.perf_counter()}
+
+
+def _record(stage: str, seconds: float):
+    with _LOCK:
+        s = _STAGES.get(stage)
+        if s is None:
+            _STAGES[stage] = [1, seconds, seconds]
+        else:
+            s[0] += 1
+            s[1] += seconds
+            if seconds > s[2]:
+                s[2] = seconds
+
+
+@contextmanager
+def timer(stage: str):
+    """with instrument.timer("stage"): ... 計入該階段的次數與耗時（例外也照算）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(stage, time.perf_counter() - start)
+
+
+def timed(stage: str = None):
+    """decorator 版的 timer；stage 預設為函式名稱"""
+    def decorator(fn):
+        name = stage or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def count(name: str, n: int = 1):
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + n
+
+
+def file_bytes(path: str, direction: str) -> int:
+    """把檔案大小計入 bytes.read / bytes.written，回傳大小"""
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    count(f"bytes.{direction}", size)
+    return size
+
+
+def reset():
+    with _LOCK:
+        _STAGES.clear()
+        _COUNTERS.clear()
+        _STARTED.update(wall=time.time(), perf=time.perf_counter())
+
+
+def snapshot() -> dict:
+    """{"wall_seconds", "stages": {stage: {calls, total, mean, max}}, "counters"}，stage 依總耗時排序"""
+    with _LOCK:
+        stages = {k: list(v) for k, v in _STAGES.items()}
+        counters = dict(_COUNTERS)
+    ordered = sorted(stages.items(), key=lambda kv: kv[1][1], reverse=True)
+    return {
+        "wall_seconds": round(time.perf_counter() - _STARTED["perf"], 6),
+        "stages": {
+            name: {"calls": calls, "total": round(total, 6), "mean": round(total / calls, 6), "max": round(peak, 6)}
+            for name, (calls, total, peak) in ordered
+        },
+        "counters": dict(sorted(counters.items())),
+    }
+
+
+def summary_table(snap: dict = None) -> str:
+    snap = snap or snapshot()
+    wall = snap["wall_seconds"] or 1e-9
+    lines = [f"{'STAGE':<28} {'CALLS':>7} {'TOTAL s':>9} {'MEAN ms':>9} {'MAX ms':>9} {'WALL%':>6}", "-" * 72]
+    for name, s in snap["stages"].items():
+        lines.append(f"{name:<28} {s['calls']:>7} {s['total']:>9.3f} {s['mean'] * 1000:>9.2f} "
+                     f"{s['max'] * 1000:>9.2f} {s['total'] / wall * 100:>5.1f}%")
+    lines.append("-" * 72)
+    lines.append(f"{'wall':<28} {'':>7} {snap['wall_seconds']:>9.3f}")
+    for name, value in snap["counters"].items():
+        lines.append(f"{name:<28} {value:>17,}")
+    return "\n".join(lines)
+
+
+def finish(run: str, cache: dict = None, extra: dict = None, path: str = None) -> str:
+    """
+    執行結束時呼叫：log 摘要表，並寫出 run report JSON
+    （預設 RUN_REPORT_DIR/{run}_{UTC 時間}.json），回傳 report 路徑。
+    cache 為 yf_cache.stats()，extra 為呼叫端自訂欄位。
+    """
+    snap = snapshot()
+    for line in summary_table(snap).split("\n"):
+        logging.info(line)
+    finished = datetime.now(timezone.utc)
+    report = {
+        "version": REPORT_VERSION,
+        "run": run,
+        "argv": sys.argv[1:],
+        "started": datetime.fromtimestamp(_STARTED["wall"], timezone.utc).isoformat(timespec="seconds"),
+        "finished": finished.isoformat(timespec="seconds"),
+        **snap,
+        "cache": cache,
+        **(extra or {}),
+    }
+    if path is None:
+        path = os.path.join(REPORT_DIR, f"{run}_{finished.strftime('%Y%m%dT%H%M%SZ')}.json")
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logging.info(f"Run report: {path}")
+    except OSError as e:
+        logging.warning(f"Run report write failed: {e}")
+    return path
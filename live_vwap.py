@@ -0,0 +1,368 @@
+# live_vwap.py - 盤中即時模式：定期整批輪詢 watchlist，只 append 新 bar，VWAP 逐 bar 串流更新並發出穿越事件
+# 用法: python vwap_yf.py AMD,NVDA --live [--poll 60] [--deviation 1,2] [--notify] [--fake]
+
+import json
+import math
+import os
+import time
+import zlib
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import bar_store
+import chart_tiles
+import instrument
+import market_data
+import notifier
+import trading_calendar
+import vwap_engine
+from trading_calendar import MARKET_TZ
+
+LIVE_DIR = "data/live"
+STATE_FILE = "state.json"
+EVENTS_FILE = "events.jsonl"
+DEFAULT_POLL = 60
+DEFAULT_DEVIATIONS = (1.0, 2.0)  # 偏離 VWAP ±x% 門檻
+MAX_EVENTS = 500  # 記憶體裡只保留最近的事件
+EXPORT_EVERY = 900  # 匯出檔 / tile 每隔多少秒才整批更新一次（store 每次輪詢都寫），run() 結束時再寫一次
+INTERVAL_SECONDS = {"1m": 60, "2m": 120, "5m": 300, "15m": 900, "30m": 1800, "60m": 3600, "1h": 3600}
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+
+def session_of(ts: float) -> str:
+    return datetime.fromtimestamp(ts, MARKET_TZ).strftime("%Y-%m-%d")
+
+
+def session_end(ts: float) -> float:
+    """該日盤後結束 (20:00 美東；提早收盤日 17:00) 的 Unix 秒數"""
+    local = datetime.fromtimestamp(ts, MARKET_TZ)
+    early = trading_calendar.is_early_close(local.date())
+    close = trading_calendar.EARLY_EXTENDED_CLOSE if early else vwap_engine.EXTENDED_CLOSE
+    return local.replace(hour=close.hour, minute=close.minute, second=0, microsecond=0).timestamp()
+
+
+class YahooSource:
+    """yfinance 資料源：整個 watchlist 一次 yf.download（不走快取），抓今天到目前為止的 bar"""
+
+    def __init__(self, interval: str = "5m", prepost: bool = True):
+        self.interval = interval
+        self.prepost = prepost
+
+    def now(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float):
+        time.sleep(max(0.0, seconds))
+
+    def fetch(self, symbols) -> dict:
+        today = datetime.now(MARKET_TZ).date()
+        return market_data.download_window(
+            symbols, today, today + timedelta(days=1), self.interval, self.prepost, cache=False
+        )
+
+
+class FakeSource:
+    """
+    本地假資料源（離線測試用）：每個 symbol 一條決定性的隨機漫步，
+    時鐘只在 sleep 時前進。fetch 和 yfinance 一樣回傳當天到目前為止的全部 bar，
+    最後一根是尚未收完的 bar。
+    """
+
+    def __init__(self, session: str, interval: str = "5m", start: str = "09:30", seed: int = 0,
+                 base: float = 100.0, volatility: float = 0.004):
+        self.interval = interval
+        self.step = INTERVAL_SECONDS[interval]
+        self.clock = pd.Timestamp(f"{session} {start}", tz=MARKET_TZ).timestamp()
+        self.seed = seed
+        self.base = base
+        self.volatility = volatility
+        self._bars = {}
+
+    def now(self) -> float:
+        return self.clock
+
+    def sleep(self, seconds: float):
+        self.clock += max(0.0, seconds)
+
+    def _extend(self, symbol: str, until: float):
+        bars = self._bars.get(symbol)
+        if bars is None:
+            rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+            first = int(self.clock) // self.step * self.step
+            bars = self._bars[symbol] = {"rng": rng, "next": first, "close": self.base, "rows": []}
+        rng = bars["rng"]
+        while bars["next"] <= until:
+            opn = bars["close"]
+            close = opn * (1 + rng.normal(0, self.volatility))
+            high = max(opn, close) * (1 + abs(rng.normal(0, self.volatility / 2)))
+            low = min(opn, close) * (1 - abs(rng.normal(0, self.volatility / 2)))
+            volume = 0 if rng.random() < 0.02 else int(rng.integers(1_000, 50_000))
+            bars["rows"].append((bars["next"], opn, high, low, close, volume))
+            bars["close"] = close
+            bars["next"] += self.step
+
+    def fetch(self, symbols) -> dict:
+        out = {}
+        for sym in symbols:
+            self._extend(sym, self.clock)
+            rows = self._bars[sym]["rows"]
+            df = pd.DataFrame(rows, columns=["time", "open", "high", "low", "close", "volume"])
+            df.index = pd.to_datetime(df.pop("time"), unit="s", utc=True)
+            out[sym] = df
+        return out
+
+
+class SymbolState:
+    """每個 symbol 的即時狀態：只有串流 VWAP 累加值和上次的位置，大小固定不隨 bar 數成長"""
+
+    def __init__(self, engine: vwap_engine.VwapEngine, last_time: int = None, side: int = 0, level: float = 0.0):
+        self.engine = engine
+        self.last_time = last_time
+        self.side = side      # close 在 VWAP 之上 +1 / 之下 -1 / 未知 0
+        self.level = level    # 目前已越過的偏離門檻（帶正負號），0 = 門檻內
+
+    def to_dict(self) -> dict:
+        return {"engine": self.engine.state(), "last_time": self.last_time, "side": self.side, "level": self.level}
+
+
+def _cross_events(st: SymbolState, symbol: str, ts: int, close: float, vwap: float, deviations) -> list:
+    """close 穿越 VWAP、或偏離程度越過更外層的 ±x% 門檻時產生事件"""
+    events = []
+    dev = (close - vwap) / vwap * 100 if vwap else 0.0
+    base = {"symbol": symbol, "time": ts, "close": round(close, 4), "vwap": round(vwap, 4), "deviation_pct": round(dev, 3)}
+
+    side = 1 if close > vwap else -1 if close < vwap else st.side
+    if st.side and side != st.side:
+        events.append({**base, "type": "cross_above" if side > 0 else "cross_below"})
+    st.side = side
+
+    crossed = [x for x in deviations if abs(dev) >= x]
+    level = math.copysign(max(crossed), dev) if crossed else 0.0
+    if level and (abs(level) > abs(st.level) or level * st.level < 0):
+        events.append({**base, "type": "deviation", "level": level})
+    st.level = level
+    return events
+
+
+class LiveMonitor:
+    """
+    poll() 一次：整批抓 watchlist → 每檔只取比上次最後 timestamp 新、且已收完的 bar →
+    逐 bar 餵 VwapEngine（O(1)，不重算整個 session）→ 檢查穿越事件 → append 進 store。
+    匯出檔與 tile 每 export_every 秒整批更新一次（flush），run() 結束時也會 flush。
+    VwapEngine 狀態存在 state.json，重啟後直接接續；狀態對不上 store 才重播當天的 bar。
+    """
+
+    def __init__(self, symbols, source, interval: str = "5m", deviations=DEFAULT_DEVIATIONS,
+                 anchor: str = vwap_engine.REGULAR, persist: bool = True, live_dir: str = LIVE_DIR,
+                 store_root: str = bar_store.STORE_DIR, export_dir: str = bar_store.EXPORT_DIR,
+                 tile_root: str = chart_tiles.TILE_DIR, on_event=None, export_every: float = EXPORT_EVERY):
+        self.symbols = [s.upper() for s in symbols]
+        self.source = source
+        self.interval = interval
+        self.step = INTERVAL_SECONDS[interval]
+        self.deviations = tuple(sorted(float(x) for x in deviations))
+        self.anchor = anchor
+        self.persist = persist
+        self.live_dir = live_dir
+        self.store_root = store_root
+        self.export_dir = export_dir
+        self.tile_root = tile_root
+        self.on_event = on_event
+        self.export_every = export_every
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.states = {}
+        self._pending = {}  # symbol -> {"bars": [尚未匯出的 bar] 或 None（整個重寫）, "days": 要更新 tile 的交易日}
+        self._last_flush = source.now()
+        saved = self._load_state() if persist else {}
+        for sym in self.symbols:
+            self.states[sym] = self._seed(sym, saved.get(sym))
+
+    def _state_path(self) -> str:
+        return os.path.join(self.live_dir, STATE_FILE)
+
+    def _load_state(self) -> dict:
+        path = self._state_path()
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"即時狀態檔無法讀取，重新建立: {e}")
+            return {}
+
+    def _save_state(self):
+        os.makedirs(self.live_dir, exist_ok=True)
+        path = self._state_path()
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({sym: st.to_dict() for sym, st in self.states.items()}, f)
+        os.replace(tmp, path)
+
+    def _seed(self, symbol: str, saved: dict) -> SymbolState:
+        engine = vwap_engine.VwapEngine(self.anchor)
+        if not self.persist:
+            return SymbolState(engine)
+        bar_store.ensure_store(symbol, self.store_root, self.export_dir)
+        days = bar_store.list_days(symbol, self.store_root)
+        if not days:
+            return SymbolState(engine)
+        stored = bar_store.load_day(symbol, days[-1], self.store_root, mmap=False)
+        last_time = int(stored["time"][-1]) if len(stored) else None
+        self._catch_up(symbol, days, last_time)
+
+        if saved and saved.get("last_time") == last_time and saved.get("engine", {}).get("anchor") == self.anchor:
+            engine = vwap_engine.VwapEngine.from_state(saved["engine"])
+            return SymbolState(engine, last_time, saved.get("side", 0), saved.get("level", 0.0))
+
+        # 狀態檔不存在或落後於 store：重播最後一天一次（之後都是逐 bar 更新）
+        st = SymbolState(engine, last_time)
+        if days[-1] == session_of(self.source.now()):
+            for b in stored:
+                value = engine.update(int(b["time"]), b["high"], b["low"], b["close"], b["volume"])
+                if value:
+                    _cross_events(st, symbol, int(b["time"]), float(b["close"]), value["vwap"], self.deviations)
+        return st
+
+    def _new_bars(self, symbol: str, df: pd.DataFrame, now: float) -> np.ndarray:
+        """DataFrame -> 比 last_time 新、且 bar 結束時間已過 now 的 BAR_DTYPE（vwap 待填）"""
+        bars = bar_store.frame_to_bars(df, anchor=None)
+        st = self.states[symbol]
+        keep = bars["time"] + self.step <= now
+        if st.last_time is not None:
+            keep &= bars["time"] > st.last_time
+        return bars[keep]
+
+    def ingest(self, symbol: str, bars: np.ndarray) -> list:
+        """新 bar 逐筆更新 VWAP 並檢查事件；bars 的 vwap 欄位改寫為串流結果"""
+        st = self.states[symbol]
+        if st.engine.session and len(bars) and session_of(int(bars["time"][0])) != st.engine.session:
+            st.side, st.level = 0, 0.0  # 新的交易日：位置歸零
+        events = []
+        for i in range(len(bars)):
+            ts = int(bars["time"][i])
+            close = float(bars["close"][i])
+            value = st.engine.update(ts, float(bars["high"][i]), float(bars["low"][i]), close, float(bars["volume"][i]))
+            bars["vwap"][i] = value["vwap"] if value else np.nan
+            if value:
+                events.extend(_cross_events(st, symbol, ts, close, value["vwap"], self.deviations))
+            st.last_time = ts
+        return events
+
+    def _catch_up(self, symbol: str, days: list, last_time: int):
+        """上次在 flush 前中斷：匯出檔或 tile 落後 store 時，排進下一次 flush 整個補寫"""
+        exported = (bar_store.load_manifest(symbol, self.store_root).get("export") or {}).get("last_time") or 0
+        tiled = chart_tiles.load_manifest(symbol, self.tile_root).get("last") or 0
+        if last_time is not None and min(exported, tiled) < last_time:
+            since = session_of(min(exported, tiled)) if min(exported, tiled) else ""
+            self._pending[symbol] = {"bars": None, "days": {d for d in days if d >= since}}
+
+    def _store(self, symbol: str, bars: np.ndarray):
+        added = bar_store.append_bars(symbol, bars, self.store_root)
+        days = {d for d, n in added.items() if n}
+        if not days:
+            return
+        pending = self._pending.setdefault(symbol, {"bars": [], "days": set()})
+        if pending["bars"] is not None:
+            pending["bars"].append(bars)
+        pending["days"] |= days
+
+    def flush(self):
+        """把累積的新 bar 一次寫進匯出檔（可 append 時只補尾端）並更新受影響的 tile"""
+        for symbol, pending in self._pending.items():
+            new_bars = np.concatenate(pending["bars"]) if pending["bars"] else None
+            try:
+                bar_store.export_intraday(symbol, new_bars, force=True, root=self.store_root, export_dir=self.export_dir)
+                chart_tiles.update_tiles(symbol, sorted(pending["days"]), self.store_root, self.tile_root)
+            except Exception as e:
+                logging.error(f"匯出失敗 {symbol}: {e}")
+        self._pending.clear()
+        self._last_flush = self.source.now()
+
+    @instrument.timed("live.poll")
+    def poll(self) -> list:
+        """輪詢一次，回傳這次產生的事件"""
+        now = self.source.now()
+        try:
+            frames = self.source.fetch(self.symbols)
+        except Exception as e:
+            logging.error(f"即時輪詢失敗: {e}")
+            return []
+
+        events, counts = [], {}
+        for sym in self.symbols:
+            df = frames.get(sym)
+            if df is None or df.empty:
+                continue
+            bars = self._new_bars(sym, df, now)
+            if not len(bars):
+                continue
+            events.extend(self.ingest(sym, bars))
+            counts[sym] = len(bars)
+            if self.persist:
+                try:
+                    self._store(sym, bars)
+                except Exception as e:
+                    logging.error(f"寫入失敗 {sym}: {e}")
+
+        if self.persist and self._pending and now - self._last_flush >= self.export_every:
+            self.flush()
+        if self.persist and counts:
+            self._save_state()
+            if events:
+                with open(os.path.join(self.live_dir, EVENTS_FILE), "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(e) + "\n" for e in events)
+        for e in events:
+            self.events.append(e)
+            logging.info(f"{e['symbol']} {e['type']} close {e['close']} vwap {e['vwap']} ({e['deviation_pct']:+.2f}%)")
+        if events and self.on_event:
+            self.on_event(events)
+        if counts:
+            logging.info(f"新增 bar: {', '.join(f'{s} {n}' for s, n in counts.items())}")
+        return events
+
+    def run(self, poll_seconds: float = DEFAULT_POLL, until: float = None, max_polls: int = None) -> int:
+        """輪詢到 until（預設當日盤後結束）或 max_polls 次為止，回傳輪詢次數；非交易日不輪詢"""
+        session = session_of(self.source.now())
+        if not trading_calendar.is_trading_day(session):
+            logging.info(f"{session} 非交易日，不輪詢")
+            return 0
+        until = until or session_end(self.source.now())
+        polls = 0
+        try:
+            while True:
+                started = self.source.now()
+                self.poll()
+                polls += 1
+                if (max_polls and polls >= max_polls) or self.source.now() >= until:
+                    return polls
+                self.source.sleep(poll_seconds - (self.source.now() - started))
+        finally:
+            if self.persist:
+                self.flush()
+
+
+def format_event(e: dict) -> str:
+    when = datetime.fromtimestamp(e["time"], MARKET_TZ).strftime("%H:%M")
+    return f"VWAP {when} {e['symbol']} {e['type']} close {e['close']:.2f} / vwap {e['vwap']:.2f} ({e['deviation_pct']:+.2f}%)"
+
+
+def run_live(symbols, interval: str = "5m", poll_seconds: float = DEFAULT_POLL, deviations=DEFAULT_DEVIATIONS,
+             notify: bool = False, fake: bool = False, max_polls: int = None) -> LiveMonitor:
+    """vwap_yf.py --live 的進入點；fake=True 用 FakeSource 跑一整天且不寫入 data/"""
+    if fake:
+        # 假資料跑最近一個交易日（週末 / 假日也能離線測試）
+        source = FakeSource(trading_calendar.previous_trading_days(session_of(time.time()), 1)[0], interval)
+        poll_seconds = max(poll_seconds, INTERVAL_SECONDS[interval])
+    else:
+        source = YahooSource(interval)
+    # 每個事件各自排入 notifier 佇列，同一時間的會被併成一則 Telegram 訊息
+    on_event = (lambda events: [notifier.notify(format_event(e), parse_mode="") for e in events]) if notify else None
+    monitor = LiveMonitor(symbols, source, interval, deviations, persist=not fake, on_event=on_event)
+    logging.info(f"即時模式: {len(monitor.symbols)} 檔, 每 {poll_seconds:.0f}s 輪詢, 偏離門檻 {monitor.deviations}")
+    polls = monitor.run(poll_seconds, max_polls=max_polls)
+    logging.info(f"即時模式結束: {polls} 次輪詢, {len(monitor.events)} 個事件")
+    return monitor
@@ -0,0 +1,83 @@
+# market_data.py - 批次 yf.download：整個 watchlist × 多日區間一次抓，再切成 per-symbol / per-day frame
+
+import logging
+from datetime import date, datetime, timedelta
+import pandas as pd
+import yfinance as yf
+import fetch_pool
+import instrument
+import utils
+import yf_cache
+from trading_calendar import MARKET_TZ
+
+
+def _date_str(d) -> str:
+    if isinstance(d, (date, datetime)):
+        return d.strftime("%Y-%m-%d")
+    return str(d)
+
+
+def download_window(symbols, start, end, interval: str = "5m", prepost: bool = False, cache: bool = True) -> dict:
+    """
+    一次 yf.download 抓 symbols 在 [start, end) 區間的資料，
+    回傳 {symbol: normalized DataFrame}（沒資料的 symbol 不會出現）。
+    每個 symbol 的結果各自進 yf_cache，只有未命中的 symbol 才會被批次下載；
+    cache=False（即時輪詢）時一律重新下載、也不寫入快取。
+    """
+    symbols = [s.upper() for s in symbols]
+    if not symbols:
+        return {}
+    start, end = _date_str(start), _date_str(end)
+    ttl = yf_cache.history_ttl(end)
+
+    out, missing = {}, []
+    for sym in symbols:
+        hit, df = yf_cache.get("history", [sym, start, end, interval, prepost]) if cache else (False, None)
+        if hit:
+            out[sym] = df
+        else:
+            missing.append(sym)
+
+    if missing:
+        with instrument.timer("yf.download"):
+            df = fetch_pool.call(
+                yf.download, missing, start=start, end=end, interval=interval,
+                prepost=prepost, group_by="column", progress=False, threads=True,
+            )
+        instrument.count("yf.requests.download")
+        instrument.count("yf.symbols.download", len(missing))
+        if df is not None and not df.empty:
+            for sym in missing:
+                norm, err = utils.normalize_dataframe(df, sym)
+                if err:
+                    logging.warning(f"Batch download {sym}: {err}")
+                    continue
+                if not norm.empty:
+                    out[sym] = norm
+                    if cache:
+                        yf_cache.put("history", [sym, start, end, interval, prepost], norm, ttl)
+    return {sym: out[sym] for sym in symbols if sym in out}
+
+
+def split_by_day(df: pd.DataFrame) -> dict:
+    """依美東交易日切分（盤後 bar 在 UTC 會跨日），回傳 {YYYY-MM-DD: DataFrame}"""
+    if df is None or df.empty:
+        return {}
+    idx = df.index
+    if getattr(idx, "tz", None) is not None:
+        idx = idx.tz_convert(MARKET_TZ)
+    keys = idx.strftime("%Y-%m-%d")
+    return {day: part for day, part in df.groupby(keys, sort=True)}
+
+
+def download_days(symbols, start, end, interval: str = "5m", prepost: bool = False) -> dict:
+    """download_window + split_by_day，回傳 {symbol: {YYYY-MM-DD: DataFrame}}"""
+    frames = download_window(symbols, start, end, interval, prepost)
+    return {sym: split_by_day(df) for sym, df in frames.items()}
+
+
+def window_for(target_date, max_back: int) -> tuple:
+    """回溯 max_back 天的下載區間 [target - max_back, target + 1)"""
+    if isinstance(target_date, str):
+        target_date = datetime.strptime(target_date, "%Y-%m-%d")
+    return target_date - timedelta(days=max_back), target_date + timedelta(days=1)
@@ -0,0 +1,70 @@
+# market_snapshot.py - 每個 symbol 一份掃描用快照：報價、前一交易日、最近到期日期權鏈，用最少請求一次抓齊
+
+import logging
+import yfinance as yf
+import yf_cache
+from utils import get_last_trading_day_vwap
+
+
+class SymbolSnapshot:
+    """
+    premarket_scan 的所有評分函式都只讀這個物件。
+    - 前一交易日：main 整批下載的 5m 資料 (prev_days)，不另外發請求
+    - 報價 + 期權鏈：options endpoint 一次回傳 (yf_cache.quote_chain)
+    - 只有沒有期權的標的才退回 Ticker.info 取報價
+    同一個 yf.Ticker 在快照內共用；yfinance 底層共用同一個 HTTP session。
+    """
+
+    def __init__(self, symbol: str, prev_days: dict = None):
+        self.symbol = symbol.upper()
+        self.prev_days = prev_days
+        self.prev = None
+        self.quote = {}
+        self.expiries = ()
+        self.expiry = None
+        self.calls = None
+        self.puts = None
+        self._ticker = None
+
+    @property
+    def ticker(self):
+        if self._ticker is None:
+            self._ticker = yf.Ticker(self.symbol)
+        return self._ticker
+
+    def load(self):
+        self.prev = get_last_trading_day_vwap(self.symbol, days=self.prev_days)
+        try:
+            chain = yf_cache.quote_chain(self.symbol, self.ticker)
+        except Exception as e:
+            logging.warning(f"Quote/options error for {self.symbol}: {e}")
+            chain = {}
+        if chain:
+            self.quote = chain["quote"]
+            self.expiries, self.expiry = chain["expiries"], chain["expiry"]
+            self.calls, self.puts = chain["calls"], chain["puts"]
+        if not self.quote.get("regularMarketPrice"):
+            try:
+                self.quote = yf_cache.ticker_info(self.symbol, self.ticker)
+            except Exception as e:
+                logging.warning(f"Quote info error for {self.symbol}: {e}")
+        return self
+
+    @property
+    def pre_price(self):
+        return self.quote.get("preMarketPrice")
+
+    @property
+    def last_price(self):
+        return self.quote.get("regularMarketPrice") or self.quote.get("currentPrice")
+
+    @property
+    def prev_close(self):
+        """盤前時 Yahoo 的 regularMarketPrice 就是前一交易日收盤；有下載到前一日 bar 時以它為準"""
+        if self.prev and self.prev.get("prev_close"):
+            return self.prev["prev_close"]
+        return self.last_price or self.quote.get("regularMarketPreviousClose") or self.quote.get("previousClose")
+
+    @property
+    def has_chain(self) -> bool:
+        return self.calls is not None and self.puts is not None
@@ -0,0 +1,245 @@
+# notifier.py - 唯一的 Telegram 發送元件：背景佇列、連線池 (requests.Session)、訊息合併、429 retry_after
+# 測試: TG_API_URL=http://127.0.0.1:8081 python notifier.py "hello"（指向本地 stub server）
+
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+import instrument
+
+API_URL = os.getenv("TG_API_URL", "https://api.telegram.org")
+MAX_LENGTH = 4096          # Telegram 單則訊息上限（字元）
+COALESCE_SECONDS = 1.0     # 收到第一則後再等這麼久，把同時間的 alert 併成一則
+MAX_QUEUE = 1000
+MAX_RETRIES = 5
+BACKOFF = 1.0              # 網路錯誤 / 5xx 的退避秒數，第 n 次重試等待 backoff * 2**(n-1)
+FLUSH_TIMEOUT = 30.0       # 程式結束時最多等這麼久把佇列送完
+SEPARATOR = "\n\n"
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+
+def split_text(text: str, limit: int = MAX_LENGTH) -> list:
+    """超過 limit 的單則訊息依換行切開；單行本身超長才硬切"""
+    if len(text) <= limit:
+        return [text]
+    parts, current = [], ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+
+def coalesce(texts, limit: int = MAX_LENGTH) -> list:
+    """依序把多則 alert 以空行接起來，每則合併後的訊息不超過 limit"""
+    messages, current = [], ""
+    for text in texts:
+        for part in split_text(text, limit):
+            candidate = f"{current}{SEPARATOR}{part}" if current else part
+            if len(candidate) > limit:
+                messages.append(current)
+                current = part
+            else:
+                current = candidate
+    if current:
+        messages.append(current)
+    return messages
+
+
+class TelegramNotifier:
+    """
+    send() 只把訊息放進佇列就回傳，不會卡住呼叫端；背景執行緒負責合併與發送。
+    同一個 requests.Session 重複使用連線；429 依 Telegram 回傳的 retry_after 等待後重送，
+    網路錯誤與 5xx 指數退避，其他 4xx 記錄後丟棄。
+    """
+
+    def __init__(self, token: str = None, chat_id: str = None, api_url: str = None, parse_mode: str = "Markdown",
+                 max_length: int = MAX_LENGTH, coalesce_seconds: float = COALESCE_SECONDS, max_queue: int = MAX_QUEUE,
+                 max_retries: int = MAX_RETRIES, backoff: float = BACKOFF, timeout: float = 10.0):
+        self.token = token if token is not None else os.getenv("TG_BOT_TOKEN")
+        self.chat_id = chat_id if chat_id is not None else os.getenv("TG_CHAT_ID")
+        self.api_url = (api_url or API_URL).rstrip("/")
+        self.parse_mode = parse_mode
+        self.max_length = max_length
+        self.coalesce_seconds = coalesce_seconds
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.stats = {"queued": 0, "messages": 0, "retries": 0, "rate_limited": 0, "failed": 0, "dropped": 0}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token and self.chat_id)
+
+    def send(self, text: str, parse_mode: str = None) -> bool:
+        """放進發送佇列（parse_mode None = 預設，"" = 純文字）；未設定 token、佇列已滿或已關閉時回傳 False"""
+        if not self.enabled:
+            logging.warning("Telegram env not set, skip sending.")
+            return False
+        if self._closed or not text:
+            return False
+        try:
+            self._queue.put_nowait((text, self.parse_mode if parse_mode is None else parse_mode))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            logging.warning("Telegram queue full, alert dropped.")
+            return False
+        self.stats["queued"] += 1
+        self._start()
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="telegram-notifier", daemon=True)
+                self._thread.start()
+
+    def _drain(self, first) -> list:
+        """取出第一則之後 coalesce_seconds 內陸續進來的 alert"""
+        items = [first]
+        deadline = time.monotonic() + self.coalesce_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                items.append(self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                self._queue.task_done()
+                return
+            items = self._drain(first)
+            stop = any(item is None for item in items)
+            items = [item for item in items if item is not None]
+            # parse_mode 不同的 alert 不能併在同一則：依序分組
+            groups = []
+            for text, mode in items:
+                if groups and groups[-1][0] == mode:
+                    groups[-1][1].append(text)
+                else:
+                    groups.append((mode, [text]))
+            for mode, texts in groups:
+                for message in coalesce(texts, self.max_length):
+                    self._post(message, mode)
+            for _ in range(len(items) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _post(self, text: str, parse_mode: str) -> bool:
+        url = f"{self.api_url}/bot{self.token}/sendMessage"
+        payload = {"chat_id": self.chat_id, "text": text, "disable_web_page_preview": True}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        for attempt in range(self.max_retries + 1):
+            wait = self.backoff * (2 ** attempt)
+            try:
+                with instrument.timer("telegram.send"):
+                    resp = self._session.post(url, json=payload, timeout=self.timeout)
+                instrument.count("telegram.requests")
+            except requests.RequestException as e:
+                logging.warning(f"Telegram exception: {e}")
+            else:
+                if resp.status_code == 200:
+                    self.stats["messages"] += 1
+                    return True
+                if resp.status_code == 429:
+                    self.stats["rate_limited"] += 1
+                    wait = self._retry_after(resp, wait)
+                elif resp.status_code < 500:
+                    logging.warning(f"Telegram send failed: {resp.text}")
+                    break
+                else:
+                    logging.warning(f"Telegram server error {resp.status_code}")
+            if attempt < self.max_retries:
+                self.stats["retries"] += 1
+                time.sleep(wait)
+        self.stats["failed"] += 1
+        return False
+
+    @staticmethod
+    def _retry_after(resp, default: float) -> float:
+        """429 回應的 parameters.retry_after（秒），沒有時看 Retry-After header"""
+        try:
+            return float(resp.json()["parameters"]["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            pass
+        try:
+            return float(resp.headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            return default
+
+    def flush(self, timeout: float = None) -> bool:
+        """等佇列全部送完（或逾時），回傳是否已送完"""
+        if self._thread is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: float = FLUSH_TIMEOUT):
+        """送完佇列後停止背景執行緒並關閉連線"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self._session.close()
+
+
+_NOTIFIER = None
+_NOTIFIER_LOCK = threading.Lock()
+
+
+def get_notifier() -> TelegramNotifier:
+    """全域共用的 notifier（第一次使用時建立，程式結束前自動送完佇列）"""
+    global _NOTIFIER
+    with _NOTIFIER_LOCK:
+        if _NOTIFIER is None:
+            _NOTIFIER = TelegramNotifier()
+            atexit.register(_NOTIFIER.close)
+        return _NOTIFIER
+
+
+def notify(text: str, parse_mode: str = "Markdown") -> bool:
+    return get_notifier().send(text, parse_mode)
+
+
+if __name__ == "__main__":
+    n = get_notifier()
+    notify(" ".join(sys.argv[1:]) or "notifier test")
+    n.close()
+    logging.info(f"Telegram stats: {n.stats}")
@@ -0,0 +1,131 @@
+# options_analytics.py - 多到期日期權鏈整成一張 NumPy 表，一次向量化算出 ATM 量 / OI、P/C、成交量加權 moneyness
+
+import logging
+import numpy as np
+import fetch_pool
+import yf_cache
+
+DEFAULT_EXPIRIES = 3
+ATM_BAND = 0.05  # ATM 視窗：strike 在 price ±5% 內
+PC_BULLISH = 0.5
+PC_BEARISH = 1.5
+
+CHAIN_DTYPE = np.dtype([
+    ("expiry", "i4"),   # 第幾個到期日 (0 = 最近)
+    ("put", "?"),
+    ("strike", "f8"),
+    ("volume", "f8"),
+    ("oi", "f8"),
+    ("iv", "f8"),
+])
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+
+def _column(df, name: str) -> np.ndarray:
+    if name not in df.columns:
+        return np.zeros(len(df))
+    return np.nan_to_num(df[name].to_numpy(dtype="float64", na_value=np.nan))
+
+
+def chain_table(chains: list) -> np.ndarray:
+    """[(expiry, calls_df, puts_df), ...] → 一張 CHAIN_DTYPE 結構陣列（calls / puts 全部接在一起）"""
+    parts = []
+    for i, (_, calls, puts) in enumerate(chains):
+        for is_put, df in ((False, calls), (True, puts)):
+            if df is None or df.empty:
+                continue
+            part = np.empty(len(df), dtype=CHAIN_DTYPE)
+            part["expiry"] = i
+            part["put"] = is_put
+            part["strike"] = _column(df, "strike")
+            part["volume"] = _column(df, "volume")
+            part["oi"] = _column(df, "openInterest")
+            part["iv"] = _column(df, "impliedVolatility")
+            parts.append(part)
+    return np.concatenate(parts) if parts else np.empty(0, dtype=CHAIN_DTYPE)
+
+
+def load_chains(snap, n_expiries: int = DEFAULT_EXPIRIES, workers: int = None) -> list:
+    """
+    最近到期日直接用 snapshot 已抓到的鏈，其餘到期日並行下載（經 yf_cache / fetch_pool 限速）。
+    單一到期日失敗只略過該到期日。
+    """
+    if not snap.has_chain:
+        return []
+    chains = [(snap.expiry, snap.calls, snap.puts)]
+    rest = list(snap.expiries[1:n_expiries])
+    if not rest:
+        return chains
+    fetch = lambda expiry: yf_cache.option_chain(snap.symbol, expiry, snap.ticker)
+    for expiry, chain, err in fetch_pool.map_ordered(fetch, rest, workers or len(rest)):
+        if err is not None:
+            logging.warning(f"Option chain error for {snap.symbol} {expiry}: {err}")
+            continue
+        chains.append((expiry, chain.calls, chain.puts))
+    return chains
+
+
+def _ratio(num, den):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(den > 0, num / np.where(den > 0, den, 1.0), 0.0)
+
+
+def analyze(table: np.ndarray, price: float, n_expiries: int, atm_band: float = ATM_BAND) -> dict:
+    """
+    依 (到期日, call/put) 分組，用 bincount 一次加總所有欄位：
+    總量 / OI、ATM 量 / OI、成交量加權 moneyness (strike / price - 1)、ATM 成交量加權 IV。
+    回傳 {"per_expiry": [...], "near": {...}, "term": {...}}；near 為最近到期日，term 為全部到期日合計。
+    """
+    n = max(int(n_expiries), 1)
+    group = table["expiry"].astype("int64") * 2 + table["put"]
+    strike, vol, oi = table["strike"], table["volume"], table["oi"]
+    atm = (strike >= price * (1 - atm_band)) & (strike <= price * (1 + atm_band))
+    moneyness = strike / price - 1.0
+    weights = np.stack([vol, oi, vol * atm, oi * atm, vol * moneyness, vol * atm * table["iv"]])
+    # sums[k, expiry, 0=call / 1=put]
+    sums = np.stack([np.bincount(group, weights=w, minlength=2 * n) for w in weights]).reshape(len(weights), n, 2)
+    vol_s, oi_s, atm_vol_s, atm_oi_s, mny_s, iv_s = sums
+
+    def _stats(v, o, av, ao, m, iv):
+        return {
+            "call_vol": int(v[..., 0].sum()), "put_vol": int(v[..., 1].sum()),
+            "call_oi": int(o[..., 0].sum()), "put_oi": int(o[..., 1].sum()),
+            "atm_vol": int(av.sum()), "atm_oi": int(ao.sum()),
+            "pc_ratio": float(_ratio(av[..., 1].sum(), av[..., 0].sum())),
+            "oi_pc_ratio": float(_ratio(o[..., 1].sum(), o[..., 0].sum())),
+            "call_moneyness": float(_ratio(m[..., 0].sum(), v[..., 0].sum())),
+            "put_moneyness": float(_ratio(m[..., 1].sum(), v[..., 1].sum())),
+            "atm_iv": float(_ratio(iv.sum(), av.sum())),
+        }
+
+    per_expiry = [_stats(vol_s[i], oi_s[i], atm_vol_s[i], atm_oi_s[i], mny_s[i], iv_s[i]) for i in range(n)]
+    return {
+        "per_expiry": per_expiry,
+        "near": per_expiry[0],
+        "term": _stats(vol_s, oi_s, atm_vol_s, atm_oi_s, mny_s, iv_s),
+    }
+
+
+def flow_bias(pc_ratio: float) -> int:
+    """+1 偏多 (call 成交量主導)、-1 偏空、0 中性；pc_ratio 為 0 代表沒有 call 成交量，視為中性"""
+    if 0 < pc_ratio < PC_BULLISH:
+        return 1
+    if pc_ratio > PC_BEARISH:
+        return -1
+    return 0
+
+
+def term_signal(stats: dict) -> int:
+    """
+    最近到期日的 P/C 偏向是否被整條期限結構確認：
+    +1 = 遠月同方向（P/C 在 1 的同一側）、-1 = 遠月反向、0 = 近月中性或只有一個到期日。
+    """
+    if len(stats["per_expiry"]) < 2:
+        return 0
+    near = flow_bias(stats["near"]["pc_ratio"])
+    term_pc = stats["term"]["pc_ratio"]
+    if near == 0 or term_pc == 0:
+        return 0
+    term = 1 if term_pc < 1.0 else -1 if term_pc > 1.0 else 0
+    return 1 if term == near else -1 if term else 0
@@ -1,19 +1,29 @@
 # premarket_scan.py
 import argparse
-import json
-import os
 from datetime import datetime
 import pandas as pd
-import yfinance as yf
-from utils import get_last_trading_day_vwap, send_telegram_message, logging
+import fetch_pool
+import instrument
+import market_data
+import notifier
+import options_analytics
+import premarket_store
+import trading_calendar
+import yf_cache
+from market_snapshot import SymbolSnapshot
+from utils import send_telegram_message, logging
 
-def get_premarket_data(symbol: str):
+_EMPTY_OPT = {
+    "liq_score": 0, "flow_score": 0, "total": 0, "pc_ratio": 0.0, "atm_vol": 0, "atm_oi": 0, "expiries": 0,
+    "term_pc_ratio": 0.0, "term_atm_vol": 0, "oi_pc_ratio": 0.0, "call_moneyness": 0.0, "put_moneyness": 0.0,
+    "atm_iv": 0.0, "term_signal": 0,
+}
+
+def get_premarket_data(snap: SymbolSnapshot):
     try:
-        tick = yf.Ticker(symbol)
-        pre_price = tick.info.get("preMarketPrice")
-        fast = tick.fast_info
-        last_price = fast.last_price
-        prev_close = fast.previous_close
+        pre_price = snap.pre_price
+        last_price = snap.last_price
+        prev_close = snap.prev_close
         if not prev_close:
             return None
         price = float(pre_price) if pre_price and pre_price > 0 else float(last_price) if last_price else None
@@ -23,82 +33,112 @@ def get_premarket_data(symbol: str):
         gap_pct = (price - prev_close) / prev_close * 100.0
         return {"price": price, "prev_close": float(prev_close), "gap_pct": gap_pct, "source": source}
     except Exception as e:
-        logging.warning(f"Premarket data error for {symbol}: {e}")
+        logging.warning(f"Premarket data error for {snap.symbol}: {e}")
         return None
 
-def get_options_score(symbol: str):
+def get_options_score(snap: SymbolSnapshot, n_expiries: int = options_analytics.DEFAULT_EXPIRIES):
     try:
-        tick = yf.Ticker(symbol)
-        expiry = tick.options[0] if tick.options else None
-        if not expiry:
-            return {"liq_score": 0, "flow_score": 0, "total": 0, "pc_ratio": 0.0, "atm_vol": 0, "atm_oi": 0}
-        chain = tick.option_chain(expiry)
-        calls, puts = chain.calls, chain.puts
-        price = tick.fast_info.last_price
-        atm_calls = calls[(calls["strike"] >= price * 0.95) & (calls["strike"] <= price * 1.05)]
-        atm_puts = puts[(puts["strike"] >= price * 0.95) & (puts["strike"] <= price * 1.05)]
-        atm_vol = int(atm_calls["volume"].sum() + atm_puts["volume"].sum())
-        atm_oi = int(atm_calls["openInterest"].sum() + atm_puts["openInterest"].sum())
-        pc_ratio = atm_puts["volume"].sum() / atm_calls["volume"].sum() if atm_calls["volume"].sum() > 0 else 0.0
+        price = snap.last_price
+        chains = options_analytics.load_chains(snap, n_expiries) if price else []
+        if not chains:
+            return dict(_EMPTY_OPT)
+        stats = options_analytics.analyze(options_analytics.chain_table(chains), price, len(chains))
+        near, term = stats["near"], stats["term"]
+        atm_vol, atm_oi, pc_ratio = near["atm_vol"], near["atm_oi"], near["pc_ratio"]
         liq_score = 3 if atm_vol > 10000 else 2 if atm_vol > 5000 else 1 if atm_vol > 1000 else 0
         flow_score = 1 if atm_oi > 5000 else 0
         if pc_ratio > 1.5 or pc_ratio < 0.5:
             flow_score += 1
         total = liq_score + flow_score
-        return {"liq_score": liq_score, "flow_score": flow_score, "total": total, "pc_ratio": pc_ratio, "atm_vol": atm_vol, "atm_oi": atm_oi}
+        return {
+            "liq_score": liq_score, "flow_score": flow_score, "total": total, "pc_ratio": pc_ratio,
+            "atm_vol": atm_vol, "atm_oi": atm_oi, "expiries": len(chains),
+            "term_pc_ratio": term["pc_ratio"], "term_atm_vol": term["atm_vol"], "oi_pc_ratio": term["oi_pc_ratio"],
+            "call_moneyness": term["call_moneyness"], "put_moneyness": term["put_moneyness"],
+            "atm_iv": near["atm_iv"], "term_signal": options_analytics.term_signal(stats),
+        }
     except Exception as e:
-        logging.warning(f"Options score error for {symbol}: {e}")
-        return {"liq_score": 0, "flow_score": 0, "total": 0, "pc_ratio": 0.0, "atm_vol": 0, "atm_oi": 0}
+        logging.warning(f"Options score error for {snap.symbol}: {e}")
+        return dict(_EMPTY_OPT)
 
 def decide_scenario(total_score: int):
     return "A" if total_score >= 6 else "C" if total_score <= 2 else "B"
 
+@instrument.timed("premarket.symbol")
+def scan_symbol(sym: str, prev_days: dict = None, n_expiries: int = options_analytics.DEFAULT_EXPIRIES) -> dict:
+    # 報價、期權鏈、前一交易日都從同一份快照讀，不再各自打 API
+    snap = SymbolSnapshot(sym, prev_days).load()
+    prev = snap.prev or {"prev_trend": "N/A", "prev_close": 0.0}
+    pre = get_premarket_data(snap) or {"price": prev["prev_close"], "prev_close": prev["prev_close"], "gap_pct": 0.0, "source": "fallback"}
+    opt = get_options_score(snap, n_expiries)
+    opt_score = opt["total"]
+    total_score = opt_score
+    if abs(pre["gap_pct"]) > 1.5:
+        total_score += 2
+    elif abs(pre["gap_pct"]) > 0.5:
+        total_score += 1
+    if prev["prev_trend"] == "Bullish" and pre["gap_pct"] > 0:
+        total_score += 1
+    if prev["prev_trend"] == "Bearish" and pre["gap_pct"] < 0:
+        total_score += 1
+    # 遠月期權流向確認 (+1) / 反向 (-1) 近月：直接算進 total_score，歷史與 dashboard 顯示的分數即判斷用的分數
+    total_score += opt["term_signal"]
+    scenario = decide_scenario(total_score)
+    row = {
+        "symbol": sym, "prev_trend": prev["prev_trend"], "prev_close": float(pre["prev_close"]),
+        "price": float(pre["price"]), "gap_pct": float(pre["gap_pct"]),
+        "opt_liq_score": int(opt["liq_score"]), "opt_flow_score": int(opt["flow_score"]),
+        "opt_total_score": int(opt["total"]), "pc_ratio": float(opt["pc_ratio"]),
+        "atm_vol": int(opt["atm_vol"]), "atm_oi": int(opt["atm_oi"]),
+        "opt_expiries": int(opt["expiries"]), "term_pc_ratio": float(opt["term_pc_ratio"]),
+        "term_atm_vol": int(opt["term_atm_vol"]), "oi_pc_ratio": float(opt["oi_pc_ratio"]),
+        "call_moneyness": float(opt["call_moneyness"]), "put_moneyness": float(opt["put_moneyness"]),
+        "atm_iv": float(opt["atm_iv"]), "term_signal": int(opt["term_signal"]),
+        "total_score": int(total_score), "scenario": scenario, "pre_source": pre.get("source", "unknown")
+    }
+    logging.info(f"{sym}: trend={row['prev_trend']}, gap={row['gap_pct']:+.2f}%, opt={opt_score}, score={total_score}, scenario={scenario}")
+    return row
+
+def scan_watchlist(symbols: list, workers: int = fetch_pool.DEFAULT_WORKERS,
+                   n_expiries: int = options_analytics.DEFAULT_EXPIRIES) -> list:
+    """整個 watchlist 的評分迴圈，回傳成功的 row（依輸入順序）"""
+    # 前一交易日 VWAP 用的 5m 資料：整個 watchlist 一次下載
+    run_date = datetime.now().date()
+    try:
+        window = trading_calendar.trading_days_back(run_date, 7, include=False)
+        prev_days = market_data.download_days(symbols, window[-1], run_date, "5m") if window else {}
+    except Exception as e:
+        logging.warning(f"Batch download failed, fallback per symbol: {e}")
+        prev_days = {}
+    results = []
+    scan = lambda sym: scan_symbol(sym, prev_days.get(sym, {}) if prev_days else None, n_expiries)
+    for sym, row, err in fetch_pool.map_ordered(scan, symbols, workers):
+        if err:
+            logging.error(f"Error {sym}: {err}")
+        else:
+            results.append(row)
+    return results
+
 def main():
     parser = argparse.ArgumentParser(description="Premarket Scan")
     parser.add_argument("symbols", type=str, help="Comma-separated symbols e.g. AMD,NVDA")
+    parser.add_argument("--workers", type=int, default=fetch_pool.DEFAULT_WORKERS, help="Concurrent symbols")
+    parser.add_argument("--expiries", type=int, default=options_analytics.DEFAULT_EXPIRIES, help="Option expiries per symbol")
     args = parser.parse_args()
     symbols = [s.strip().upper() for s in args.symbols.split(",")]
-    results = []
-    for sym in symbols:
-        try:
-            prev = get_last_trading_day_vwap(sym) or {"prev_trend": "N/A", "prev_close": 0.0}
-            pre = get_premarket_data(sym) or {"price": prev["prev_close"], "prev_close": prev["prev_close"], "gap_pct": 0.0, "source": "fallback"}
-            opt = get_options_score(sym)
-            opt_score = opt["total"]
-            total_score = opt_score
-            if abs(pre["gap_pct"]) > 1.5:
-                total_score += 2
-            elif abs(pre["gap_pct"]) > 0.5:
-                total_score += 1
-            if prev["prev_trend"] == "Bullish" and pre["gap_pct"] > 0:
-                total_score += 1
-            if prev["prev_trend"] == "Bearish" and pre["gap_pct"] < 0:
-                total_score += 1
-            scenario = decide_scenario(total_score)
-            row = {
-                "symbol": sym, "prev_trend": prev["prev_trend"], "prev_close": float(pre["prev_close"]),
-                "price": float(pre["price"]), "gap_pct": float(pre["gap_pct"]),
-                "opt_liq_score": int(opt["liq_score"]), "opt_flow_score": int(opt["flow_score"]),
-                "opt_total_score": int(opt["total"]), "pc_ratio": float(opt["pc_ratio"]),
-                "atm_vol": int(opt["atm_vol"]), "atm_oi": int(opt["atm_oi"]),
-                "total_score": int(total_score), "scenario": scenario, "pre_source": pre.get("source", "unknown")
-            }
-            results.append(row)
-            logging.info(f"{sym}: trend={row['prev_trend']}, gap={row['gap_pct']:+.2f}%, opt={opt_score}, score={total_score}, scenario={scenario}")
-        except Exception as e:
-            logging.error(f"Error {sym}: {e}")
+    results = scan_watchlist(symbols, args.workers, args.expiries)
     if results:
         today = datetime.now().strftime("%Y-%m-%d")
-        os.makedirs("data", exist_ok=True)
-        out_path = f"data/premarket_{today}.json"
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-        logging.info(f"Saved to {out_path}")
+        premarket_store.append_run(today, results)
+        logging.info(f"Saved {len(results)} rows to {premarket_store.STORE_DIR}, exported {premarket_store.export()}")
         sorted_res = sorted(results, key=lambda x: x["total_score"], reverse=True)
         lines = [f"*Premarket Scan {today}*", "`Ticker  Scen  Prev  Px   Δ%    Opt  Score`"]
         for r in sorted_res:
             lines.append(f"{r['symbol']:>5}  {r['scenario']:<4}  {r['prev_trend'][:4]:>4}  {r['price']:>6.2f}  {r['gap_pct']:+5.2f}%  {r['opt_total_score']:>3}   {r['total_score']:>3}")
         send_telegram_message("\n".join(lines))
+        notifier.get_notifier().flush(notifier.FLUSH_TIMEOUT)  # 讓 Telegram 發送計入 run report
+    logging.info(yf_cache.summary())
+    instrument.finish("premarket_scan", yf_cache.stats(), {"symbols": len(symbols), "rows": len(results)})
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,216 @@
+# premarket_store.py - append-only 盤前掃描歷史（JSONL 紀錄 + (date, symbol) 索引 + 給 dashboard 的欄式匯出）
+
+import argparse
+import glob
+import json
+import os
+import re
+import logging
+import instrument
+import trading_calendar
+
+STORE_DIR = "data/premarket"
+LOG_FILE = "history.jsonl"
+INDEX_FILE = "index.json"
+EXPORT_FILE = "history.json"
+LEGACY_GLOB = "data/premarket_*.json"
+INDEX_VERSION = 1
+EXPORT_VERSION = 1
+
+_DATE_RE = re.compile(r"premarket_(\d{4}-\d{2}-\d{2})\.json$")
+_INDEX_CACHE = {}
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+
+def _path(name: str, root: str) -> str:
+    return os.path.join(root, name)
+
+
+def _empty_index() -> dict:
+    return {"version": INDEX_VERSION, "log_size": 0, "days": {}}
+
+
+def _write_json(path: str, obj, **kwargs):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with instrument.timer("json.dump"), open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, **kwargs)
+    instrument.file_bytes(tmp, "written")
+    os.replace(tmp, path)
+
+
+def _scan_log(path: str, index: dict):
+    """把 log 中 index["log_size"] 之後的紀錄補進索引（append 後索引還沒寫入就中斷時用）"""
+    days = index["days"]
+    with open(path, "rb") as f:
+        f.seek(index["log_size"])
+        offset = index["log_size"]
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # 寫到一半的最後一行：忽略，下次 append 會從完整行之後接
+            row = json.loads(line)
+            days.setdefault(row["date"], {})[row["symbol"]] = [offset, len(line)]
+            offset += len(line)
+    index["log_size"] = offset
+
+
+def load_index(root: str = STORE_DIR) -> dict:
+    """
+    {"days": {date: {symbol: [offset, length]}}}，同一 (date, symbol) 重跑時指向最新一筆。
+    以 index 檔與 log 的 mtime 快取在 process 內。
+    """
+    log_path, index_path = _path(LOG_FILE, root), _path(INDEX_FILE, root)
+    if not os.path.exists(log_path):
+        return _empty_index()
+    log_st = os.stat(log_path)
+    index_st = os.stat(index_path) if os.path.exists(index_path) else None
+    key = (log_st.st_mtime_ns, log_st.st_size, index_st and index_st.st_mtime_ns)
+    cached = _INDEX_CACHE.get(root)
+    if cached and cached[0] == key:
+        return cached[1]
+    index = _empty_index()
+    if index_st:
+        with instrument.timer("json.load"), open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        instrument.count("bytes.read", index_st.st_size)
+    if index["log_size"] != log_st.st_size:
+        if index["log_size"] > log_st.st_size:
+            index = _empty_index()
+        _scan_log(log_path, index)
+    _INDEX_CACHE[root] = (key, index)
+    return index
+
+
+def append_run(date_str: str, rows: list, root: str = STORE_DIR) -> int:
+    """寫入一次掃描結果（整批 append 到 log 後更新索引），回傳筆數"""
+    if not rows:
+        return 0
+    index = load_index(root)
+    log_path = _path(LOG_FILE, root)
+    os.makedirs(root, exist_ok=True)
+    day = index["days"].setdefault(date_str, {})
+    with open(log_path, "ab") as f:
+        f.truncate(index["log_size"])  # 丟掉上次中斷留下的半行
+        offset = index["log_size"]
+        for row in rows:
+            line = (json.dumps({"date": date_str, **row}, ensure_ascii=False) + "\n").encode("utf-8")
+            f.write(line)
+            day[row["symbol"]] = [offset, len(line)]
+            offset += len(line)
+    index["log_size"] = offset
+    _write_json(_path(INDEX_FILE, root), index, sort_keys=True)
+    _INDEX_CACHE.pop(root, None)
+    return len(rows)
+
+
+def dates(root: str = STORE_DIR) -> list:
+    return sorted(load_index(root)["days"])
+
+
+def query(start: str = None, end: str = None, symbols=None, root: str = STORE_DIR) -> list:
+    """
+    [start, end]（含頭尾，YYYY-MM-DD）內的紀錄，依 (date, symbol 寫入順序) 排列。
+    只讀索引命中的那幾行，不掃整個 log。
+    """
+    wanted = {s.upper() for s in symbols} if symbols else None
+    refs = []
+    for day, entries in load_index(root)["days"].items():
+        if (start and day < start) or (end and day > end):
+            continue
+        refs += [(day, ref) for sym, ref in entries.items() if wanted is None or sym in wanted]
+    if not refs:
+        return []
+    refs.sort(key=lambda r: (r[0], r[1][0]))
+    out = []
+    with open(_path(LOG_FILE, root), "rb") as f:
+        for _, (offset, length) in refs:
+            f.seek(offset)
+            out.append(json.loads(f.read(length)))
+    return out
+
+
+def with_outcome(rows: list) -> list:
+    """
+    補上 day_change_pct：同一 symbol 下一個交易日那次掃描的 prev_close（即這個交易日的收盤）
+    相對這次盤前價的漲跌，也就是「盤前價 → 當日收盤」的表現。
+    週末 / 假日的掃描不屬於任何交易日，本身為 None 也不拿來配對；下一個交易日沒有掃描時為 None。
+    """
+    trading = {d: trading_calendar.is_trading_day(d) for d in {r["date"] for r in rows}}
+    scans = {(r["date"], r["symbol"]): r for r in rows if trading[r["date"]]}
+    following = {d: trading_calendar.next_trading_day(d) for d, ok in trading.items() if ok}
+    for row in rows:
+        nxt = scans.get((following.get(row["date"]), row["symbol"]), {})
+        close, price = nxt.get("prev_close"), row.get("price")
+        row["day_change_pct"] = (close - price) / price * 100.0 if close and price else None
+    return rows
+
+
+def export(root: str = STORE_DIR) -> str:
+    """
+    dashboard 用的欄式匯出（含 with_outcome 算好的 day_change_pct），單日與多日檢視都讀這一個檔：
+    {"fields": [...], "dates": [...], "symbols": [...], "rows": [[date_i, symbol_i, v...], ...]}
+    """
+    rows = with_outcome(query(root=root))
+    fields, seen = [], set()
+    for row in rows:
+        for k in row:
+            if k not in ("date", "symbol") and k not in seen:
+                seen.add(k)
+                fields.append(k)
+    day_list = sorted({r["date"] for r in rows})
+    sym_list = sorted({r["symbol"] for r in rows})
+    day_i = {d: i for i, d in enumerate(day_list)}
+    sym_i = {s: i for i, s in enumerate(sym_list)}
+    packed = [[day_i[r["date"]], sym_i[r["symbol"]]] + [r.get(k) for k in fields] for r in rows]
+    out = {"version": EXPORT_VERSION, "fields": fields, "dates": day_list, "symbols": sym_list, "rows": packed}
+    path = _path(EXPORT_FILE, root)
+    _write_json(path, out, separators=(",", ":"))
+    return path
+
+
+def migrate(pattern: str = LEGACY_GLOB, root: str = STORE_DIR, remove: bool = True) -> int:
+    """把舊的 data/premarket_YYYY-MM-DD.json 依日期順序匯入；已在索引中的日期略過"""
+    known = load_index(root)["days"]
+    files = sorted(p for p in glob.glob(pattern) if _DATE_RE.search(p))
+    total = 0
+    for path in files:
+        day = _DATE_RE.search(path).group(1)
+        if day not in known:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    rows = json.load(f)
+            except Exception as e:
+                logging.warning(f"Skip unreadable {path}: {e}")
+                continue
+            total += append_run(day, rows, root)
+        if remove:
+            os.remove(path)
+    logging.info(f"Migrated {total} rows from {len(files)} files into {root}")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Premarket history store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    mig = sub.add_parser("migrate", help="Import legacy data/premarket_*.json")
+    mig.add_argument("--keep", action="store_true", help="Keep the legacy files")
+    sub.add_parser("export", help=f"Rewrite {EXPORT_FILE}")
+    q = sub.add_parser("query", help="Print rows as JSON lines")
+    q.add_argument("--start")
+    q.add_argument("--end")
+    q.add_argument("--symbols", help="Comma-separated symbols")
+    args = parser.parse_args()
+    if args.cmd == "migrate":
+        migrate(remove=not args.keep)
+        logging.info(f"Exported {export()}")
+    elif args.cmd == "export":
+        logging.info(f"Exported {export()}")
+    else:
+        symbols = args.symbols.split(",") if args.symbols else None
+        for row in query(args.start, args.end, symbols):
+            print(json.dumps(row, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -100,6 +100,90 @@ function renderPremarketResult(dateStr, rows) {
   addTableSorting("premarketTable");
 }
 
+// 盤前歷史：data/premarket/history.json（欄式匯出，day_change_pct 已由 premarket_store 算好）只載入一次，
+// 單日與多日檢視都從這份資料篩選
+const PREMARKET_HISTORY_URL = "data/premarket/history.json";
+const HISTORY_DAYS = 30;
+let premarketHistory = null;
+
+async function loadPremarketHistory() {
+  if (premarketHistory) return premarketHistory;
+  const resp = await fetch(PREMARKET_HISTORY_URL);
+  if (!resp.ok) throw new Error(`找不到資料 (${resp.status}) - ${PREMARKET_HISTORY_URL}`);
+  const data = await resp.json();
+  premarketHistory = data.rows.map((r) => {
+    const row = { date: data.dates[r[0]], symbol: data.symbols[r[1]] };
+    data.fields.forEach((f, i) => (row[f] = r[i + 2]));
+    return row;
+  });
+  return premarketHistory;
+}
+
+async function loadPremarketDay(dateStr) {
+  return (await loadPremarketHistory()).filter((r) => r.date === dateStr);
+}
+
+function shiftDate(dateStr, days) {
+  const d = new Date(dateStr + "T00:00:00Z");
+  d.setUTCDate(d.getUTCDate() + days);
+  return d.toISOString().split("T")[0];
+}
+
+function avg(values) {
+  const xs = values.filter((v) => v != null && !isNaN(v));
+  return xs.length ? xs.reduce((a, b) => a + b, 0) / xs.length : null;
+}
+
+function fmtPct(v) {
+  if (v == null) return "-";
+  const cls = v > 0 ? "trend-up" : v < 0 ? "trend-down" : "";
+  return `<span class="${cls}">${v.toFixed(2)}%</span>`;
+}
+
+// 多日盤前彙總：依情境 / 依 symbol
+function renderPremarketHistory(startStr, endStr, rows) {
+  const resultDiv = document.getElementById("result");
+  if (!resultDiv) return console.error("Missing #result");
+
+  const groupBy = (key) => {
+    const groups = {};
+    rows.forEach((r) => {
+      const k = r[key] || "N/A";
+      (groups[k] = groups[k] || []).push(r);
+    });
+    return groups;
+  };
+  const summaryRow = (label, list) => {
+    const changes = list.map((r) => r.day_change_pct).filter((v) => v != null);
+    const upRate = changes.length ? (changes.filter((v) => v > 0).length / changes.length) * 100 : null;
+    return `<tr>
+      <td>${label}</td>
+      <td>${list.length}</td>
+      <td>${fmtPct(avg(list.map((r) => r.gap_pct)))}</td>
+      <td>${(avg(list.map((r) => r.total_score)) || 0).toFixed(2)}</td>
+      <td>${fmtPct(avg(changes))}</td>
+      <td>${upRate == null ? "-" : upRate.toFixed(0) + "%"}</td>
+    </tr>`;
+  };
+  const head = (first) => `<thead><tr><th>${first}</th><th>次數</th><th>平均漲跌%</th><th>平均總分</th><th>當日表現%</th><th>上漲比例</th></tr></thead>`;
+
+  const byScenario = groupBy("scenario");
+  const bySymbol = groupBy("symbol");
+  let html = `<h3>📚 盤前歷史 (${startStr} ~ ${endStr})</h3>`;
+  html += `<table id="scenarioTable">${head("情境")}<tbody>`;
+  Object.keys(byScenario).sort().forEach((k) => (html += summaryRow(k, byScenario[k])));
+  html += `</tbody></table>`;
+  html += `<table id="symbolHistoryTable">${head("Ticker")}<tbody>`;
+  Object.keys(bySymbol).sort().forEach((k) => {
+    html += summaryRow(`<a href="chart.html?symbol=${k}" target="_blank">${k}</a>`, bySymbol[k]);
+  });
+  html += `</tbody></table>`;
+  resultDiv.innerHTML = html;
+  resultDiv.style.display = "block";
+  addTableSorting("scenarioTable");
+  addTableSorting("symbolHistoryTable");
+}
+
 // 主載入邏輯
 document.addEventListener("DOMContentLoaded", () => {
   const runBtn = document.getElementById("runBtn");
@@ -131,19 +215,20 @@ document.addEventListener("DOMContentLoaded", () => {
     }
 
     try {
-      const url = mode === "vwap"
-        ? `data/vwap_${dateStr}.json`
-        : `data/premarket_${dateStr}.json`;
-
-      const resp = await fetch(url);
-      if (!resp.ok) throw new Error(`找不到資料 (${resp.status}) - ${url}`);
-
-      const data = await resp.json();
-
       if (mode === "vwap") {
-        renderVwapResult(dateStr, data);
+        const url = `data/vwap_${dateStr}.json`;
+        const resp = await fetch(url);
+        if (!resp.ok) throw new Error(`找不到資料 (${resp.status}) - ${url}`);
+        renderVwapResult(dateStr, await resp.json());
+      } else if (mode === "premarket") {
+        const rows = await loadPremarketDay(dateStr);
+        if (!rows.length) throw new Error(`找不到 ${dateStr} 的盤前資料`);
+        renderPremarketResult(dateStr, rows);
       } else {
-        renderPremarketResult(dateStr, data);
+        const startStr = shiftDate(dateStr, -HISTORY_DAYS);
+        const rows = (await loadPremarketHistory()).filter((r) => r.date >= startStr && r.date <= dateStr);
+        if (!rows.length) throw new Error(`${startStr} ~ ${dateStr} 沒有盤前資料`);
+        renderPremarketHistory(startStr, dateStr, rows);
       }
     } catch (err) {
       console.error("載入失敗", err);
@@ -0,0 +1,63 @@
+import warnings
+import numpy as np
+import pandas as pd
+import backtest_vmap
+
+
+def test_short_loss_beyond_capital_is_finite():
+    # 做空遇到 +150%：單根淨報酬 -1.5，log1p 會是 NaN
+    ret = np.array([[0.0, 0.0, 1.5, 0.0], [0.0, 0.01, 0.01, 0.01]])
+    dev = np.full_like(ret, -0.01)
+    grid = backtest_vmap.make_grid(modes=(2,))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        results = backtest_vmap.evaluate_arrays(ret, dev, ["MU", "AMD"], grid)
+    assert np.isclose(results["return"][0], -1.5)
+    assert np.isclose(results["return"][1], (1 - 0.01) ** 3 - 1)
+    assert results["return"].notna().all()
+
+
+def test_summarize_keeps_nan_symbols():
+    results = pd.DataFrame({
+        "mode": 2, "band": [0.0, 0.0, 0.1, 0.1], "commission": 0.0, "lag": 1,
+        "symbol": ["MU", "AMD"] * 2, "return": [np.nan, 0.5, 0.1, 0.2], "trades": 1, "win_rate": 50.0,
+    })
+    summary = backtest_vmap.summarize(results)
+    assert summary["band"].tolist() == [0.1, 0.0]
+    assert np.isnan(summary["avg_return"][1])
+    assert summary["invalid"].tolist() == [0, 1]
+    assert summary["symbols"].tolist() == [2, 2]
+
+
+def make_panel(series: dict) -> dict:
+    """{symbol: (times, close, vwap)} -> load_panel 同格式的 panel"""
+    symbols = list(series)
+    times = np.unique(np.concatenate([np.asarray(t) for t, _, _ in series.values()]))
+    close = np.full((len(symbols), len(times)), np.nan)
+    vwap = np.full_like(close, np.nan)
+    present = np.zeros(close.shape, dtype=bool)
+    for i, (t, c, v) in enumerate(series.values()):
+        pos = np.searchsorted(times, t)
+        close[i, pos], vwap[i, pos], present[i, pos] = c, v, True
+    return {"symbols": symbols, "times": times, "close": close, "vwap": vwap, "present": present}
+
+
+def test_symbol_results_do_not_depend_on_panel():
+    rng = np.random.default_rng(7)
+    t_mu = 300 * np.delete(np.arange(40), [5, 6, 20])         # 自己也有缺 bar
+    t_amd = 150 + 300 * np.arange(0, 60, 2)                   # 與 MU 完全錯開、頻率不同
+    mu = (t_mu, 50 * np.cumprod(1 + rng.normal(0, 0.01, len(t_mu))), np.full(len(t_mu), 50.0))
+    amd = (t_amd, 100 * np.cumprod(1 + rng.normal(0, 0.01, len(t_amd))), np.full(len(t_amd), 100.0))
+    amd[2][:3] = np.nan                                       # 時段外沒有 vwap
+    grid = backtest_vmap.make_grid(modes=(1, 2), bands=(0.0, 0.5), commissions=(0.0, 0.001), lags=(1, 2))
+
+    alone = backtest_vmap.evaluate(make_panel({"MU": mu}), grid)
+    mixed = backtest_vmap.evaluate(make_panel({"AMD": amd, "MU": mu}), grid)
+    parallel = backtest_vmap.evaluate_parallel(make_panel({"AMD": amd, "MU": mu}), grid, processes=2)
+    keys = ["mode", "band", "commission", "lag"]
+    for panel_results in (mixed, parallel):
+        merged = alone.merge(panel_results[panel_results["symbol"] == "MU"], on=keys + ["symbol"])
+        assert len(merged) == len(alone) == len(grid)
+        for col in ("return", "trades", "win_rate"):
+            np.testing.assert_allclose(merged[f"{col}_x"], merged[f"{col}_y"], rtol=1e-12, err_msg=col)
+    assert (alone["trades"] > 0).any()
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+import bar_codec
+import bar_store
+from benchmarks.bench_codec import round_trip_ok
+from trading_calendar import MARKET_TZ
+
+COMPRESSIONS = [
+    None, "gzip",
+    pytest.param("zstd", marks=pytest.mark.skipif(bar_codec.zstandard is None, reason="zstandard not installed")),
+]
+OPEN = 1770129000  # 2026-02-03 09:30 ET
+
+
+def make_bars(times, closes, volumes=None, vwaps=None) -> np.ndarray:
+    bars = np.zeros(len(times), dtype=bar_store.BAR_DTYPE)
+    bars["time"] = times
+    bars["close"] = closes
+    bars["open"] = np.asarray(closes) - 0.013
+    bars["high"] = np.asarray(closes) + 0.255
+    bars["low"] = np.asarray(closes) - 0.5049
+    bars["volume"] = volumes if volumes is not None else 1000
+    bars["vwap"] = vwaps if vwaps is not None else closes
+    return bars
+
+
+def assert_round_trip(bars: np.ndarray, back: np.ndarray):
+    assert back.dtype == bar_store.BAR_DTYPE
+    assert len(back) == len(bars)
+    for name in bar_store.BAR_DTYPE.names:
+        expected = np.round(bars[name], 2) if name in bar_store.PRICE_FIELDS else bars[name]
+        np.testing.assert_array_equal(back[name], expected, err_msg=name)
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_empty_day(compression, tmp_path):
+    bars = np.empty(0, dtype=bar_store.BAR_DTYPE)
+    assert round_trip_ok(bars, compression)
+    path = str(tmp_path / f"empty{bar_codec.EXTENSIONS[compression]}")
+    bar_codec.write(path, bars, compression)
+    assert_round_trip(bars, bar_codec.read(path))
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_zero_volume_and_missing_vwap(compression):
+    bars = make_bars(OPEN + 300 * np.arange(6), [10.0, 10.01, 10.01, 10.01, 9.5, 9.52],
+                     volumes=[0, 5, 0, 0, 2**40, 0], vwaps=[np.nan, 10.0, 10.0, np.nan, 9.87654, np.nan])
+    back = bar_codec.decode(bar_codec.compress(bar_codec.encode(bars), compression))
+    assert_round_trip(bars, back)
+    assert np.isnan(back["vwap"][[0, 3, 5]]).all()
+    assert round_trip_ok(bars, compression)
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_nan_volume_from_frame(compression):
+    index = pd.DatetimeIndex(pd.to_datetime(OPEN + 300 * np.arange(4), unit="s", utc=True)).tz_convert(MARKET_TZ)
+    df = pd.DataFrame({"open": [10.0, 10.1, 10.2, np.nan], "high": [10.2, 10.3, 10.4, 10.5],
+                       "low": [9.9, 10.0, 10.1, 10.2], "close": [10.1, 10.2, 10.3, 10.4],
+                       "volume": [100.0, np.nan, 0.0, 50.0]}, index=index)
+    bars = bar_store.frame_to_bars(df)
+    assert bars["volume"].tolist() == [100, 0, 0]
+    assert_round_trip(bars, bar_codec.decode(bar_codec.compress(bar_codec.encode(bars), compression)))
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_non_monotonic_and_duplicate_timestamps(compression):
+    # 順序原樣保留：時間差分可為負數或 0
+    times = OPEN + np.array([600, 0, 300, 300, -86400 * 3, 86400 * 365])
+    bars = make_bars(times, [412.37, 11.05, 433.48, 433.49, 0.01, 99999.99])
+    assert_round_trip(bars, bar_codec.decode(bar_codec.compress(bar_codec.encode(bars), compression)))
+    assert round_trip_ok(bars, compression)
+
+
+def test_single_bar_and_decimals():
+    bars = make_bars([OPEN], [123.456789])
+    back = bar_codec.decode(bar_codec.encode(bars, decimals=4))
+    assert back["close"][0] == 123.4568
+    assert back["time"][0] == OPEN
+
+
+def test_gzip_output_is_deterministic():
+    bars = make_bars(OPEN + 300 * np.arange(50), np.linspace(10, 11, 50))
+    assert bar_codec.compress(bar_codec.encode(bars), "gzip") == bar_codec.compress(bar_codec.encode(bars), "gzip")
+
+
+def test_rejects_foreign_payload():
+    with pytest.raises(ValueError):
+        bar_codec.decode(b"NOPE" + bytes(bar_codec.HEADER.size))
+    with pytest.raises(ValueError):
+        bar_codec.compress(b"", "lz4")
+
+
+@pytest.mark.skipif(bar_codec.zstandard is not None, reason="zstandard installed")
+def test_zstd_without_package():
+    with pytest.raises(RuntimeError):
+        bar_codec.compress(bar_codec.encode(make_bars([OPEN], [1.0])), "zstd")
+    with pytest.raises(RuntimeError):
+        bar_codec.decompress(bar_codec.ZSTD_MAGIC + b"\x00" * 8)
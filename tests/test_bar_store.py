@@ -0,0 +1,50 @@
+import json
+import numpy as np
+import bar_store
+
+OPEN_0202 = 1770042600  # 2026-02-02 09:30 ET
+OPEN_0203 = 1770129000  # 2026-02-03 09:30 ET
+
+
+def make_bars(start: int, n: int, base: float = 100.0) -> np.ndarray:
+    bars = np.zeros(n, dtype=bar_store.BAR_DTYPE)
+    bars["time"] = start + 300 * np.arange(n)
+    bars["open"] = bars["high"] = bars["low"] = bars["close"] = base + np.arange(n) * 0.01
+    bars["volume"] = 1000
+    bars["vwap"] = bars["close"]
+    return bars
+
+
+def test_imported_export_is_appended_not_rewritten(tmp_path, monkeypatch):
+    export_dir = str(tmp_path / "intraday")
+    old_root, new_root = str(tmp_path / "old"), str(tmp_path / "new")
+    bar_store.append_bars("AMD", make_bars(OPEN_0202, 20), old_root)
+    path = bar_store.export_json("AMD", root=old_root, export_dir=export_dir)
+
+    # store 沒保留（例如 CI）：由 JSON 重建後，匯出狀態要跟著建立
+    bar_store.ensure_store("AMD", new_root, export_dir)
+    state = bar_store.load_manifest("AMD", new_root)["export"]
+    assert state == {"rows": 20, "last_time": int(OPEN_0202 + 300 * 19), "size": len(open(path, "rb").read())}
+
+    rewrites = []
+    real = bar_store._write_export
+    monkeypatch.setattr(bar_store, "_write_export", lambda *a: rewrites.append(a) or real(*a))
+    new = make_bars(OPEN_0203, 5, 101.0)
+    bar_store.append_bars("AMD", new, new_root)
+    bar_store.export_intraday("AMD", new_bars=new, force=True, root=new_root, export_dir=export_dir)
+    assert rewrites == []
+    with open(path, "r", encoding="utf-8") as f:
+        assert [r["time"] for r in json.load(f)] == bar_store.load_bars("AMD", root=new_root)["time"].tolist()
+
+
+def test_legacy_json_is_rewritten_once(tmp_path):
+    export_dir = tmp_path / "intraday"
+    export_dir.mkdir()
+    rows = [{name: b[name].item() for name in bar_store.BAR_DTYPE.names} for b in make_bars(OPEN_0202, 5)]
+    (export_dir / "intraday_AMD.json").write_text(json.dumps(rows, indent=2), encoding="utf-8")
+    root = str(tmp_path / "store")
+
+    bar_store.ensure_store("AMD", root, str(export_dir))
+    assert bar_store.load_manifest("AMD", root)["export"] is None  # 舊格式無法在檔尾 append
+    bar_store.export_intraday("AMD", force=True, root=root, export_dir=str(export_dir))
+    assert bar_store.load_manifest("AMD", root)["export"]["rows"] == 5
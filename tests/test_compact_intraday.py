@@ -0,0 +1,74 @@
+import io
+import json
+import os
+import numpy as np
+import pytest
+import bar_store
+import compact_intraday
+
+OPEN_0129 = 1769697000  # 2026-01-29 09:30 ET
+OPEN_0203 = 1770129000  # 2026-02-03 09:30 ET
+
+
+def write_bars(path: str, start: int, closes, volume: int = 1000):
+    rows = [{"time": start + i * 300, "open": c, "high": c + 0.1, "low": c - 0.1, "close": c, "volume": volume,
+             "vwap": c} for i, c in enumerate(closes)]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rows, f)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(bar_store.EXPORT_DIR)
+    return tmp_path
+
+
+def daily(symbol: str, day: str) -> str:
+    return os.path.join(bar_store.EXPORT_DIR, f"intraday_{symbol}_{day}.json")
+
+
+def test_mislabeled_day_is_quarantined(workdir):
+    # 01-29 檔是 ONDS；標成 02-01 的檔其實是同一天的 MU
+    write_bars(daily("ONDS", "2026-01-29"), OPEN_0129, np.linspace(11.0, 11.5, 10))
+    write_bars(daily("ONDS", "2026-02-01"), OPEN_0129, np.linspace(430.0, 433.0, 10), volume=5000)
+    write_bars(daily("ONDS", "2026-02-03"), OPEN_0203, np.linspace(11.0, 11.2, 10))
+    report = io.StringIO()
+
+    stats = compact_intraday.compact_symbol("ONDS", report=report)
+
+    assert stats["quarantined"] == ["2026-01-29"]
+    assert stats["removed"] == 0
+    assert all(os.path.exists(daily("ONDS", d)) for d in ("2026-01-29", "2026-02-01", "2026-02-03"))
+    assert bar_store.list_days("ONDS") == ["2026-02-03"]
+    assert bar_store.load_bars("ONDS")["close"].max() < 12
+    lines = [json.loads(line) for line in report.getvalue().splitlines()]
+    assert lines == [{"symbol": "ONDS", "date": "2026-01-29", "quarantined": True, "bars": 10, "conflicts": 10,
+                      "files": ["intraday_ONDS_2026-01-29.json", "intraday_ONDS_2026-02-01.json"]}]
+
+
+def test_conflicts_resolved_per_file_not_per_bar(workdir):
+    # 累加檔只有 4 根、成交量較大且價格不同：逐根取最大量會混進兩個來源，整檔取捨只用較完整的每日檔
+    write_bars(bar_store.export_path("AMD"), OPEN_0203, [20.0, 20.1, 20.2, 20.3], volume=9000)
+    closes = np.round(np.linspace(10.0, 10.9, 10), 2)
+    write_bars(daily("AMD", "2026-02-03"), OPEN_0203, closes)
+
+    stats = compact_intraday.compact_symbol("AMD")
+
+    bars = bar_store.load_bars("AMD")
+    np.testing.assert_array_equal(bars["close"], closes)
+    assert stats["conflicts"] == 4
+    assert stats["quarantined"] == []
+    assert stats["removed"] == 0 and os.path.exists(daily("AMD", "2026-02-03"))
+
+
+def test_clean_merge_removes_daily_files(workdir):
+    write_bars(bar_store.export_path("AAPL"), OPEN_0203, [269.0, 269.5, 270.0])
+    write_bars(daily("AAPL", "2026-02-03"), OPEN_0203, [269.0, 269.5, 270.0, 270.5])
+
+    stats = compact_intraday.compact_symbol("AAPL")
+
+    assert stats["conflicts"] == 0 and stats["removed"] == 1
+    assert not os.path.exists(daily("AAPL", "2026-02-03"))
+    with open(bar_store.export_path("AAPL"), "r", encoding="utf-8") as f:
+        assert [r["close"] for r in json.load(f)] == [269.0, 269.5, 270.0, 270.5]
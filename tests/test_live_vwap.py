@@ -0,0 +1,154 @@
+import json
+import os
+import numpy as np
+import pytest
+import bar_store
+import chart_tiles
+import live_vwap
+import vwap_engine
+
+SESSION = "2026-10-16"
+SYMBOLS = ["AMD", "NVDA"]
+STEP = 300
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return {"live_dir": str(tmp_path / "live"), "store_root": str(tmp_path / "store"),
+            "export_dir": str(tmp_path / "intraday"), "tile_root": str(tmp_path / "tiles")}
+
+
+def make_monitor(dirs, source, **kwargs):
+    return live_vwap.LiveMonitor(SYMBOLS, source, "5m", deviations=(0.5, 1.0), **dirs, **kwargs)
+
+
+def count_exports(monkeypatch) -> list:
+    calls = []
+    real = bar_store.export_intraday
+
+    def export(symbol, *args, **kwargs):
+        calls.append(symbol)
+        return real(symbol, *args, **kwargs)
+
+    monkeypatch.setattr(bar_store, "export_intraday", export)
+    return calls
+
+
+def expected_crosses(bars: np.ndarray) -> list:
+    """獨立於 LiveMonitor 的參考：正規時段內 close 相對 VWAP 的正負號改變處"""
+    side, out = 0, []
+    for t, c, w in zip(bars["time"], bars["close"], bars["vwap"]):
+        if np.isnan(w):
+            continue
+        s = 1 if c > w else -1 if c < w else side
+        if side and s != side:
+            out.append((int(t), "cross_above" if s > 0 else "cross_below"))
+        side = s
+    return out
+
+
+def test_poll_appends_bars_vwap_and_events(dirs, monkeypatch):
+    exports = count_exports(monkeypatch)
+    received = []
+    source = live_vwap.FakeSource(SESSION, start="09:30", volatility=0.006)
+    monitor = make_monitor(dirs, source, on_event=received.extend, export_every=1800)
+
+    polls = monitor.run(poll_seconds=STEP, max_polls=24)
+
+    assert polls == 24
+    for sym in SYMBOLS:
+        bars = bar_store.load_bars(sym, root=dirs["store_root"])
+        # 每次輪詢只 append 已收完的新 bar：不重複、不缺
+        assert len(bars) == polls - 1
+        assert (np.diff(bars["time"]) == STEP).all()
+        assert bars["time"][-1] + STEP <= source.now()
+        # 串流 VWAP 與整段向量化計算相同
+        np.testing.assert_allclose(bars["vwap"], vwap_engine.session_vwap(
+            bars["time"], bars["high"], bars["low"], bars["close"], bars["volume"]), rtol=1e-12)
+
+        events = [e for e in monitor.events if e["symbol"] == sym]
+        crosses = [(e["time"], e["type"]) for e in events if e["type"] != "deviation"]
+        assert crosses == expected_crosses(bars)
+        for e in events:
+            if e["type"] == "deviation":
+                assert e["level"] in (0.5, 1.0, -0.5, -1.0) and abs(e["deviation_pct"]) >= abs(e["level"])
+                assert np.sign(e["deviation_pct"]) == np.sign(e["level"])
+
+    assert any(e["type"] == "deviation" for e in monitor.events)
+    assert any(e["type"].startswith("cross") for e in monitor.events)
+    assert received == list(monitor.events)
+    with open(os.path.join(dirs["live_dir"], live_vwap.EVENTS_FILE), "r", encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == received
+
+    # 匯出 / tile 整批更新：24 次輪詢每 30 分鐘一次 + 結束時一次，而不是每次輪詢
+    assert 2 <= exports.count("AMD") <= 5
+    for sym in SYMBOLS:
+        bars = bar_store.load_bars(sym, root=dirs["store_root"])
+        with open(bar_store.export_path(sym, dirs["export_dir"]), "r", encoding="utf-8") as f:
+            assert [r["time"] for r in json.load(f)] == bars["time"].tolist()
+        assert chart_tiles.load_manifest(sym, dirs["tile_root"])["last"] == int(bars["time"][-1])
+
+
+def test_restart_resumes_stream(dirs):
+    source = live_vwap.FakeSource(SESSION, start="09:30")
+    first = make_monitor(dirs, source)
+    first.run(poll_seconds=STEP, max_polls=10)
+    saved = {sym: st.engine.state() for sym, st in first.states.items()}
+
+    # 同一個時鐘接著跑：由 state.json 接續，不重播
+    second = make_monitor(dirs, source)
+    assert {sym: st.engine.state() for sym, st in second.states.items()} == saved
+    second.run(poll_seconds=STEP, max_polls=10)
+
+    # state.json 遺失：重播 store 裡當天的 bar，結果相同
+    os.remove(os.path.join(dirs["live_dir"], live_vwap.STATE_FILE))
+    third = make_monitor(dirs, source)
+    for sym in SYMBOLS:
+        assert third.states[sym].engine.cum_v == pytest.approx(second.states[sym].engine.cum_v)
+        bars = bar_store.load_bars(sym, root=dirs["store_root"])
+        # run() 最後一次輪詢後不 sleep：兩段各 9 根，接縫處不重複也不缺
+        assert len(bars) == 18 and (np.diff(bars["time"]) == STEP).all()
+        np.testing.assert_allclose(bars["vwap"], vwap_engine.session_vwap(
+            bars["time"], bars["high"], bars["low"], bars["close"], bars["volume"]), rtol=1e-12)
+
+
+def test_interrupted_run_catches_up_exports(dirs):
+    source = live_vwap.FakeSource(SESSION, start="09:30")
+    monitor = make_monitor(dirs, source, export_every=10**9)
+    for _ in range(6):
+        monitor.poll()
+        source.sleep(STEP)
+    assert not os.path.exists(bar_store.export_path("AMD", dirs["export_dir"]))  # 中斷：尚未 flush
+
+    restarted = make_monitor(dirs, source)
+    restarted.flush()
+    with open(bar_store.export_path("AMD", dirs["export_dir"]), "r", encoding="utf-8") as f:
+        assert len(json.load(f)) == 5
+    assert chart_tiles.load_manifest("AMD", dirs["tile_root"])["last"] is not None
+
+
+def test_fake_mode_writes_nothing(dirs):
+    source = live_vwap.FakeSource(SESSION, start="09:30")
+    monitor = make_monitor(dirs, source, persist=False)
+    monitor.run(poll_seconds=STEP, max_polls=5)
+    assert monitor.states["AMD"].last_time is not None
+    assert not any(os.path.exists(d) for d in dirs.values())
+
+
+def test_holiday_is_not_polled(dirs):
+    source = live_vwap.FakeSource("2026-11-26", start="09:30")  # Thanksgiving
+    monitor = make_monitor(dirs, source)
+    assert monitor.run(poll_seconds=STEP) == 0
+    assert source.now() == live_vwap.FakeSource("2026-11-26", start="09:30").now()
+    assert not any(os.path.exists(d) for d in dirs.values())
+
+
+def test_early_close_ends_extended_hours_early(dirs):
+    source = live_vwap.FakeSource("2026-11-27", start="16:30")  # 感恩節隔天 13:00 收盤，盤後到 17:00
+    monitor = make_monitor(dirs, source)
+    polls = monitor.run(poll_seconds=STEP)
+    assert polls == 7  # 16:30 ~ 17:00，而不是一路到 20:00
+    assert source.now() == live_vwap.session_end(source.now())
+    bars = bar_store.load_bars("AMD", root=dirs["store_root"])
+    assert len(bars) == polls - 1 and bars["time"][-1] < source.now()
@@ -0,0 +1,143 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import notifier
+
+
+class StubTelegram(ThreadingHTTPServer):
+    """本地 Telegram stub：記錄每個 request，依 responses 佇列回應（用完後一律 200）"""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.requests = []
+        self.responses = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def texts(self) -> list:
+        return [r["body"]["text"] for r in self.requests]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server.gate.wait()
+        server.requests.append({"path": self.path, "body": body, "at": time.monotonic()})
+        status, payload, headers = server.responses.pop(0) if server.responses else (200, {"ok": True}, {})
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = StubTelegram()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.gate.set()
+    server.shutdown()
+    server.server_close()
+
+
+def make_notifier(stub, **kwargs) -> notifier.TelegramNotifier:
+    kwargs = {"coalesce_seconds": 0.2, "backoff": 0.01, **kwargs}
+    return notifier.TelegramNotifier("T", "C", stub.url, **kwargs)
+
+
+def test_alerts_are_coalesced(stub):
+    n = make_notifier(stub, max_length=300)
+    alerts = [f"alert {i:03d} AMD cross_above" for i in range(200)]
+    for text in alerts:
+        assert n.send(text)
+    assert n.flush(10)
+    n.close()
+
+    texts = stub.texts()
+    assert len(texts) < len(alerts) / 5
+    assert all(len(t) <= 300 for t in texts)
+    assert notifier.SEPARATOR.join(texts).split(notifier.SEPARATOR) == alerts
+    assert all(r["path"] == "/botT/sendMessage" and r["body"]["chat_id"] == "C" for r in stub.requests)
+    assert n.stats["queued"] == 200 and n.stats["messages"] == len(texts) and n.stats["failed"] == 0
+
+
+def test_parse_modes_are_not_merged(stub):
+    n = make_notifier(stub)
+    n.send("*bold*")
+    n.send("plain_text", parse_mode="")
+    n.send("*again*")
+    assert n.flush(10)
+    n.close()
+    bodies = [r["body"] for r in stub.requests]
+    assert [(b["text"], b.get("parse_mode")) for b in bodies] == [
+        ("*bold*", "Markdown"), ("plain_text", None), ("*again*", "Markdown")]
+
+
+@pytest.mark.parametrize("payload, headers", [
+    ({"ok": False, "error_code": 429, "parameters": {"retry_after": 1}}, {}),
+    ({"ok": False, "error_code": 429}, {"Retry-After": "1"}),
+])
+def test_429_waits_retry_after(stub, payload, headers):
+    stub.responses = [(429, payload, headers)]
+    n = make_notifier(stub, backoff=5.0)  # 退避時間很長：若沒用 retry_after 這裡會等 5 秒
+    n.send("hello")
+    assert n.flush(10)
+    n.close()
+
+    first, second = stub.requests
+    assert 0.9 <= second["at"] - first["at"] < 3.0
+    assert second["body"]["text"] == "hello"
+    assert n.stats["rate_limited"] == 1 and n.stats["retries"] == 1 and n.stats["messages"] == 1
+
+
+def test_server_errors_back_off_and_client_errors_drop(stub):
+    stub.responses = [(500, {"ok": False}, {}), (502, {"ok": False}, {}),
+                      (200, {"ok": True}, {}), (400, {"ok": False, "description": "bad"}, {})]
+    n = make_notifier(stub, coalesce_seconds=0)
+    n.send("first")
+    assert n.flush(10)
+    n.send("second")
+    assert n.flush(10)
+    n.close()
+    assert stub.texts() == ["first", "first", "first", "second"]
+    assert n.stats["retries"] == 2 and n.stats["messages"] == 1 and n.stats["failed"] == 1
+
+
+def test_flush_timeout(stub):
+    stub.gate.clear()  # server 卡住不回應
+    n = make_notifier(stub, coalesce_seconds=0)
+    n.send("stuck")
+    started = time.monotonic()
+    assert n.flush(0.3) is False
+    assert time.monotonic() - started < 1.0
+
+    stub.gate.set()
+    assert n.flush(10)
+    n.close()
+    assert stub.texts() == ["stuck"]
+
+
+def test_disabled_and_closed(stub):
+    assert not notifier.TelegramNotifier("", "C", stub.url).send("x")
+    n = make_notifier(stub)
+    n.close()
+    assert not n.send("after close")
+    assert n.flush(0.1)
+    assert stub.requests == []
@@ -0,0 +1,44 @@
+import json
+import os
+import premarket_store
+
+
+def load_export(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {(data["dates"][r[0]], data["symbols"][r[1]]): dict(zip(data["fields"], r[2:])) for r in data["rows"]}
+
+
+def test_export_outcome(tmp_path):
+    root = str(tmp_path)
+    premarket_store.append_run("2026-03-02", [{"symbol": "AMD", "price": 100.0, "prev_close": 98.0},
+                                              {"symbol": "MU", "price": 50.0, "prev_close": 49.0}], root)
+    premarket_store.append_run("2026-03-03", [{"symbol": "AMD", "price": 105.0, "prev_close": 104.0}], root)
+
+    rows = load_export(premarket_store.export(root))
+
+    assert rows[("2026-03-02", "AMD")]["day_change_pct"] == 4.0
+    assert rows[("2026-03-02", "MU")]["day_change_pct"] is None
+    assert rows[("2026-03-03", "AMD")]["day_change_pct"] is None
+    assert rows[("2026-03-03", "AMD")]["price"] == 105.0
+    assert set(os.listdir(root)) == {premarket_store.EXPORT_FILE, premarket_store.INDEX_FILE,
+                                     premarket_store.LOG_FILE}  # 沒有另外的單日切片
+
+
+def test_outcome_pairs_next_trading_day_only(tmp_path):
+    root = str(tmp_path)
+    # 週五 → 週六（非交易日）→ 週一；04-02 週四 → 04-03 Good Friday 休市 → 04-06 週一；03-10 → 03-12 中間缺一天
+    for day, price, prev_close in [("2026-03-06", 100.0, 99.0), ("2026-03-07", 103.0, 102.0),
+                                   ("2026-03-09", 104.0, 102.0), ("2026-03-10", 110.0, 105.0),
+                                   ("2026-03-12", 120.0, 115.0), ("2026-04-02", 50.0, 49.0),
+                                   ("2026-04-06", 52.0, 51.0)]:
+        premarket_store.append_run(day, [{"symbol": "AMD", "price": price, "prev_close": prev_close}], root)
+
+    rows = load_export(premarket_store.export(root))
+    pct = {day: rows[(day, "AMD")]["day_change_pct"] for day, _ in rows}
+
+    assert pct["2026-03-06"] == 2.0                      # 配對週一，不是週六
+    assert pct["2026-03-07"] is None                     # 週末的掃描本身沒有當日表現
+    assert pct["2026-03-09"] == (105.0 - 104.0) / 104.0 * 100.0
+    assert pct["2026-03-10"] is None                     # 03-11 沒有掃描：03-12 的 prev_close 是 03-11 的收盤
+    assert pct["2026-04-02"] == 2.0                      # 跳過假日
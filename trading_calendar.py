@@ -0,0 +1,177 @@
+# trading_calendar.py - 規則式 NYSE 交易日曆（週末、假日、提早收盤），免網路判斷交易日
+
+import json
+import os
+import logging
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+CACHE_PATH = "data/trading_calendar.json"
+MARKET_TZ = ZoneInfo("America/New_York")
+REGULAR_OPEN = time(9, 30)
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+EARLY_EXTENDED_CLOSE = time(17, 0)  # 提早收盤日盤後也提早結束
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+_YEARS = {}
+
+
+def _to_date(d) -> date:
+    if isinstance(d, datetime):
+        return d.date()
+    if isinstance(d, date):
+        return d
+    return datetime.strptime(str(d), "%Y-%m-%d").date()
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """該月第 n 個 weekday（n=-1 為最後一個）"""
+    if n > 0:
+        d = date(year, month, 1)
+        d += timedelta(days=(weekday - d.weekday()) % 7)
+        return d + timedelta(weeks=n - 1)
+    d = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return d - timedelta(days=(d.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> date:
+    # Anonymous Gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _observed(d: date) -> date:
+    """週六假日改週五休、週日改週一休"""
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+
+def _build_year(year: int) -> dict:
+    holidays = []
+    # 元旦落在週六時 NYSE 不在前一年 12/31 補休
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.append(_observed(new_year))
+    holidays += [
+        _nth_weekday(year, 1, 0, 3),       # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),       # Washington's Birthday
+        _easter(year) - timedelta(days=2), # Good Friday
+        _nth_weekday(year, 5, 0, -1),      # Memorial Day
+    ]
+    if year >= 2022:
+        holidays.append(_observed(date(year, 6, 19)))  # Juneteenth
+    holidays += [
+        _observed(date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),       # Labor Day
+        _nth_weekday(year, 11, 3, 4),      # Thanksgiving
+        _observed(date(year, 12, 25)),
+    ]
+
+    early = [
+        date(year, 7, 3),
+        _nth_weekday(year, 11, 3, 4) + timedelta(days=1),  # 感恩節隔天
+        date(year, 12, 24),
+    ]
+    early = [d for d in early if d.weekday() < 5 and d not in holidays]
+    return {
+        "holidays": sorted(d.isoformat() for d in holidays),
+        "early_closes": sorted(d.isoformat() for d in early),
+    }
+
+
+def _load_cache(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logging.warning(f"Trading calendar cache unreadable {path}: {e}")
+        return {}
+
+
+def _year(year: int, path: str = CACHE_PATH) -> dict:
+    """
+    取得某年的假日 / 提早收盤表。先查記憶體，再查 cache 檔（可手動加入臨時休市日），
+    都沒有才用規則計算並寫回 cache。
+    """
+    key = (path, year)
+    if key in _YEARS:
+        return _YEARS[key]
+    cache = _load_cache(path)
+    entry = cache.get(str(year))
+    if entry is None:
+        entry = _build_year(year)
+        cache[str(year)] = entry
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(cache, f, indent=2, sort_keys=True)
+            os.replace(tmp, path)
+        except OSError as e:
+            logging.warning(f"Trading calendar cache not saved {path}: {e}")
+    _YEARS[key] = {"holidays": set(entry["holidays"]), "early_closes": set(entry["early_closes"])}
+    return _YEARS[key]
+
+
+def is_holiday(d, path: str = CACHE_PATH) -> bool:
+    d = _to_date(d)
+    return d.isoformat() in _year(d.year, path)["holidays"]
+
+
+def is_trading_day(d, path: str = CACHE_PATH) -> bool:
+    d = _to_date(d)
+    return d.weekday() < 5 and not is_holiday(d, path)
+
+
+def is_early_close(d, path: str = CACHE_PATH) -> bool:
+    d = _to_date(d)
+    return d.isoformat() in _year(d.year, path)["early_closes"]
+
+
+def session_close(d, path: str = CACHE_PATH) -> time:
+    return EARLY_CLOSE if is_early_close(d, path) else REGULAR_CLOSE
+
+
+def previous_trading_days(d, n: int, include: bool = True, path: str = CACHE_PATH) -> list:
+    """從 d 往回（include=True 時含 d 本身）最近的 n 個交易日，新到舊，YYYY-MM-DD 字串"""
+    d = _to_date(d)
+    if not include:
+        d -= timedelta(days=1)
+    out = []
+    while len(out) < n:
+        if is_trading_day(d, path):
+            out.append(d.isoformat())
+        d -= timedelta(days=1)
+    return out
+
+
+def trading_days_back(d, max_back: int, include: bool = True, path: str = CACHE_PATH) -> list:
+    """d 往回 max_back 個日曆天內（含頭尾）的交易日，新到舊；給回溯迴圈用"""
+    d = _to_date(d)
+    first = 0 if include else 1
+    days = [d - timedelta(days=i) for i in range(first, max_back + 1)]
+    return [x.isoformat() for x in days if is_trading_day(x, path)]
+
+
+def next_trading_day(d, path: str = CACHE_PATH) -> str:
+    """d 之後（不含 d）的第一個交易日，YYYY-MM-DD 字串"""
+    d = _to_date(d) + timedelta(days=1)
+    while not is_trading_day(d, path):
+        d += timedelta(days=1)
+    return d.isoformat()
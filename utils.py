@@ -1,37 +1,45 @@
 # utils.py
-import os
-import requests
 import logging
+import numpy as np
 import pandas as pd
-import yfinance as yf
+import bar_store
+import chart_tiles
+import instrument
+import market_data
+import notifier
+import trading_calendar
+import vwap_engine
 from datetime import datetime, timedelta
 
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
-TG_BOT_TOKEN = os.getenv("TG_BOT_TOKEN")
-TG_CHAT_ID = os.getenv("TG_CHAT_ID")
+def send_telegram_message(text: str, parse_mode: str = "Markdown") -> bool:
+    """交給 notifier 的背景佇列發送，立即回傳（是否成功排入佇列）"""
+    return notifier.notify(text, parse_mode)
 
-def send_telegram_message(text: str, parse_mode: str = "Markdown"):
-    if not TG_BOT_TOKEN or not TG_CHAT_ID:
-        logging.warning("Telegram env not set, skip sending.")
-        return
-    url = f"https://api.telegram.org/bot{TG_BOT_TOKEN}/sendMessage"
-    payload = {"chat_id": TG_CHAT_ID, "text": text, "parse_mode": parse_mode, "disable_web_page_preview": True}
-    try:
-        resp = requests.post(url, json=payload, timeout=10)
-        if resp.status_code != 200:
-            logging.warning(f"Telegram send failed: {resp.text}")
-        else:
-            logging.info("Telegram sent.")
-    except Exception as e:
-        logging.warning(f"Telegram exception: {e}")
+def _price_level(columns: pd.MultiIndex):
+    for level in range(columns.nlevels):
+        values = {str(v).lower().strip() for v in columns.get_level_values(level)}
+        if "close" in values or "adj close" in values:
+            return level
+    return 0
 
+@instrument.timed()
 def normalize_dataframe(df: pd.DataFrame, symbol: str = None):
     if isinstance(df.columns, pd.MultiIndex):
-        if symbol:
-            df.columns = [col[0] for col in df.columns.get_level_values(0)]  # 取 Price Type
+        price_level = _price_level(df.columns)
+        ticker_level = 1 - price_level if df.columns.nlevels == 2 else None
+        if symbol and ticker_level is not None:
+            # 批次下載的 frame 同時含多檔：只取該 symbol，並去掉 outer join 補出來的空列
+            tickers = df.columns.get_level_values(ticker_level)
+            if symbol not in set(tickers):
+                return None, f"Symbol {symbol} not in frame"
+            df = df.xs(symbol, axis=1, level=ticker_level).dropna(how="all")
         else:
-            df.columns = df.columns.get_level_values(0)
+            df = df.copy()
+            df.columns = df.columns.get_level_values(price_level)
+    else:
+        df = df.copy()
     df.columns = [str(c).lower().strip() for c in df.columns]
     if "close" not in df.columns and "adj close" in df.columns:
         df = df.rename(columns={"adj close": "close"})
@@ -41,80 +49,76 @@ def normalize_dataframe(df: pd.DataFrame, symbol: str = None):
         return None, f"Missing columns: {missing}"
     return df[required], None
 
-def get_last_trading_day_vwap(symbol: str, interval: str = "5m", max_days: int = 7):
+def _vwap_summary(df_norm: pd.DataFrame):
+    """當日正規時段 session VWAP（vwap_engine）與收盤價"""
+    vwap_series = vwap_engine.frame_vwap(df_norm, vwap_engine.REGULAR)
+    valid = ~np.isnan(vwap_series)
+    if not valid.any() or float(df_norm["volume"].to_numpy()[valid].sum()) == 0:
+        return None
+    vwap = float(vwap_series[valid][-1])
+    close = float(df_norm["close"].to_numpy()[valid][-1])
+    pct = (close - vwap) / vwap * 100.0
+    return close, vwap, pct
+
+def get_last_trading_day_vwap(symbol: str, interval: str = "5m", max_days: int = 7, days: dict = None):
+    """days 為 market_data.download_days 切好的 {date: df}；沒給時整個回溯區間只抓一次"""
     date = datetime.now().date()
-    for i in range(1, max_days + 1):
-        target_date = date - timedelta(days=i)
-        start_str = target_date.strftime("%Y-%m-%d")
-        end_str = (target_date + timedelta(days=1)).strftime("%Y-%m-%d")
+    if days is None:
         try:
-            df = yf.download(symbol, interval=interval, start=start_str, end=end_str, progress=False)
-            if df.empty or len(df) < 10:
+            days = market_data.download_days([symbol], date - timedelta(days=max_days), date, interval).get(symbol, {})
+        except Exception as e:
+            logging.warning(f"VWAP download error for {symbol}: {e}")
+            return None
+    for start_str in trading_calendar.trading_days_back(date, max_days, include=False):
+        try:
+            df_norm = days.get(start_str)
+            if df_norm is None or len(df_norm) < 10:
                 continue
-            df_norm, err = normalize_dataframe(df)
-            if err:
+            summary = _vwap_summary(df_norm)
+            if summary is None:
                 continue
-            high, low, vol = df_norm["high"], df_norm["low"], df_norm["volume"]
-            tp = (high + low) / 2.0
-            pv = tp * vol
-            vwap = pv.sum() / vol.sum()
-            close = float(df_norm["close"].iloc[-1])
-            pct = (close - vwap) / vwap * 100.0
+            close, vwap, pct = summary
             trend = "Bullish" if pct > 0.3 else "Bearish" if pct < -0.3 else "Neutral"
             return {"date": start_str, "prev_close": close, "prev_vwap": vwap, "prev_trend": trend}
         except Exception as e:
             logging.warning(f"VWAP error for {symbol} on {start_str}: {e}")
     return None
 
-def calc_vwap_for_symbol(symbol: str, date_str: str, interval: str = "5m", max_retry_days: int = 7):
-    for days_ago in range(max_retry_days + 1):
-        actual_date = datetime.strptime(date_str, "%Y-%m-%d") - timedelta(days=days_ago)
-        actual_date_str = actual_date.strftime("%Y-%m-%d")
-        start_str = actual_date_str
-        end_str = (actual_date + timedelta(days=1)).strftime("%Y-%m-%d")
+def calc_vwap_for_symbol(symbol: str, date_str: str, interval: str = "5m", max_retry_days: int = 7, days: dict = None):
+    if days is None:
+        start, end = market_data.window_for(date_str, max_retry_days)
         try:
-            df = yf.download(symbol, interval=interval, start=start_str, end=end_str, prepost=True, progress=False)
-            if df.empty or len(df) < 10:
-                continue
-            df_norm, err = normalize_dataframe(df)
-            if err:
+            days = market_data.download_days([symbol], start, end, interval, prepost=True).get(symbol, {})
+        except Exception as e:
+            logging.warning(f"Calc VWAP download error for {symbol}: {e}")
+            return None
+    for actual_date_str in trading_calendar.trading_days_back(date_str, max_retry_days):
+        try:
+            df_norm = days.get(actual_date_str)
+            if df_norm is None or len(df_norm) < 10:
                 continue
             save_intraday_data(df_norm, symbol, actual_date_str)
-            high, low, vol = df_norm["high"], df_norm["low"], df_norm["volume"]
-            vol_sum = float(vol.sum())
-            if vol_sum == 0:
+            summary = _vwap_summary(df_norm)
+            if summary is None:
                 continue
-            tp = (high + low) / 2.0
-            pv = tp * vol
-            vwap = float(pv.sum()) / vol_sum
-            close = float(df_norm["close"].iloc[-1])
-            pct = (close - vwap) / vwap * 100.0
+            close, vwap, pct = summary
             return {"symbol": symbol, "date": actual_date_str, "close": round(close, 4), "vwap": round(vwap, 4), "close_vwap_pct": round(pct, 4)}
         except Exception as e:
             logging.warning(f"Calc VWAP error for {symbol} on {actual_date_str}: {e}")
     return None
 
 def save_intraday_data(df: pd.DataFrame, symbol: str, date_str: str):
+    # 寫進 bar store（每個 symbol 一條標準序列），不再另存 intraday_{symbol}_{date}.json
     try:
-        temp_df = df.copy()
-        temp_df["tp"] = (temp_df["high"] + temp_df["low"] + temp_df["close"]) / 3
-        temp_df["pv"] = temp_df["tp"] * temp_df["volume"]
-        temp_df["cum_pv"] = temp_df["pv"].cumsum()
-        temp_df["cum_vol"] = temp_df["volume"].cumsum()
-        temp_df["vwap"] = temp_df["cum_pv"] / temp_df["cum_vol"].replace(0, 1)
-        chart_data = []
-        for idx, row in temp_df.iterrows():
-            ts = int(idx.timestamp())
-            chart_data.append({
-                "time": ts, "open": round(row["open"], 2), "high": round(row["high"], 2),
-                "low": round(row["low"], 2), "close": round(row["close"], 2),
-                "volume": int(row["volume"]), "vwap": round(row["vwap"], 2)
-            })
-        dir_path = "data/intraday"
-        os.makedirs(dir_path, exist_ok=True)
-        file_path = f"{dir_path}/intraday_{symbol}_{date_str}.json"
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(chart_data, f)
-        logging.info(f"Saved chart data: {file_path} ({len(chart_data)} bars)")
+        bar_store.ensure_store(symbol)
+        bars = bar_store.frame_to_bars(df)
+        added = bar_store.append_bars(symbol, bars)
+        changed = [d for d, n in added.items() if n]
+        if changed:
+            # 全部都是新 bar 才交給 export 走檔尾 append；有部分重疊時由 store 重建
+            new_bars = bars if sum(added.values()) == len(bars) else None
+            bar_store.export_intraday(symbol, new_bars, force=True)
+            chart_tiles.update_tiles(symbol, changed)
+        logging.info(f"Saved chart data: {symbol} {date_str} ({sum(added.values())} new bars)")
     except Exception as e:
-        logging.warning(f"Failed to save intraday for {symbol}: {e}")
\ No newline at end of file
+        logging.warning(f"Failed to save intraday for {symbol}: {e}")
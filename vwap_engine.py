@@ -0,0 +1,160 @@
+# vwap_engine.py - 單一 VWAP 實作：逐 bar O(1) 串流更新 + 整欄向量化版本，依交易時段錨定重置
+
+import math
+from datetime import datetime, time
+import numpy as np
+import pandas as pd
+import instrument
+import trading_calendar
+from trading_calendar import MARKET_TZ
+
+REGULAR = "regular"    # 09:30 開盤重置，只計入正規時段 bar
+EXTENDED = "extended"  # 04:00 重置，盤前盤後都計入
+EXTENDED_OPEN = time(4, 0)
+EXTENDED_CLOSE = time(20, 0)
+DEFAULT_BANDS = (1.0, 2.0)
+
+
+def typical_price(high, low, close):
+    """全專案統一的 VWAP 價格：(H + L + C) / 3"""
+    return (high + low + close) / 3.0
+
+
+def _session_bounds(date_str: str, anchor: str) -> tuple:
+    """回傳當日 session 的 [開始, 結束) 分鐘數（美東時間）"""
+    if anchor == EXTENDED:
+        start, end = EXTENDED_OPEN, EXTENDED_CLOSE
+    elif anchor == REGULAR:
+        start, end = trading_calendar.REGULAR_OPEN, trading_calendar.session_close(date_str)
+    else:
+        raise ValueError(f"Unknown VWAP anchor: {anchor}")
+    return start.hour * 60 + start.minute, end.hour * 60 + end.minute
+
+
+class VwapEngine:
+    """
+    串流 VWAP：每次 update 只累加 Σv、Σpv、Σp²v，O(1)。
+    跨到新的交易日自動重置；不在 anchor 時段內的 bar 不計入且回傳 None。
+    """
+
+    def __init__(self, anchor: str = REGULAR, bands=DEFAULT_BANDS):
+        _session_bounds("2000-01-03", anchor)  # 提早檢查 anchor 是否合法
+        self.anchor = anchor
+        self.bands = tuple(bands or ())
+        self.session = None
+        self.cum_v = 0.0
+        self.cum_pv = 0.0
+        self.cum_p2v = 0.0
+        self.last_time = None
+        self._bounds = None
+
+    def reset(self, session: str = None):
+        self.session = session
+        self.cum_v = self.cum_pv = self.cum_p2v = 0.0
+        self._bounds = _session_bounds(session, self.anchor) if session else None
+
+    def update(self, ts: int, high: float, low: float, close: float, volume: float):
+        local = datetime.fromtimestamp(int(ts), MARKET_TZ)
+        session = local.strftime("%Y-%m-%d")
+        if session != self.session:
+            self.reset(session)
+        self.last_time = int(ts)
+        start, end = self._bounds
+        minute = local.hour * 60 + local.minute
+        if not start <= minute < end:
+            return None
+
+        price = typical_price(high, low, close)
+        volume = float(volume or 0.0)
+        self.cum_v += volume
+        self.cum_pv += price * volume
+        self.cum_p2v += price * price * volume
+        return self.value(price)
+
+    def value(self, fallback: float = None):
+        """目前的 {"vwap", "std", "bands"}；session 尚無成交量時以 fallback 價格代替"""
+        if self.cum_v > 0:
+            vwap = self.cum_pv / self.cum_v
+            std = math.sqrt(max(self.cum_p2v / self.cum_v - vwap * vwap, 0.0))
+        elif fallback is not None:
+            vwap, std = float(fallback), 0.0
+        else:
+            return None
+        bands = {k: (vwap - k * std, vwap + k * std) for k in self.bands}
+        return {"vwap": vwap, "std": std, "bands": bands}
+
+    def state(self) -> dict:
+        """可存檔的狀態；下次用 from_state 接續，不必重算整天"""
+        return {
+            "anchor": self.anchor, "session": self.session, "cum_v": self.cum_v,
+            "cum_pv": self.cum_pv, "cum_p2v": self.cum_p2v, "last_time": self.last_time,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict, bands=DEFAULT_BANDS):
+        engine = cls(state.get("anchor", REGULAR), bands)
+        engine.reset(state.get("session"))
+        engine.cum_v = state.get("cum_v", 0.0)
+        engine.cum_pv = state.get("cum_pv", 0.0)
+        engine.cum_p2v = state.get("cum_p2v", 0.0)
+        engine.last_time = state.get("last_time")
+        return engine
+
+
+@instrument.timed("vwap.session")
+def session_vwap(times, high, low, close, volume, anchor: str = REGULAR, with_std: bool = False):
+    """
+    向量化版本，結果與逐筆餵 VwapEngine 相同：每個交易日在 anchor 開始時重置，
+    時段外的 bar 為 NaN。times 為依時間排序的 Unix 秒數。
+    with_std=True 時回傳 (vwap, std)。
+    """
+    times = np.asarray(times, dtype="int64")
+    high, low, close = (np.asarray(a, dtype="float64") for a in (high, low, close))
+    volume = np.nan_to_num(np.asarray(volume, dtype="float64"))
+    n = len(times)
+    if n == 0:
+        empty = np.empty(0, dtype="float64")
+        return (empty, empty) if with_std else empty
+
+    # 轉成美東當地時間的「日」與「當日分鐘數」（datetime64 運算，不逐筆 strftime）
+    local = pd.to_datetime(times, unit="s", utc=True).tz_convert(MARKET_TZ).tz_localize(None).values
+    dates = local.astype("datetime64[D]")
+    minutes = ((local - dates) // np.timedelta64(1, "m")).astype("int64")
+    uniq, codes = np.unique(dates, return_inverse=True)
+    bounds = np.array([_session_bounds(str(d), anchor) for d in uniq])
+    in_session = (minutes >= bounds[codes, 0]) & (minutes < bounds[codes, 1])
+
+    price = typical_price(high, low, close)
+    v = np.where(in_session, volume, 0.0)
+
+    # 依交易日分段的 cumsum：整體 cumsum 扣掉每段開始前的累計
+    starts = np.r_[0, np.flatnonzero(dates[1:] != dates[:-1]) + 1]
+    seg = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+
+    def _grouped_cumsum(x):
+        cs = np.cumsum(x)
+        offset = np.r_[0.0, cs][starts]
+        return cs - offset[seg]
+
+    cum_v = _grouped_cumsum(v)
+    cum_pv = _grouped_cumsum(price * v)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vwap = np.where(cum_v > 0, cum_pv / cum_v, price)
+    vwap = np.where(in_session, vwap, np.nan)
+    if not with_std:
+        return vwap
+
+    cum_p2v = _grouped_cumsum(price * price * v)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = np.where(cum_v > 0, cum_p2v / cum_v - np.square(cum_pv / np.where(cum_v > 0, cum_v, 1)), 0.0)
+    std = np.where(in_session, np.sqrt(np.maximum(var, 0.0)), np.nan)
+    return vwap, std
+
+
+def frame_vwap(df: pd.DataFrame, anchor: str = REGULAR, with_std: bool = False):
+    """normalized OHLCV DataFrame 版本的 session_vwap"""
+    idx = pd.DatetimeIndex(df.index)
+    if idx.tz is None:
+        idx = idx.tz_localize("UTC")
+    times = idx.tz_convert("UTC").tz_localize(None).values.astype("datetime64[s]").astype("int64")
+    return session_vwap(times, df["high"], df["low"], df["close"], df["volume"], anchor, with_std)
@@ -1,71 +1,37 @@
 # vwap_yf.py - 最終版：如果該天已存在於累加 JSON，就完全跳過抓取
 
 import argparse
-import json
-import os
 import logging
 from datetime import datetime, timedelta
 import pandas as pd
-import yfinance as yf
+import bar_store
+import chart_tiles
+import fetch_pool
+import instrument
+import live_vwap
+import market_data
+import notifier
+import trading_calendar
+import yf_cache
 
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
 def is_trading_day(symbol: str, date_str: str) -> bool:
-    try:
-        start = date_str
-        end = (datetime.strptime(date_str, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
-        df = yf.download(symbol, start=start, end=end, interval="1d", progress=False)
-
-        if df.empty:
-            return False
-
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(0)
-
-        df.columns = [str(c).lower().strip() for c in df.columns]
-
-        if "adj close" in df.columns and "close" not in df.columns:
-            df["close"] = df["adj close"]
-
-        if "volume" not in df.columns or "close" not in df.columns:
-            return False
-
-        last_row = df.iloc[-1]
-        return float(last_row["volume"]) > 0 and pd.notna(last_row["close"])
-
-    except Exception as e:
-        logging.warning(f"檢查交易日失敗 {symbol} {date_str}: {e}")
-        return False
+    """查本地 NYSE 日曆（symbol 保留給呼叫端相容，不再需要下載日線確認）"""
+    return trading_calendar.is_trading_day(date_str)
 
 
 def day_exists_in_cumulative_json(symbol: str, date_str: str) -> bool:
-    """檢查累加 JSON 是否已包含該天的資料（根據 time 範圍判斷）"""
-    path = f"data/intraday/intraday_{symbol}.json"
-    if not os.path.exists(path):
-        return False
-
+    """檢查累加資料是否已包含該天（查 store 的交易日索引，不解析任何 bar 資料）"""
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        if not data:
-            return False
-
-        # 該天開始與結束的 Unix timestamp
-        day_start = int(datetime.strptime(date_str, "%Y-%m-%d").timestamp())
-        day_end = day_start + 86400 - 1  # 次日 00:00 - 1 秒
-
-        # 檢查是否有任何資料的 time 在該天範圍內
-        for entry in data:
-            t = entry.get("time")
-            if t and day_start <= t <= day_end:
-                logging.info(f"{date_str} 已存在於累加 JSON，跳過抓取 ({symbol})")
-                return True
-
+        bar_store.ensure_store(symbol)
+        if bar_store.has_day(symbol, date_str):
+            logging.info(f"{date_str} 已存在於累加 JSON，跳過抓取 ({symbol})")
+            return True
         return False
 
     except Exception as e:
-        logging.warning(f"檢查累加 JSON 失敗 {path}: {e}")
+        logging.warning(f"檢查交易日索引失敗 {symbol} {date_str}: {e}")
         return False
 
 
@@ -87,48 +53,19 @@ def append_or_merge_intraday_json(symbol: str, date_str: str, df: pd.DataFrame)
         if missing:
             raise KeyError(f"缺少欄位: {missing}")
 
-        df["tp"] = (df["high"] + df["low"] + df["close"]) / 3
-        df["pv"] = df["tp"] * df["volume"]
-        df["cum_pv"] = df["pv"].cumsum()
-        df["cum_vol"] = df["volume"].cumsum()
-        df["vwap"] = df["cum_pv"] / df["cum_vol"].replace(0, 1)
-
-        new_data = []
-        for idx, row in df.iterrows():
-            ts = int(idx.timestamp())
-            new_data.append({
-                "time": ts,
-                "open": round(float(row["open"]), 2),
-                "high": round(float(row["high"]), 2),
-                "low": round(float(row["low"]), 2),
-                "close": round(float(row["close"]), 2),
-                "volume": int(row["volume"]),
-                "vwap": round(float(row["vwap"]), 2),
-            })
-
-        path = f"data/intraday/intraday_{symbol}.json"
-
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                existing_data = json.load(f)
-        else:
-            existing_data = []
-
-        time_set = {d["time"] for d in existing_data}
-        merged_data = existing_data[:]
-        added_count = 0
-        for d in new_data:
-            if d["time"] not in time_set:
-                merged_data.append(d)
-                time_set.add(d["time"])
-                added_count += 1
-
-        merged_data.sort(key=lambda x: x["time"])
-
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(merged_data, f, indent=2)
-
-        logging.info(f"累加完成: {path} (新增 {added_count} 筆，總計 {len(merged_data)} 筆)")
+        # 只寫入新的日 segment，累加 JSON 改為由 store 匯出（可直接在檔尾 append）
+        bar_store.ensure_store(symbol)
+        bars = bar_store.frame_to_bars(df)
+        added = bar_store.append_bars(symbol, bars)
+        added_count = sum(added.values())
+        new_bars = bars if added_count == len(bars) else None
+        written = bar_store.export_intraday(symbol, new_bars, force=bool(added_count))
+        path = written[0] if written else bar_store.export_path(symbol)
+        # chart.html 的 LOD tile：只重建有新 bar 的那幾天（尚無 tile 時整個重建）
+        chart_tiles.update_tiles(symbol, [d for d, n in added.items() if n])
+
+        total = sum(seg["rows"] for seg in bar_store.load_manifest(symbol)["segments"].values())
+        logging.info(f"累加完成: {path} (新增 {added_count} 筆，總計 {total} 筆)")
         return path
 
     except Exception as e:
@@ -136,39 +73,43 @@ def append_or_merge_intraday_json(symbol: str, date_str: str, df: pd.DataFrame)
         return ""
 
 
-def process_symbol(symbol: str, target_date_input: str, interval: str = "5m", max_back_days: int = 7):
+def resolve_target_date(target_date_input: str):
     if target_date_input.lower() == "yesterday":
-        target_date = datetime.now() - timedelta(days=1)
-    else:
-        try:
-            target_date = datetime.strptime(target_date_input, "%Y-%m-%d")
-        except ValueError:
-            logging.error(f"無效日期: {target_date_input}")
-            return
+        return datetime.now() - timedelta(days=1)
+    try:
+        return datetime.strptime(target_date_input, "%Y-%m-%d")
+    except ValueError:
+        logging.error(f"無效日期: {target_date_input}")
+        return None
+
+
+@instrument.timed("vwap_yf.symbol")
+def process_symbol(symbol: str, target_date_input: str, interval: str = "5m", max_back_days: int = 7, days: dict = None):
+    """
+    days 為 market_data.download_days 已切好的 {date: df}（main 會整批預先抓好）；
+    沒給時，第一次需要資料才抓整個回溯區間一次，不再逐日下載。
+    """
+    target_date = resolve_target_date(target_date_input)
+    if target_date is None:
+        return
 
     target_date_str = target_date.strftime("%Y-%m-%d")
     logging.info(f"處理 {symbol}，目標 {target_date_str} (回溯最多 {max_back_days} 天)")
 
     found = False
-    for days_ago in range(0, max_back_days + 1):
-        check_date = target_date - timedelta(days=days_ago)
-        check_date_str = check_date.strftime("%Y-%m-%d")
-
-        if not is_trading_day(symbol, check_date_str):
-            logging.info(f"{check_date_str} 非交易日，跳過 ({symbol})")
-            continue
-
-        # 新增檢查：如果該天已存在於累加 JSON，就完全跳過抓取
+    for check_date_str in trading_calendar.trading_days_back(target_date, max_back_days):
+        # 先查本地索引：已存在就不用抓
         if day_exists_in_cumulative_json(symbol, check_date_str):
             found = True
             break
 
         try:
-            start = check_date_str
-            end = (check_date + timedelta(days=1)).strftime("%Y-%m-%d")
-            df = yf.download(symbol, interval=interval, start=start, end=end, prepost=True, progress=False)
+            if days is None:
+                start, end = market_data.window_for(target_date, max_back_days)
+                days = market_data.download_days([symbol], start, end, interval, prepost=True).get(symbol, {})
 
-            if df.empty or len(df) < 5:
+            df = days.get(check_date_str)
+            if df is None or len(df) < 5:
                 logging.warning(f"無 intraday 資料 {symbol} {check_date_str}")
                 continue
 
@@ -192,17 +133,52 @@ def main():
     parser.add_argument("symbols", help="Comma-separated symbols")
     parser.add_argument("--interval", default="5m", help="Interval e.g. 5m")
     parser.add_argument("--max-back", type=int, default=7, help="Max days to backtrack")
+    parser.add_argument("--workers", type=int, default=fetch_pool.DEFAULT_WORKERS, help="Concurrent symbols")
+    parser.add_argument("--live", action="store_true", help="Poll intraday bars until the session ends")
+    parser.add_argument("--poll", type=float, default=live_vwap.DEFAULT_POLL, help="Live poll interval in seconds")
+    parser.add_argument("--deviation", default=",".join(f"{x:g}" for x in live_vwap.DEFAULT_DEVIATIONS),
+                        help="Live VWAP deviation thresholds in percent, e.g. 1,2")
+    parser.add_argument("--notify", action="store_true", help="Send live events to Telegram")
+    parser.add_argument("--fake", action="store_true", help="Live mode with the local fake data source (writes nothing)")
+    parser.add_argument("--max-polls", type=int, help="Stop live mode after N polls")
     args = parser.parse_args()
 
     symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
 
-    logging.info(f"開始處理 {len(symbols)} 個股票，目標 {args.date} (回溯最多 {args.max_back} 天)")
+    if args.live:
+        deviations = [float(x) for x in args.deviation.split(",") if x.strip()]
+        monitor = live_vwap.run_live(symbols, args.interval, args.poll, deviations, args.notify, args.fake, args.max_polls)
+        if args.notify:
+            notifier.get_notifier().flush(notifier.FLUSH_TIMEOUT)
+        instrument.finish("vwap_live", yf_cache.stats(), {"symbols": len(symbols), "events": len(monitor.events)})
+        return
 
-    for sym in symbols:
-        process_symbol(sym, args.date, args.interval, args.max_back)
+    logging.info(f"開始處理 {len(symbols)} 個股票，目標 {args.date} (回溯最多 {args.max_back} 天)")
 
-    msg = f"VWAP 更新完成\n目標日期: {args.date} (及回溯)\n符號: {', '.join(symbols)}"
-    # send_telegram_message(msg)
+    # 回溯迴圈會停在最近的交易日：那天已在 store 的 symbol 完全不用下載，其餘整批一次抓
+    prefetched = {}
+    target_date = resolve_target_date(args.date)
+    if target_date is not None:
+        trading_days = trading_calendar.trading_days_back(target_date, args.max_back)
+        need = [s for s in symbols if trading_days and not day_exists_in_cumulative_json(s, trading_days[0])]
+        if need:
+            start, end = trading_days[-1], market_data.window_for(target_date, 0)[1]
+            try:
+                prefetched = market_data.download_days(need, start, end, args.interval, prepost=True)
+                prefetched.update({s: {} for s in need if s not in prefetched})
+            except Exception as e:
+                logging.warning(f"批次下載失敗，改為逐檔下載: {e}")
+
+    results = fetch_pool.map_ordered(
+        lambda sym: process_symbol(sym, args.date, args.interval, args.max_back, prefetched.get(sym)),
+        symbols, args.workers,
+    )
+    for sym, _, err in results:
+        if err:
+            logging.error(f"處理失敗 {sym}: {err}")
+
+    logging.info(yf_cache.summary())
+    instrument.finish("vwap_yf", yf_cache.stats(), {"symbols": len(symbols), "date": args.date})
 
 
 if __name__ == "__main__":
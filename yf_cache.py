@@ -0,0 +1,250 @@
+# yf_cache.py - yfinance 本地磁碟快取：已收盤的歷史資料永久保存，即時報價 / 期權鏈短 TTL，LRU 容量上限
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+import yfinance as yf
+import fetch_pool
+import instrument
+from trading_calendar import MARKET_TZ
+
+CACHE_DIR = os.getenv("YF_CACHE_DIR", ".cache/yfinance")
+MAX_BYTES = int(float(os.getenv("YF_CACHE_MAX_MB", "512")) * 1024 * 1024)
+ENABLED = os.getenv("YF_CACHE", "1") != "0"
+
+# 秒；None = 永不過期
+TTL = {
+    "history_live": 120,
+    "info": 60,
+    "fast_info": 60,
+    "options": 15 * 60,
+    "option_chain": 5 * 60,
+    "quote_chain": 60,
+}
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+
+class DiskCache:
+    """
+    pickle 檔 + sqlite 索引 (key, size, expires, last_access)。
+    超過 max_bytes 時先清過期項目，再依 last_access 淘汰最久沒用的。
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = None
+        self.counters = {}
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(self.cache_dir, "index.sqlite"), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, kind TEXT, size INTEGER, "
+                "expires REAL, last_access REAL)"
+            )
+        return self._db
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".pkl")
+
+    def _count(self, kind: str, field: str):
+        c = self.counters.setdefault(kind, {"hits": 0, "misses": 0, "evictions": 0})
+        c[field] += 1
+
+    @staticmethod
+    def make_key(kind: str, parts) -> str:
+        raw = json.dumps([kind, parts], sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, kind: str, parts):
+        """回傳 (True, value) 或 (False, None)"""
+        key = self.make_key(kind, parts)
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            row = db.execute("SELECT expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[0] is not None and row[0] < now):
+                if row is not None:
+                    self._delete(key)
+                self._count(kind, "misses")
+                return False, None
+            try:
+                with open(self._path(key), "rb") as f:
+                    value = pickle.load(f)
+            except Exception:
+                self._delete(key)
+                self._count(kind, "misses")
+                return False, None
+            db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            db.commit()
+            self._count(kind, "hits")
+            return True, value
+
+    def put(self, kind: str, parts, value, ttl):
+        key = self.make_key(kind, parts)
+        path = self._path(key)
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            expires = None if ttl is None else now + ttl
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, kind, size, expires, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, len(data), expires, now),
+            )
+            db.commit()
+            self._evict()
+
+    def _delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        self._conn().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self):
+        db = self._conn()
+        now = time.time()
+        for (key,) in db.execute("SELECT key FROM entries WHERE expires IS NOT NULL AND expires < ?", (now,)).fetchall():
+            self._delete(key)
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total > self.max_bytes:
+            for key, kind, size in db.execute("SELECT key, kind, size FROM entries ORDER BY last_access").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._delete(key)
+                self._count(kind, "evictions")
+                total -= size
+        db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            db = self._conn()
+            entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        totals = {f: sum(c[f] for c in self.counters.values()) for f in ("hits", "misses", "evictions")}
+        return {"entries": entries, "bytes": size, **totals, "by_kind": {k: dict(v) for k, v in self.counters.items()}}
+
+
+_CACHE = DiskCache()
+
+
+def get_cache() -> DiskCache:
+    return _CACHE
+
+
+def get(kind: str, parts):
+    if not ENABLED:
+        return False, None
+    return _CACHE.get(kind, parts)
+
+
+def put(kind: str, parts, value, ttl):
+    if not ENABLED:
+        return
+    try:
+        _CACHE.put(kind, parts, value, ttl)
+    except Exception as e:
+        logging.warning(f"yf cache write failed ({kind}): {e}")
+
+
+def cached(kind: str, parts, fn, ttl):
+    """快取包裝：命中直接回傳；未命中才呼叫 fn()（經 fetch_pool 限速重試），空結果不寫入"""
+    hit, value = get(kind, parts)
+    if hit:
+        return value
+    with instrument.timer(f"yf.{kind}"):
+        value = fn()
+    instrument.count(f"yf.requests.{kind}")
+    empty = value is None or (hasattr(value, "empty") and value.empty) or (isinstance(value, (tuple, list, dict)) and not value)
+    if not empty:
+        put(kind, parts, value, ttl)
+    return value
+
+
+def history_ttl(end) -> float:
+    """[start, end) 全部是已收完盤後盤的日子 → 永久；否則視為即時資料"""
+    today = datetime.now(MARKET_TZ).strftime("%Y-%m-%d")
+    end = end.strftime("%Y-%m-%d") if hasattr(end, "strftime") else str(end)
+    return None if end <= today else TTL["history_live"]
+
+
+def ticker_info(symbol: str, ticker=None) -> dict:
+    tick = ticker or yf.Ticker(symbol)
+    return cached("info", symbol, lambda: fetch_pool.call(lambda: dict(tick.info)), TTL["info"])
+
+
+def fast_info(symbol: str) -> dict:
+    def _fetch():
+        fast = yf.Ticker(symbol).fast_info
+        return {
+            "last_price": fetch_pool.call(lambda: fast.last_price),
+            "previous_close": fetch_pool.call(lambda: fast.previous_close),
+        }
+    return cached("fast_info", symbol, _fetch, TTL["fast_info"])
+
+
+def options(symbol: str) -> tuple:
+    return cached("options", symbol, lambda: tuple(fetch_pool.call(lambda: yf.Ticker(symbol).options)), TTL["options"])
+
+
+def option_chain(symbol: str, expiry: str, ticker=None):
+    """
+    回傳有 .calls / .puts 的物件（與 yf.Ticker.option_chain 相同用法）。
+    傳入已呼叫過 option_chain() 的 ticker 可省掉重新查到期日的那次請求。
+    """
+    def _fetch():
+        tick = ticker or yf.Ticker(symbol)
+        chain = fetch_pool.call(tick.option_chain, expiry)
+        return (chain.calls, chain.puts)
+    calls, puts = cached("option_chain", [symbol, expiry], _fetch, TTL["option_chain"])
+    return SimpleNamespace(calls=calls, puts=puts)
+
+
+def quote_chain(symbol: str, ticker=None) -> dict:
+    """
+    options endpoint 不帶日期時一次回傳：所有到期日、最近到期日的 calls / puts、
+    以及標的報價 (preMarketPrice、regularMarketPrice…)。一個請求取代 info + fast_info + options + option_chain。
+    """
+    def _fetch():
+        tick = ticker or yf.Ticker(symbol)
+        chain = fetch_pool.call(tick.option_chain)
+        expiries = tuple(tick.options)  # option_chain() 已載入到期日，不會再發請求
+        if chain.calls is None:
+            return {}
+        return {
+            "expiries": expiries,
+            "expiry": expiries[0] if expiries else None,
+            "calls": chain.calls,
+            "puts": chain.puts,
+            "quote": dict(chain.underlying or {}),
+        }
+    return cached("quote_chain", symbol, _fetch, TTL["quote_chain"])
+
+
+def stats() -> dict:
+    """快取統計（run report 用）；停用快取時全部為 0"""
+    return _CACHE.stats() if ENABLED else {"hits": 0, "misses": 0, "evictions": 0, "entries": 0, "bytes": 0, "by_kind": {}}
+
+
+def summary() -> str:
+    s = stats()
+    total = s["hits"] + s["misses"]
+    rate = s["hits"] / total * 100 if total else 0.0
+    return (f"yf cache: {s['hits']} hits / {s['misses']} misses ({rate:.0f}%), "
+            f"{s['evictions']} evicted, {s['entries']} entries, {s['bytes'] / 1024 / 1024:.1f} MB")